@@ -0,0 +1,121 @@
+# analytics.py
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+BUCKET_MINUTES = 15
+ANALYTICS_FLUSH_INTERVAL = float(os.getenv("ANALYTICS_FLUSH_INTERVAL", "60"))
+# longest range one request may ask for, in buckets (a week)
+MAX_BUCKETS = 7 * 24 * 60 // BUCKET_MINUTES
+
+
+def bucket_start(at: datetime) -> datetime:
+    return at.replace(
+        minute=at.minute - at.minute % BUCKET_MINUTES, second=0, microsecond=0
+    )
+
+
+def bucket_id(site: str, floor: int, zone, start: datetime) -> str:
+    return f"{site}|{floor}|{zone}|{start.isoformat()}"
+
+
+class OccupancyRecorder:
+    """Pre-aggregated occupancy per (site, floor, zone, 15-minute bucket).
+
+    Bookings and releases only bump in-memory counters. Every ``interval``
+    seconds ``flush`` samples how many seats each zone has occupied and
+    writes counters and samples as one unordered ``bulk_write`` of upserts,
+    one document per bucket. A range query then reads one small document
+    per bucket instead of any raw booking.
+
+    Counters use ``$inc`` and samples ``$max``/``$set``, so every replica
+    can flush its own share into the same documents.
+    """
+
+    def __init__(self, buckets, interval: float = ANALYTICS_FLUSH_INTERVAL):
+        self.buckets = buckets
+        self.interval = interval
+        self.pending = {}  # (site, floor, zone, start) -> {"bookings", "releases"}
+
+    def record(self, site: str, floor: int, zone, kind: str, at: datetime = None):
+        start = bucket_start(at or datetime.utcnow())
+        counts = self.pending.setdefault(
+            (site, floor, zone, start), {"bookings": 0, "releases": 0}
+        )
+        counts["bookings" if kind == "book" else "releases"] += 1
+
+    async def flush(self, samples=(), at: datetime = None) -> int:
+        """Write pending counters plus ``samples`` of
+        ``(site, floor, zone, occupied, capacity)`` taken at ``at``."""
+        start = bucket_start(at or datetime.utcnow())
+        pending, self.pending = self.pending, {}
+        updates = {}
+        for (site, floor, zone, bucket), counts in pending.items():
+            updates[(site, floor, zone, bucket)] = {"$inc": dict(counts)}
+        for site, floor, zone, occupied, capacity in samples:
+            update = updates.setdefault((site, floor, zone, start), {})
+            update["$max"] = {"peak": occupied}
+            update["$set"] = {"occupied": occupied, "capacity": capacity}
+        if not updates:
+            return 0
+
+        try:
+            await self.buckets.bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": bucket_id(site, floor, zone, bucket)},
+                        {
+                            **update,
+                            "$setOnInsert": {
+                                "site": site,
+                                "floor": floor,
+                                "zone": zone,
+                                "start": bucket,
+                            },
+                        },
+                        upsert=True,
+                    )
+                    for (site, floor, zone, bucket), update in updates.items()
+                ],
+                ordered=False,
+            )
+        except Exception:
+            # counters are kept for the next flush; samples are simply retaken
+            for key, counts in pending.items():
+                merged = self.pending.setdefault(key, {"bookings": 0, "releases": 0})
+                for field, value in counts.items():
+                    merged[field] += value
+            raise
+        return len(updates)
+
+    async def run(self, sampler):
+        """Flush every ``interval`` seconds; ``sampler()`` returns the samples.
+        Counters recorded since the last flush are written on the way out."""
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                try:
+                    await self.flush(await sampler())
+                except Exception:
+                    logger.exception("Occupancy flush failed")
+        finally:
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Final occupancy flush failed")
+
+    async def query(self, site: str, floor: int, start: datetime, end: datetime, zone: str = None) -> list:
+        start, end = bucket_start(start), bucket_start(end)
+        if end - start > timedelta(minutes=BUCKET_MINUTES * MAX_BUCKETS):
+            raise ValueError("Range too long")
+        query = {"site": site, "floor": floor, "start": {"$gte": start, "$lte": end}}
+        if zone is not None:
+            query["zone"] = zone
+        return await self.buckets.find(query, {"_id": 0}).sort(
+            [("start", 1), ("zone", 1)]
+        ).to_list(None)
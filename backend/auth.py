@@ -1,11 +1,15 @@
 # auth.py
 import os
-import requests
+import httpx
 from jose import jwt
 from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import RedirectResponse
-from motor.motor_asyncio import AsyncIOMotorClient
 from schemas import employee_document
+from http_client import idp_request
+from employee_cache import employee_cache
+from directory import colleague_directory
+from logins import login_tracker
+from storage import get_employee_repository
 
 router = APIRouter(prefix="/auth")
 
@@ -15,13 +19,6 @@ CLIENT_SECRET = os.getenv("CLIENT_SECRET")
 TOKEN_URL = os.getenv("TOKEN_URL")
 REDIRECT_URI = os.getenv("REDIRECT_URI")
 FRONTEND_URL = os.getenv("FRONTEND_URL")
-MONGO_URL = os.getenv("MONGO_URL")
-
-# DB
-client = AsyncIOMotorClient(MONGO_URL)
-db = client.office_booking_db
-employees_collection = db.employees
-
 # ---------------- LOGIN ----------------
 @router.get("/login")
 def login():
@@ -36,7 +33,7 @@ def login():
 
 # ---------------- CALLBACK ----------------
 @router.get("/ibm/callback")
-async def callback(code: str, request: Request):
+async def callback(code: str, request: Request, employees=Depends(get_employee_repository)):
     data = {
         "grant_type": "authorization_code",
         "code": code,
@@ -45,8 +42,11 @@ async def callback(code: str, request: Request):
         "client_secret": CLIENT_SECRET,
     }
 
-    r = requests.post(TOKEN_URL, data=data)
-    token_data = r.json()
+    try:
+        r = await idp_request("POST", TOKEN_URL, data=data)
+        token_data = r.json()
+    except (httpx.HTTPError, ValueError):
+        raise HTTPException(503, "Authentication service unavailable")
 
     if "id_token" not in token_data:
         raise HTTPException(400, "Token exchange failed")
@@ -58,14 +58,14 @@ async def callback(code: str, request: Request):
         raise HTTPException(401, "Invalid W3ID claims")
 
     # ---- UPSERT EMPLOYEE ----
-    employee = await employees_collection.find_one({"w3_id": w3_id})
-    if not employee:
-        await employees_collection.insert_one(employee_document(claims))
-    else:
-        await employees_collection.update_one(
-            {"w3_id": w3_id},
-            {"$set": {"last_login_at": employee["last_login_at"]}},
-        )
+    # a cached employee is known to exist, no write needed; otherwise one
+    # write creates them on first login and returns the state to cache
+    if employee_cache.get(w3_id) is None:
+        document = employee_document(claims)
+        employee = await employees.register(document)
+        colleague_directory.add(document)
+        employee_cache.set(w3_id, employee)
+    login_tracker.record(w3_id)
 
     # ---- SESSION ----
     request.session["user"] = {
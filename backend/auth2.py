@@ -2,11 +2,14 @@ from fastapi import APIRouter, Depends, HTTPException, status, Request, Header
 from fastapi.responses import RedirectResponse, JSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt
-import requests
+import httpx
 import os
 import logging
 from typing import Optional
 from pydantic import BaseModel
+from http_client import idp_request
+from jwks import JWKSCache
+from token_cache import VerifiedTokenCache
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -38,28 +41,24 @@ except ValueError as e:
     logger.error(f"Configuration error: {e}")
     raise
 
-# Cache for JWKS
-_jwks_cache = None
+# Signing keys, indexed by kid and refreshed in the background
+jwks_cache = JWKSCache(JWKS_URL)
 
-def get_jwks():
-    """Retrieve JWKS from the endpoint with caching."""
-    global _jwks_cache
-    if _jwks_cache:
-        return _jwks_cache
+# Tokens that already passed verify_token, until they expire
+token_cache = VerifiedTokenCache()
+
+async def get_signing_key(kid: str):
+    """Look up the IdP signing key for ``kid``."""
     try:
-        logger.debug(f"Fetching JWKS from {JWKS_URL}")
-        res = requests.get(JWKS_URL, timeout=5)
-        res.raise_for_status()
-        _jwks_cache = res.json()
-        return _jwks_cache
-    except requests.RequestException as e:
+        return await jwks_cache.get_key(kid)
+    except httpx.HTTPError as e:
         logger.error(f"Failed to fetch JWKS: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail=f"Failed to fetch JWKS: {str(e)}"
         )
 
-def verify_token(token: str):
+async def verify_token(token: str):
     """Verify JWT token and return its payload."""
     try:
         logger.debug("Verifying token...")
@@ -73,8 +72,7 @@ def verify_token(token: str):
                 detail="Token header missing key ID"
             )
 
-        jwks = get_jwks()
-        key = next((k for k in jwks.get("keys", []) if k.get("kid") == kid), None)
+        key = await get_signing_key(kid)
         
         if not key:
             logger.error("Invalid token key")
@@ -106,7 +104,10 @@ async def get_current_user(
     """Dependency to get current user from JWT token."""
     try:
         token = credentials.credentials
-        payload = verify_token(token)
+        payload = token_cache.get(token)
+        if payload is None:
+            payload = await verify_token(token)
+            token_cache.put(token, payload)
         
         return {
             "w3_id": payload.get("uid") or payload.get("sub"),
@@ -140,7 +141,7 @@ async def auth_w3id(code: str = None):
             "client_secret": CLIENT_SECRET
         }
 
-        token_res = requests.post(TOKEN_ENDPOINT, data=token_data)
+        token_res = await idp_request("POST", TOKEN_ENDPOINT, data=token_data)
         token_res.raise_for_status()
         tokens = token_res.json()
 
@@ -175,7 +176,7 @@ async def auth_w3id(code: str = None):
         
         return response
 
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"Token exchange failed: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
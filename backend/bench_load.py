@@ -0,0 +1,274 @@
+# bench_load.py
+"""Lunch-rush load test, in process and offline.
+
+Thousands of clients poll GET /seats every 2 seconds the way the frontend
+does (a full map first, then ``since``/``epoch`` deltas with the ETag) while
+a burst of people book a seat, hold it for a moment and release it. The app
+runs in this process and is called straight through ASGI (no sockets, no
+HTTP client) against the Mongo storage engine on the fake_mongo stand-in,
+or the in-memory engine, with authentication replaced by an
+``X-Bench-User`` header.
+
+    python bench_load.py
+    python bench_load.py --clients 5000 --bookers 300 --duration 30 --mongo-latency-ms 1
+    python bench_load.py --storage memory
+
+Reports requests/s, p50/p95/p99 latency and Mongo round trips per request
+for each route. Client and server share one event loop, so compare numbers
+between runs of this script, not with a deployed server.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from urllib.parse import urlencode
+
+os.environ.setdefault("SESSION_SECRET", "bench")
+
+from fake_mongo import install, op_tag  # noqa: E402
+from reservations import SLOT_MINUTES, clock, slot_label  # noqa: E402
+
+POLL_INTERVAL = 2.0
+SEATS_ROUTE = "GET /seats"
+BOOK_ROUTE = "POST /book"
+RELEASE_ROUTE = "POST /release/{seat_id}"
+
+
+class ASGIClient:
+    """Calls the app directly, the way a server would after parsing."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method: str, path: str, params=None, headers=None, json_body=None):
+        body = b"" if json_body is None else json.dumps(json_body).encode()
+        raw_headers = [(b"host", b"bench")]
+        if body:
+            raw_headers.append((b"content-type", b"application/json"))
+        raw_headers.extend(
+            (name.lower().encode(), str(value).encode()) for name, value in (headers or {}).items()
+        )
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": urlencode(params or {}).encode(),
+            "headers": raw_headers,
+            "client": ("127.0.0.1", 0),
+            "server": ("bench", 80),
+        }
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await asyncio.Event().wait()  # the client never disconnects
+
+        response = SimpleNamespace(status_code=None, headers={}, chunks=[])
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response.status_code = message["status"]
+                response.headers = {
+                    name.decode().lower(): value.decode() for name, value in message["headers"]
+                }
+            elif message["type"] == "http.response.body":
+                response.chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        return response
+
+    def get(self, path: str, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, json=None, **kwargs):
+        return self.request("POST", path, json_body=json, **kwargs)
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)  # route -> seconds
+        self.statuses = defaultdict(lambda: defaultdict(int))  # route -> status -> count
+
+    async def call(self, route: str, request):
+        token = op_tag.set(route)
+        started = time.perf_counter()
+        try:
+            response = await request
+        finally:
+            op_tag.reset(token)
+        self.latencies[route].append(time.perf_counter() - started)
+        self.statuses[route][response.status_code] += 1
+        return response
+
+
+async def poller(http, recorder: Recorder, user: str, until: float):
+    # spread the first polls over one interval, like page loads would be
+    await asyncio.sleep(random.uniform(0, POLL_INTERVAL))
+    headers = {"X-Bench-User": user}
+    params = {}
+    while time.monotonic() < until:
+        response = await recorder.call(
+            SEATS_ROUTE, http.get("/seats", params=params, headers=headers)
+        )
+        if response.status_code == 200:
+            params = {
+                "since": response.headers["x-seat-map-version"],
+                "epoch": response.headers["x-seat-map-epoch"],
+            }
+            headers["If-None-Match"] = response.headers["etag"]
+        await asyncio.sleep(POLL_INTERVAL)
+
+
+async def booker(http, recorder: Recorder, user: str, seat_ids: list, start: float, hold: float):
+    await asyncio.sleep(max(0.0, start - time.monotonic()))
+    headers = {"X-Bench-User": user}
+    # the slot under way, so bookings are live rather than reservations
+    _, minutes = clock()
+    now_slot = slot_label(minutes - minutes % SLOT_MINUTES)
+    for seat_id in random.sample(seat_ids, min(3, len(seat_ids))):
+        response = await recorder.call(
+            BOOK_ROUTE,
+            http.post(
+                "/book",
+                json={"seat_id": seat_id, "date": "Today", "time_slot": now_slot},
+                headers=headers,
+            ),
+        )
+        if response.status_code == 200:
+            await asyncio.sleep(random.uniform(0, hold))
+            await recorder.call(RELEASE_ROUTE, http.post(f"/release/{seat_id}", headers=headers))
+            return
+
+
+async def run(args) -> int:
+    from fastapi import Request
+
+    mongo = install(latency=args.mongo_latency_ms / 1000)
+    if args.storage == "memory":
+        import storage
+        from memory_storage import MemoryStorage
+
+        storage._storage = MemoryStorage(path=None)
+    import main
+    from auth import get_current_user
+    from schemas import employee_document
+
+    def bench_user(request: Request):
+        w3_id = request.headers["X-Bench-User"]
+        return {"w3_id": w3_id, "name": w3_id, "email": w3_id}
+
+    main.app.dependency_overrides[get_current_user] = bench_user
+    bookers = [f"booker{i}@ibm.com" for i in range(args.bookers)]
+    for w3_id in bookers:
+        await main.employees_repository.register(employee_document({"uid": w3_id}))
+
+    recorder = Recorder()
+    http = ASGIClient(main.app)
+    async with main.app.router.lifespan_context(main.app):
+        seat_ids = sorted(main.seat_floors)
+        began = time.monotonic()
+        until = began + args.duration
+        burst = began + args.duration * args.burst_at
+        mongo.ops_by_tag.clear()
+        await asyncio.gather(
+            *[
+                poller(http, recorder, f"viewer{i}@ibm.com", until)
+                for i in range(args.clients)
+            ],
+            *[
+                booker(
+                    http,
+                    recorder,
+                    w3_id,
+                    seat_ids,
+                    burst + random.uniform(0, args.burst_window),
+                    args.hold,
+                )
+                for w3_id in bookers
+            ],
+        )
+        elapsed = time.monotonic() - began
+
+    report(recorder, mongo, elapsed, args)
+    return 0
+
+
+def report(recorder: Recorder, mongo, elapsed: float, args):
+    storage = "in-memory storage" if args.storage == "memory" else (
+        f"Mongo latency {args.mongo_latency_ms:g} ms"
+    )
+    print(
+        f"{args.clients} pollers every {POLL_INTERVAL:g}s, {args.bookers} bookers, "
+        f"{elapsed:.1f}s, {storage}\n"
+    )
+    print(
+        f"{'route':<26}{'requests':>9}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}"
+        f"{'p99 ms':>9}{'mongo/req':>11}  statuses"
+    )
+    total = 0
+    for route, latencies in sorted(recorder.latencies.items()):
+        count = len(latencies)
+        total += count
+        statuses = " ".join(
+            f"{status}:{n}" for status, n in sorted(recorder.statuses[route].items())
+        )
+        print(
+            f"{route:<26}{count:>9}{count / elapsed:>9.0f}"
+            f"{percentile(latencies, 0.50) * 1000:>9.2f}"
+            f"{percentile(latencies, 0.95) * 1000:>9.2f}"
+            f"{percentile(latencies, 0.99) * 1000:>9.2f}"
+            f"{mongo.ops_by_tag[route] / count:>11.3f}  {statuses}"
+        )
+    everything = [value for latencies in recorder.latencies.values() for value in latencies]
+    requests_ops = sum(mongo.ops_by_tag[route] for route in recorder.latencies)
+    print(
+        f"{'all':<26}{total:>9}{total / elapsed:>9.0f}"
+        f"{percentile(everything, 0.50) * 1000:>9.2f}"
+        f"{percentile(everything, 0.95) * 1000:>9.2f}"
+        f"{percentile(everything, 0.99) * 1000:>9.2f}"
+        f"{requests_ops / max(total, 1):>11.3f}"
+    )
+    print(f"\nbackground Mongo round trips (workers, outbox): {mongo.ops_by_tag['background']}")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=2000, help="seat map pollers")
+    parser.add_argument("--bookers", type=int, default=200, help="people in the booking burst")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of polling")
+    parser.add_argument("--burst-at", type=float, default=0.25, help="burst start, as a fraction of the run")
+    parser.add_argument("--burst-window", type=float, default=1.0, help="seconds the burst is spread over")
+    parser.add_argument("--hold", type=float, default=5.0, help="longest a booker keeps a seat, seconds")
+    parser.add_argument("--mongo-latency-ms", type=float, default=0.5, help="simulated round trip")
+    parser.add_argument("--storage", choices=("mongo", "memory"), default="mongo")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    logging.basicConfig(level=logging.WARNING)
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,64 @@
+# bench_serialize.py
+"""CPU cost of encoding the seat map, per serializer.
+
+    python bench_serialize.py
+"""
+import json
+import timeit
+from typing import List
+
+import orjson
+from pydantic import TypeAdapter
+
+from main import Seat
+from seat_stream import seat_row
+
+SIZES = (100, 1_000, 10_000)
+SEATS_ADAPTER = TypeAdapter(List[Seat])
+
+
+def make_docs(n):
+    return [
+        {
+            "_id": i,
+            "status": "occupied" if i % 3 else "available",
+            "price": 5,
+            "booked_by": f"user{i}@ibm.com" if i % 3 else None,
+            "booking_time": None,
+            "site": "north-wing",
+            "floor": 3,
+            "zone": "coffee",
+        }
+        for i in range(1, n + 1)
+    ]
+
+
+def pydantic_models(docs):
+    seats = [Seat.model_validate(doc).model_dump(by_alias=True) for doc in docs]
+    return json.dumps(seats, separators=(",", ":")).encode()
+
+
+def type_adapter(docs):
+    return SEATS_ADAPTER.dump_json(SEATS_ADAPTER.validate_python(docs), by_alias=True)
+
+
+def plain_rows(docs):
+    return orjson.dumps([seat_row(doc) for doc in docs])
+
+
+def main():
+    serializers = [pydantic_models, type_adapter, plain_rows]
+    print(f"{'seats':>7} " + " ".join(f"{s.__name__:>16}" for s in serializers) + "   saving")
+    for n in SIZES:
+        docs = make_docs(n)
+        number = max(1, 20_000 // n)
+        timings = [
+            min(timeit.repeat(lambda: s(docs), number=number, repeat=5)) / number
+            for s in serializers
+        ]
+        cells = " ".join(f"{t * 1000:>13.3f} ms" for t in timings)
+        print(f"{n:>7} {cells}   {timings[0] / timings[-1]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
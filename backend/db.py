@@ -0,0 +1,132 @@
+# db.py
+import os
+import threading
+import time
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+from metrics import MONGO_CHECKOUT, MONGO_CHECKOUT_FAILURES, MONGO_COMMANDS
+
+MONGO_URL = os.getenv("MONGO_URL")
+DB_NAME = "office_booking_db"
+# One pool per worker process; size it for the worker, not the fleet
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "5"))
+# How long a request waits for a free connection before failing fast
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+
+
+class MongoStats(monitoring.CommandListener, monitoring.ConnectionPoolListener):
+    """Per-command latency and pool checkout wait for the shared client,
+    observed into the Prometheus histograms in metrics.py.
+
+    The driver calls these listeners from Motor's executor threads; the
+    metrics are thread-safe, and the checkout start time is kept per
+    thread. A checkout that times out is counted under its reason, which
+    is what pool exhaustion looks like.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _command(self, event, failed: bool):
+        MONGO_COMMANDS.labels(event.command_name, "failed" if failed else "ok").observe(
+            event.duration_micros / 1_000_000
+        )
+
+    # CommandListener
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._command(event, False)
+
+    def failed(self, event):
+        self._command(event, True)
+
+    # ConnectionPoolListener
+    def connection_check_out_started(self, event):
+        self._local.checkout_started = time.perf_counter()
+
+    def _waited(self, event) -> float:
+        duration = getattr(event, "duration", None)  # pymongo 4.9+
+        if duration is not None:
+            return duration
+        started = getattr(self._local, "checkout_started", None)
+        return time.perf_counter() - started if started else 0.0
+
+    def connection_checked_out(self, event):
+        MONGO_CHECKOUT.observe(self._waited(event))
+
+    def connection_check_out_failed(self, event):
+        MONGO_CHECKOUT.observe(self._waited(event))
+        MONGO_CHECKOUT_FAILURES.labels(str(event.reason)).inc()
+
+    def connection_created(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+
+mongo_stats = MongoStats()
+
+_client: Optional[AsyncIOMotorClient] = None
+
+
+def create_client() -> AsyncIOMotorClient:
+    return AsyncIOMotorClient(
+        MONGO_URL,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        event_listeners=[mongo_stats],
+    )
+
+
+def get_client() -> AsyncIOMotorClient:
+    """The one Mongo client of this process; opened and closed by the app
+    lifespan. Creating it does not connect, so modules may bind collections
+    at import time."""
+    global _client
+    if _client is None:
+        _client = create_client()
+    return _client
+
+
+def get_database():
+    return get_client()[DB_NAME]
+
+
+async def open_client():
+    # connect up front so the first request does not pay for it
+    await get_database().command("ping")
+
+
+def close_client():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
@@ -0,0 +1,117 @@
+# directory.py
+import asyncio
+import logging
+import os
+import time
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+DIRECTORY_REFRESH_INTERVAL = float(os.getenv("DIRECTORY_REFRESH_INTERVAL", "300"))
+DIRECTORY_BATCH_SIZE = 5000
+
+DIRECTORY_FIELDS = {"_id": 0, "w3_id": 1, "full_name": 1, "email": 1}
+
+
+def search_keys(doc: dict) -> set:
+    """Lower-cased prefixes a colleague can be found by."""
+    keys = set()
+    name = (doc.get("full_name") or "").strip().lower()
+    if name:
+        keys.add(name)
+        keys.update(name.split())
+    email = (doc.get("email") or "").strip().lower()
+    if email:
+        keys.add(email)
+        keys.add(email.split("@")[0])
+    if doc.get("w3_id"):
+        keys.add(doc["w3_id"].lower())
+    return keys
+
+
+class ColleagueDirectory:
+    """Sorted prefix index over employee names, emails and w3_ids.
+
+    ``keys`` is sorted and ``owners[i]`` is the w3_id behind ``keys[i]``, so
+    a search is one bisect to the first key starting with the query and a
+    walk over the matches. The whole directory is reloaded in the background
+    every ``interval`` seconds; logins add new employees in between.
+    """
+
+    def __init__(self, interval: float = DIRECTORY_REFRESH_INTERVAL):
+        self.interval = interval
+        self.keys = []
+        self.owners = []
+        self.people = {}  # w3_id -> {"w3_id", "full_name", "email"}
+        self.loaded_at = None
+
+    def __len__(self):
+        return len(self.people)
+
+    @staticmethod
+    def index(docs):
+        people = {}
+        entries = []
+        for doc in docs:
+            w3_id = doc.get("w3_id")
+            if not w3_id:
+                continue
+            people[w3_id] = {
+                "w3_id": w3_id,
+                "full_name": doc.get("full_name"),
+                "email": doc.get("email"),
+            }
+            entries.extend((key, w3_id) for key in search_keys(doc))
+        entries.sort()
+        return [key for key, _ in entries], [w3_id for _, w3_id in entries], people
+
+    def build(self, docs):
+        self.swap(self.index(docs))
+
+    def swap(self, built):
+        # one step, so searches never see a half-built index
+        self.keys, self.owners, self.people = built
+        self.loaded_at = time.monotonic()
+
+    def add(self, doc: dict):
+        w3_id = doc.get("w3_id")
+        if not w3_id or w3_id in self.people:
+            return
+        self.people[w3_id] = {
+            "w3_id": w3_id,
+            "full_name": doc.get("full_name"),
+            "email": doc.get("email"),
+        }
+        for key in search_keys(doc):
+            i = bisect_left(self.keys, key)
+            self.keys.insert(i, key)
+            self.owners.insert(i, w3_id)
+
+    def search(self, query: str, limit: int = 10) -> list:
+        query = query.strip().lower()
+        if not query:
+            return []
+        keys, owners = self.keys, self.owners
+        found = {}
+        i = bisect_left(keys, query)
+        while i < len(keys) and keys[i].startswith(query) and len(found) < limit:
+            found.setdefault(owners[i], None)
+            i += 1
+        return [self.people[w3_id] for w3_id in found if w3_id in self.people]
+
+    async def refresh(self, employees):
+        docs = [doc async for doc in employees.directory()]
+        # sorting a large directory would stall the event loop
+        self.swap(await asyncio.to_thread(self.index, docs))
+        logger.info("Colleague directory loaded %d employees", len(self.people))
+
+    async def run(self, employees):
+        while True:
+            try:
+                await self.refresh(employees)
+            except Exception:
+                logger.exception("Colleague directory refresh failed")
+            await asyncio.sleep(self.interval)
+
+
+colleague_directory = ColleagueDirectory()
@@ -0,0 +1,84 @@
+# employee_cache.py
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from metrics import cache_counters
+
+EMPLOYEE_CACHE_SIZE = int(os.getenv("EMPLOYEE_CACHE_SIZE", "50000"))
+# Bounds staleness from writes made by other replicas
+EMPLOYEE_CACHE_TTL = float(os.getenv("EMPLOYEE_CACHE_TTL", "60"))
+
+# Fields of the employee document the booking paths need
+EMPLOYEE_STATE = {
+    "_id": 0,
+    "w3_id": 1,
+    "last_booked_seat": 1,
+    "last_booking_at": 1,
+    "blue_tokens_spent": 1,
+    "manager": 1,
+}
+
+
+class EmployeeCache:
+    """Write-through LRU of employee booking state, keyed by ``w3_id``.
+
+    Every code path that writes employees either stores the state it got
+    back (``set``) or drops the entry (``invalidate``).
+    """
+
+    def __init__(self, maxsize: int = EMPLOYEE_CACHE_SIZE, ttl: float = EMPLOYEE_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._hit, self._miss = cache_counters("employee")
+        self._entries = OrderedDict()
+
+    def get(self, w3_id: str) -> Optional[dict]:
+        entry = self._entries.get(w3_id)
+        if entry is not None:
+            state, stored_at = entry
+            if time.monotonic() - stored_at < self.ttl:
+                self._entries.move_to_end(w3_id)
+                self.hits += 1
+                self._hit.inc()
+                return state
+            del self._entries[w3_id]
+        self.misses += 1
+        self._miss.inc()
+        return None
+
+    def set(self, w3_id: str, document: Optional[dict]) -> Optional[dict]:
+        if document is None:
+            self.invalidate(w3_id)
+            return None
+        state = {
+            "last_booked_seat": document.get("last_booked_seat"),
+            "last_booking_at": document.get("last_booking_at"),
+            "blue_tokens_spent": document.get("blue_tokens_spent", 0),
+            # cost center the booking is billed to
+            "manager": document.get("manager"),
+        }
+        self._entries[w3_id] = (state, time.monotonic())
+        self._entries.move_to_end(w3_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return state
+
+    def invalidate(self, w3_id: str):
+        self._entries.pop(w3_id, None)
+
+    async def load(self, employees, w3_id: str) -> Optional[dict]:
+        state = self.get(w3_id)
+        if state is None:
+            document = await employees.state(w3_id)
+            state = self.set(w3_id, document)
+        return state
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+employee_cache = EmployeeCache()
@@ -0,0 +1,82 @@
+# fake_mongo.py
+"""In-memory stand-in for the Motor client, for tests and benchmarks.
+
+The collections are memory_collections.py's; on top of them every call is
+counted as one round trip, per collection and operation and per
+``op_tag``, and can be delayed by ``latency`` seconds to stand in for the
+network.
+
+    from fake_mongo import install
+    client = install()   # before main is imported
+"""
+import asyncio
+import importlib
+import sys
+from collections import Counter
+from contextvars import ContextVar
+
+from memory_collections import MemoryCollection, MemoryDatabase
+
+# who the round trips are billed to; set it per simulated request, anything
+# untagged (the app's background workers) counts as "background"
+op_tag = ContextVar("op_tag", default="background")
+
+
+class FakeCollection(MemoryCollection):
+    async def _round_trip(self, op: str):
+        self.database.client.count(self.name, op)
+        await asyncio.sleep(self.database.client.latency)
+
+
+class FakeDatabase(MemoryDatabase):
+    collection_class = FakeCollection
+
+    def __init__(self, client, name: str):
+        super().__init__(name)
+        self.client = client
+
+    async def command(self, name: str, *args, **kwargs):
+        self.client.count("admin", name)
+        return {"ok": 1}
+
+
+class FakeClient:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.ops = Counter()  # (collection, operation) -> calls
+        self.ops_by_tag = Counter()  # op_tag -> calls
+        self._databases = {}
+
+    def count(self, collection: str, op: str):
+        self.ops[(collection, op)] += 1
+        self.ops_by_tag[op_tag.get()] += 1
+
+    @property
+    def op_count(self) -> int:
+        return sum(self.ops.values())
+
+    def __getitem__(self, name: str) -> FakeDatabase:
+        if name not in self._databases:
+            self._databases[name] = FakeDatabase(self, name)
+        return self._databases[name]
+
+    def close(self):
+        pass
+
+
+def install(latency: float = 0.0) -> FakeClient:
+    """Make ``db.get_client()`` return a fresh FakeClient, and the Mongo
+    storage engine use it.
+
+    main binds its repositories at import time, so it is (re)imported after
+    the fake is in place.
+    """
+    import db
+    import storage
+
+    client = FakeClient(latency)
+    db._client = client
+    storage._storage = None
+    if "main" in sys.modules:
+        importlib.reload(sys.modules["main"])
+    return client
@@ -0,0 +1,46 @@
+# http_client.py
+import asyncio
+import os
+from typing import Optional
+
+import httpx
+
+# Outbound calls to the identity provider (token exchange, JWKS)
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "5"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "10"))
+IDP_MAX_CONCURRENCY = int(os.getenv("IDP_MAX_CONCURRENCY", "10"))
+
+_client: Optional[httpx.AsyncClient] = None
+_idp_slots = asyncio.Semaphore(IDP_MAX_CONCURRENCY)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared keep-alive client; normally opened by the app lifespan."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(HTTP_TIMEOUT, connect=2.0),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            ),
+        )
+    return _client
+
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def idp_request(method: str, url: str, **kwargs) -> httpx.Response:
+    """Send a request to the IdP without blocking the event loop.
+
+    At most IDP_MAX_CONCURRENCY calls are in flight per worker, so a slow
+    IdP during the login rush queues logins instead of opening a socket each.
+    """
+    async with _idp_slots:
+        return await get_http_client().request(method, url, **kwargs)
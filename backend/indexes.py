@@ -0,0 +1,181 @@
+# indexes.py
+"""Indexes for every query mongo_storage.py and the reporting workers run,
+plus a plan audit.
+
+    python indexes.py            # create missing indexes
+    python indexes.py --audit    # explain() every query shape, exit 1 on COLLSCAN
+"""
+import asyncio
+import logging
+import sys
+from datetime import datetime
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+INDEXES = {
+    "employees": [
+        IndexModel([("w3_id", ASCENDING)], unique=True, name="w3_id_unique"),
+    ],
+    "seats": [
+        IndexModel(
+            [("site", ASCENDING), ("floor", ASCENDING), ("_id", ASCENDING)],
+            name="site_floor_id",
+        ),
+        # one occupied seat per person; the seat claim relies on it
+        IndexModel(
+            [("booked_by", ASCENDING), ("status", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"status": "occupied"},
+            name="occupied_booked_by_unique",
+        ),
+        # only seats with undelivered outbox events have keys here
+        IndexModel([("outbox.at", ASCENDING)], sparse=True, name="outbox_at"),
+        IndexModel(
+            [("status", ASCENDING), ("booking_time", ASCENDING)],
+            name="status_booking_time",
+        ),
+    ],
+    "ledger": [
+        IndexModel([("day", ASCENDING), ("cost_center", ASCENDING)], name="day_cost_center"),
+    ],
+    "cost_center_daily": [
+        IndexModel([("day", ASCENDING), ("cost_center", ASCENDING)], name="day_cost_center"),
+        IndexModel([("cost_center", ASCENDING), ("day", ASCENDING)], name="cost_center_day"),
+    ],
+    "occupancy": [
+        IndexModel(
+            [("site", ASCENDING), ("floor", ASCENDING), ("start", ASCENDING), ("zone", ASCENDING)],
+            name="site_floor_start_zone",
+        ),
+    ],
+    "reservations": [
+        IndexModel(
+            [("date", ASCENDING), ("start", ASCENDING), ("seat_id", ASCENDING)],
+            unique=True,
+            name="date_start_seat_unique",
+        ),
+        IndexModel(
+            [("date", ASCENDING), ("start", ASCENDING), ("w3_id", ASCENDING)],
+            unique=True,
+            name="date_start_w3_id_unique",
+        ),
+    ],
+}
+
+# (collection, index name) of indexes no query uses any more; dropped where
+# an older deployment created them, since every write still maintains them
+RETIRED_INDEXES = [
+    ("seats", "booked_by"),
+    ("ledger", "w3_id_at"),
+]
+
+# (collection, filter, sort) for every query the app sends; update filters
+# are listed as finds because they are planned the same way.
+QUERY_SHAPES = [
+    ("seats", {"site": "north-wing", "floor": 3}, [("_id", ASCENDING)]),
+    ("seats", {"site": "north-wing"}, [("floor", ASCENDING), ("_id", ASCENDING)]),
+    ("seats", {}, [("_id", ASCENDING)]),
+    ("seats", {"_id": 1, "status": "available"}, None),
+    ("seats", {"_id": 1, "booked_by": "w3id"}, None),
+    ("seats", {"status": "occupied", "booking_time": {"$lte": datetime(2000, 1, 1)}}, None),
+    ("employees", {"w3_id": "w3id"}, None),
+    ("employees", {}, [("_id", ASCENDING)]),
+    ("employees", {"w3_id": "w3id", "last_booked_seat": None}, None),
+    (
+        "employees",
+        {"w3_id": "w3id", "last_booked_seat": 1, "last_booking_at": datetime(2000, 1, 1)},
+        None,
+    ),
+    ("seats", {"_id": {"$in": [1, 2]}, "sweep_id": "x"}, None),
+    ("seats", {"outbox.at": {"$lt": datetime(2000, 1, 1)}}, None),
+    ("locks", {"_id": "seat-sweeper", "owner": "me"}, None),
+    ("employees", {"w3_id": {"$in": ["w3id"]}}, None),
+    ("employees", {"w3_id": "w3id", "applied_events": {"$ne": "event"}}, None),
+    ("ledger", {"day": "2000-01-01"}, None),
+    (
+        "cost_center_daily",
+        {"day": {"$gte": "2000-01-01", "$lte": "2000-01-31"}},
+        [("day", ASCENDING), ("cost_center", ASCENDING)],
+    ),
+    (
+        "cost_center_daily",
+        {"day": {"$gte": "2000-01-01", "$lte": "2000-01-31"}, "cost_center": "mgr"},
+        [("day", ASCENDING), ("cost_center", ASCENDING)],
+    ),
+    (
+        "occupancy",
+        {"site": "north-wing", "floor": 3, "start": {"$gte": datetime(2000, 1, 1), "$lte": datetime(2000, 1, 2)}},
+        [("start", ASCENDING), ("zone", ASCENDING)],
+    ),
+    ("reservations", {"date": "2000-01-01"}, None),
+    (
+        "reservations",
+        {"date": "2000-01-01", "start": 720, "seat_id": 1, "w3_id": "w3id"},
+        None,
+    ),
+]
+
+
+async def ensure_indexes(db):
+    """Create any missing index and drop retired ones; existing indexes are
+    left untouched."""
+    for name, models in INDEXES.items():
+        try:
+            await db[name].create_indexes(models)
+        except OperationFailure:
+            # e.g. duplicate w3_ids left over from before the unique index
+            logger.exception("Could not create indexes on %s", name)
+    for name, index in RETIRED_INDEXES:
+        try:
+            await db[name].drop_index(index)
+        except OperationFailure:
+            # already gone, or never created
+            pass
+
+
+def find_collscans(plan) -> bool:
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            return True
+        return any(find_collscans(value) for value in plan.values())
+    if isinstance(plan, list):
+        return any(find_collscans(value) for value in plan)
+    return False
+
+
+async def audit(db) -> list:
+    """Return the query shapes whose winning plan scans a whole collection."""
+    collscans = []
+    for name, query, sort in QUERY_SHAPES:
+        cursor = db[name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explained = await cursor.explain()
+        if find_collscans(explained["queryPlanner"]["winningPlan"]):
+            collscans.append((name, query, sort))
+    return collscans
+
+
+async def main(argv):
+    from db import get_database
+
+    db = get_database()
+    await ensure_indexes(db)
+    if "--audit" not in argv:
+        return 0
+
+    collscans = await audit(db)
+    for name, query, sort in collscans:
+        print(f"COLLSCAN {name} {query} sort={sort}")
+    print(f"{len(QUERY_SHAPES) - len(collscans)}/{len(QUERY_SHAPES)} query shapes use an index")
+    return 1 if collscans else 0
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    sys.exit(asyncio.run(main(sys.argv[1:])))
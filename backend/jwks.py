@@ -0,0 +1,91 @@
+# jwks.py
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+from jose import jwk
+
+from http_client import idp_request
+
+logger = logging.getLogger(__name__)
+
+JWKS_TTL = float(os.getenv("JWKS_TTL", "3600"))
+# An unknown kid triggers at most one refetch per this many seconds,
+# so garbage tokens cannot be used to hammer the IdP.
+JWKS_MISS_COOLDOWN = float(os.getenv("JWKS_MISS_COOLDOWN", "30"))
+
+
+class JWKSCache:
+    """Signing keys of the IdP, indexed by ``kid``.
+
+    Keys are kept as constructed jose ``Key`` objects so verification never
+    parses the JWK again. Once 80% of ``ttl`` has passed the set is refreshed
+    by a background task while requests keep using the current keys; only a
+    cold or fully expired cache makes a request wait on the IdP. An unknown
+    ``kid`` (key rotation) refetches the set once.
+    """
+
+    def __init__(self, url: str, ttl: float = JWKS_TTL, miss_cooldown: float = JWKS_MISS_COOLDOWN):
+        self.url = url
+        self.ttl = ttl
+        self.miss_cooldown = miss_cooldown
+        self.keys = {}
+        self.fetched_at = None
+        self._lock = asyncio.Lock()
+        self._refresh_task = None
+
+    def age(self) -> float:
+        if self.fetched_at is None:
+            return float("inf")
+        return time.monotonic() - self.fetched_at
+
+    async def refresh(self, max_age: float = 0):
+        async with self._lock:
+            # whoever held the lock before us may have just fetched
+            if max_age and self.age() < max_age:
+                return
+            res = await idp_request("GET", self.url)
+            res.raise_for_status()
+            keys = {}
+            for key in res.json().get("keys", []):
+                if not key.get("kid"):
+                    continue
+                try:
+                    keys[key["kid"]] = jwk.construct(key, key.get("alg", "RS256"))
+                except Exception:
+                    logger.warning("Skipping unusable JWK %s", key.get("kid"))
+            self.keys = keys
+            self.fetched_at = time.monotonic()
+
+    def _refresh_in_background(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._background_refresh())
+
+    async def _background_refresh(self):
+        try:
+            await self.refresh()
+        except Exception:
+            logger.exception("Background JWKS refresh failed")
+
+    async def get_key(self, kid: str) -> Optional[object]:
+        age = self.age()
+        if age >= self.ttl:
+            try:
+                await self.refresh(max_age=self.ttl)
+            except Exception:
+                # keep serving the last good keys while the IdP is down
+                if not self.keys:
+                    raise
+                logger.exception("JWKS refresh failed, using expired keys")
+                # retry from the background instead of on every request
+                self.fetched_at = time.monotonic() - self.ttl * 0.8
+        elif age >= self.ttl * 0.8:
+            self._refresh_in_background()
+
+        key = self.keys.get(kid)
+        if key is None and self.age() >= self.miss_cooldown:
+            await self.refresh(max_age=self.miss_cooldown)
+            key = self.keys.get(kid)
+        return key
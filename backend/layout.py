@@ -0,0 +1,194 @@
+# layout.py
+# Cafeteria floor plans, loaded from the JSON files in SITES_DIR.
+# A site is one cafeteria; each of its floors has a seat id range, zones and
+# rows of tables, drawn the way renderArchitecturalMap() in the frontend does.
+import heapq
+import json
+import math
+import os
+from pathlib import Path
+
+SITES_DIR = Path(os.getenv("SITES_DIR", Path(__file__).parent / "sites"))
+DEFAULT_SITE = os.getenv("DEFAULT_SITE", "north-wing")
+
+# seats closer than this (in map units) count as neighbours
+NEIGHBOR_RADIUS = 60
+
+
+def seat_range(bounds) -> list:
+    first, last = bounds
+    return list(range(first, last + 1))
+
+
+class FloorPlan:
+    """One floor of one site: its seats, zones and tables.
+
+    ``rows`` is a list of rows, each a list of tables, each the list of its
+    seat ids. Seat ids are unique across every site so the booking paths
+    can keep addressing a seat by id alone.
+    """
+
+    def __init__(self, site: str, name: str, spec: dict):
+        self.site = site
+        self.name = name
+        self.floor = spec["floor"]
+        self.price = spec.get("price", 5)
+        self.seat_ids = seat_range(spec["seats"])
+        self.zones = {
+            zone: range(first, last + 1)
+            for zone, (first, last) in spec.get("zones", {}).items()
+        }
+        self.rows = [[seat_range(table["seats"]) for table in row] for row in spec.get("rows", [])]
+        self.tables = [table for row in self.rows for table in row]
+        # (x, y, round?) where the map starts laying out each table
+        self.origins = [
+            (table["x"], table["y"], table["shape"] == "round")
+            for row in spec.get("rows", [])
+            for table in row
+        ]
+        self._index = None
+
+        seats = set(self.seat_ids)
+        for table in self.tables:
+            if not seats.issuperset(table):
+                raise ValueError(f"{site}/{self.floor}: table {table} is outside the floor's seats")
+
+    @property
+    def key(self):
+        return (self.site, self.floor)
+
+    def zone_of(self, seat_id: int):
+        for name, seats in self.zones.items():
+            if seat_id in seats:
+                return name
+        return None
+
+    def positions(self) -> dict:
+        """Seat id -> (x, y) on the map, computed like createSeats() does."""
+        positions = {}
+        for table, (x, y, round_table) in zip(self.tables, self.origins):
+            count = len(table)
+            row_size = math.ceil(count / 2)
+            for i, seat_id in enumerate(table):
+                if round_table:
+                    angle = math.radians(i * 360 / count)
+                    positions[seat_id] = (
+                        x + math.cos(angle) * 32 - 10,
+                        y + math.sin(angle) * 32 - 10,
+                    )
+                else:
+                    top = i < row_size
+                    positions[seat_id] = (x + (i % row_size) * 26, y - 32 if top else y + 58)
+        return positions
+
+    @property
+    def index(self):
+        # built on first use, so idle floors cost nothing
+        if self._index is None:
+            self._index = SeatIndex(self)
+        return self._index
+
+    def find_adjacent(self, free: set, size: int):
+        """Pick ``size`` free seats that sit together, or None.
+
+        Prefers the smallest single table that fits the group, then the run of
+        neighbouring tables in the same row that leaves the fewest free seats.
+        """
+        tables = sorted(
+            (table for table in self.tables if sum(s in free for s in table) >= size),
+            key=len,
+        )
+        if tables:
+            return [s for s in tables[0] if s in free][:size]
+
+        best = None
+        for row in self.rows:
+            for first in range(len(row)):
+                picked = []
+                for table in row[first:]:
+                    picked.extend(s for s in table if s in free)
+                    if len(picked) >= size:
+                        if best is None or len(picked) < len(best):
+                            best = picked
+                        break
+        return best[:size] if best else None
+
+
+def load_sites(path: Path = SITES_DIR) -> dict:
+    """(site, floor) -> FloorPlan for every ``*.json`` file in ``path``."""
+    plans = {}
+    owner = {}
+    for file in sorted(Path(path).glob("*.json")):
+        data = json.loads(file.read_text())
+        for spec in data["floors"]:
+            plan = FloorPlan(data["site"], data.get("name", data["site"]), spec)
+            if plan.key in plans:
+                raise ValueError(f"{file.name}: {plan.site}/{plan.floor} is defined twice")
+            for seat_id in plan.seat_ids:
+                if seat_id in owner:
+                    raise ValueError(f"{file.name}: seat {seat_id} already belongs to {owner[seat_id]}")
+                owner[seat_id] = plan.key
+            plans[plan.key] = plan
+    return plans
+
+
+class SeatIndex:
+    """Positions, tables and a neighbour graph of one floor plan.
+
+    ``nearest`` lists every other seat by distance so "closest free seat to
+    a colleague" stops at the first free entry, and ``neighbors`` is the
+    part of that list within ``radius``. Seats that are not on the map have
+    no position and no neighbours.
+    """
+
+    def __init__(self, plan: FloorPlan, radius: float = NEIGHBOR_RADIUS):
+        self.plan = plan
+        self.positions = plan.positions()
+        self.table = {seat_id: i for i, table in enumerate(plan.tables) for seat_id in table}
+        self.nearest = {}
+        self.neighbors = {}
+        for seat_id, here in self.positions.items():
+            others = sorted(
+                (math.dist(here, there), other)
+                for other, there in self.positions.items()
+                if other != seat_id
+            )
+            self.nearest[seat_id] = [other for _, other in others]
+            self.neighbors[seat_id] = [other for d, other in others if d <= radius]
+
+    def crowding(self, seat_id: int, free: set) -> float:
+        """Share of the seat's neighbours that are taken."""
+        neighbors = self.neighbors.get(seat_id)
+        if not neighbors:
+            return 0.0
+        return sum(other not in free for other in neighbors) / len(neighbors)
+
+    def pick(self, free: set, zone: str = None, near: int = None, quiet: bool = True, limit: int = 3):
+        """Up to ``limit`` free seats, best first.
+
+        Seats in ``zone`` come first (any zone if it is full). With ``near``,
+        a seat at the colleague's table beats one at the next table over,
+        which beats anything further away; ``quiet`` then prefers seats with
+        fewer taken neighbours.
+        """
+        candidates = free
+        if zone is not None:
+            candidates = {seat_id for seat_id in free if seat_id in self.plan.zones[zone]} or free
+
+        if near in self.nearest:
+            rank = {seat_id: i for i, seat_id in enumerate(self.nearest[near])}
+            table = self.table.get(near)
+
+            def key(seat_id):
+                return (
+                    self.table.get(seat_id) != table,
+                    rank.get(seat_id, len(rank)),
+                    self.crowding(seat_id, free) if quiet else 0,
+                    seat_id,
+                )
+        else:
+
+            def key(seat_id):
+                return (self.crowding(seat_id, free) if quiet else 0, seat_id)
+
+        return heapq.nsmallest(limit, candidates, key=key)
@@ -0,0 +1,194 @@
+# ledger.py
+"""Blu Dollar ledger and per-cost-center daily roll-up.
+
+    python ledger.py --rebuild 2026-03-02    # recompute one day's roll-up
+"""
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+LEDGER_FLUSH_INTERVAL = float(os.getenv("LEDGER_FLUSH_INTERVAL", "5"))
+# employees without a manager are billed here
+UNASSIGNED = "unassigned"
+DUPLICATE_KEY = 11000
+
+
+def rollup_id(cost_center: str, day: str) -> str:
+    return f"{cost_center}|{day}"
+
+
+class BillingLedger:
+    """Append-only ``ledger`` of every charge and refund, plus a roll-up.
+
+    Each booking path inserts its ledger entries right after the write that
+    moved the tokens. The entries are also added to in-memory totals per
+    (cost center, day), which ``flush`` applies to ``rollups`` as one
+    unordered ``bulk_write`` of ``$inc`` upserts every ``interval`` seconds,
+    so a finance report is a lookup on a handful of roll-up documents.
+
+    ``$inc`` is commutative, so every replica flushes its own totals. Totals
+    not yet flushed when a process dies are missing from the roll-up until
+    ``rebuild`` recomputes that day from the ledger.
+    """
+
+    def __init__(self, entries, rollups, interval: float = LEDGER_FLUSH_INTERVAL):
+        self.entries = entries
+        self.rollups = rollups
+        self.interval = interval
+        self.pending = {}  # (cost_center, day) -> {"charged", "refunded", "entries"}
+
+    @staticmethod
+    def entry(
+        w3_id: str, amount: int, kind: str, seat_id=None, cost_center=None, at=None, key=None
+    ) -> dict:
+        at = at or datetime.utcnow()
+        entry = {} if key is None else {"_id": key}
+        return {
+            **entry,
+            "w3_id": w3_id,
+            "cost_center": cost_center or UNASSIGNED,
+            "amount": amount,
+            "kind": kind,
+            "seat_id": seat_id,
+            "at": at,
+            "day": at.date().isoformat(),
+        }
+
+    async def record(self, *entries: dict):
+        """Insert ``entries``; ones carrying an ``_id`` already in the ledger
+        are skipped, so a retried side effect is never billed twice."""
+        if not entries:
+            return
+        try:
+            # insert_many adds _id to the dicts it is given
+            await self.entries.insert_many([dict(entry) for entry in entries], ordered=False)
+        except BulkWriteError as exc:
+            errors = exc.details.get("writeErrors", [])
+            if any(error["code"] != DUPLICATE_KEY for error in errors):
+                raise
+            seen = {error["index"] for error in errors}
+            entries = [entry for index, entry in enumerate(entries) if index not in seen]
+        for entry in entries:
+            totals = self.pending.setdefault(
+                (entry["cost_center"], entry["day"]),
+                {"charged": 0, "refunded": 0, "entries": 0},
+            )
+            if entry["amount"] >= 0:
+                totals["charged"] += entry["amount"]
+            else:
+                totals["refunded"] -= entry["amount"]
+            totals["entries"] += 1
+
+    async def flush(self) -> int:
+        pending, self.pending = self.pending, {}
+        if not pending:
+            return 0
+        try:
+            await self.rollups.bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": rollup_id(cost_center, day)},
+                        {
+                            "$setOnInsert": {"cost_center": cost_center, "day": day},
+                            "$inc": {
+                                "charged": totals["charged"],
+                                "refunded": totals["refunded"],
+                                "net": totals["charged"] - totals["refunded"],
+                                "entries": totals["entries"],
+                            },
+                        },
+                        upsert=True,
+                    )
+                    for (cost_center, day), totals in pending.items()
+                ],
+                ordered=False,
+            )
+        except Exception:
+            # keep the totals for the next flush
+            for key, totals in pending.items():
+                merged = self.pending.setdefault(key, {"charged": 0, "refunded": 0, "entries": 0})
+                for field, value in totals.items():
+                    merged[field] += value
+            raise
+        return len(pending)
+
+    async def run(self):
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                try:
+                    await self.flush()
+                except Exception:
+                    logger.exception("Ledger roll-up flush failed")
+        finally:
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Final ledger roll-up flush failed")
+
+    async def rebuild(self, day: str) -> int:
+        """Recompute the roll-up of ``day`` from the ledger itself."""
+        totals = await self.entries.aggregate(
+            [
+                {"$match": {"day": day}},
+                {
+                    "$group": {
+                        "_id": "$cost_center",
+                        "charged": {"$sum": {"$cond": [{"$gte": ["$amount", 0]}, "$amount", 0]}},
+                        "refunded": {"$sum": {"$cond": [{"$lt": ["$amount", 0]}, {"$subtract": [0, "$amount"]}, 0]}},
+                        "entries": {"$sum": 1},
+                    }
+                },
+            ]
+        ).to_list(None)
+        await self.rollups.delete_many({"day": day})
+        if totals:
+            await self.rollups.insert_many(
+                [
+                    {
+                        "_id": rollup_id(row["_id"], day),
+                        "cost_center": row["_id"],
+                        "day": day,
+                        "charged": row["charged"],
+                        "refunded": row["refunded"],
+                        "net": row["charged"] - row["refunded"],
+                        "entries": row["entries"],
+                    }
+                    for row in totals
+                ]
+            )
+        return len(totals)
+
+    async def report(self, start: str, end: str, cost_center: str = None) -> list:
+        query = {"day": {"$gte": start, "$lte": end}}
+        if cost_center is not None:
+            query["cost_center"] = cost_center
+        return await self.rollups.find(query, {"_id": 0}).sort(
+            [("day", 1), ("cost_center", 1)]
+        ).to_list(None)
+
+
+async def main(argv):
+    from db import get_database
+
+    if len(argv) != 2 or argv[0] != "--rebuild":
+        print(__doc__)
+        return 2
+    db = get_database()
+    ledger = BillingLedger(db.ledger, db.cost_center_daily)
+    print(f"{await ledger.rebuild(argv[1])} cost centers rebuilt for {argv[1]}")
+    return 0
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    sys.exit(asyncio.run(main(sys.argv[1:])))
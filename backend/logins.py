@@ -0,0 +1,57 @@
+# logins.py
+import asyncio
+import logging
+import os
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+LOGIN_FLUSH_INTERVAL = float(os.getenv("LOGIN_FLUSH_INTERVAL", "10"))
+
+
+class LoginTracker:
+    """Buffers ``last_login_at`` so logins never wait on it.
+
+    ``record`` only keeps the latest login per employee in memory; every
+    ``interval`` seconds ``flush`` writes them in one
+    ``EmployeeRepository.record_logins`` call, which never moves a login
+    time backwards, and a failed flush keeps its logins for the next one.
+    """
+
+    def __init__(self, interval: float = LOGIN_FLUSH_INTERVAL):
+        self.interval = interval
+        self.pending = {}  # w3_id -> latest login
+
+    def record(self, w3_id: str, at: datetime = None):
+        at = at or datetime.utcnow()
+        if at > self.pending.get(w3_id, at.min):
+            self.pending[w3_id] = at
+
+    async def flush(self, employees) -> int:
+        pending, self.pending = self.pending, {}
+        if not pending:
+            return 0
+        try:
+            await employees.record_logins(pending)
+        except Exception:
+            for w3_id, at in pending.items():
+                self.record(w3_id, at)
+            raise
+        return len(pending)
+
+    async def run(self, employees):
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                try:
+                    await self.flush(employees)
+                except Exception:
+                    logger.exception("Last-login flush failed")
+        finally:
+            try:
+                await self.flush(employees)
+            except Exception:
+                logger.exception("Final last-login flush failed")
+
+
+login_tracker = LoginTracker()
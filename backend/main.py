@@ -1,32 +1,89 @@
 from dotenv import load_dotenv
 load_dotenv()
 
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from starlette.middleware.sessions import SessionMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 from pydantic import BaseModel, Field
 from typing import Optional, List
+from contextlib import asynccontextmanager, suppress
+import asyncio
 import os
-from datetime import datetime, timedelta
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone, date as Date
+from collections import Counter
 
 BOOKING_COOLDOWN = timedelta(minutes=45)
 SEAT_COST = 5
+# best seats /assign tries before giving up
+ASSIGN_ATTEMPTS = 3
+COLLEAGUE_SEARCH_LIMIT = 25
+SEAT_PAGE_LIMIT = 1000
 
 from auth import router as auth_router, get_current_user
+from seat_cache import SeatSnapshot, SEAT_SNAPSHOT_TTL
+from seat_events import SeatHub
+from sweeper import SeatSweeper
+from http_client import get_http_client, close_http_client
+from employee_cache import employee_cache
+from storage import AlreadySeated, get_employee_repository, get_seat_repository, get_storage
+from reservations import (
+    ReservationBook,
+    SeatTaken,
+    AlreadyReserved,
+    SLOT_MINUTES,
+    clock,
+    resolve_date,
+    parse_slot,
+    slot_label,
+)
+from layout import load_sites, DEFAULT_SITE
+from seat_stream import seat_row, stream_json_array
+from ledger import BillingLedger
+from analytics import OccupancyRecorder, BUCKET_MINUTES
+from directory import colleague_directory
+from logins import login_tracker
+from metrics import BOOKINGS, CONFLICTS, RELEASES, MetricsMiddleware, render, worker_exit
+from prometheus_client import CONTENT_TYPE_LATEST
+from outbox import SeatOutbox, outbox_event
+import secrets
 
 # ENV
-MONGO_URL = os.getenv("MONGO_URL")
 SESSION_SECRET = os.getenv("SESSION_SECRET")
 
-# DB
-client = AsyncIOMotorClient(MONGO_URL)
-db = client.office_booking_db
-seats_collection = db.seats
-employees_collection = db.employees
+# STORAGE — one engine per process, shared with auth.py (see storage.py);
+# background workers hold these repositories, routes get theirs through Depends
+storage = get_storage()
+seats_repository = storage.seats
+employees_repository = storage.employees
 
 # APP
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await storage.open()
+    await seed()
+    get_http_client()
+    tasks = [
+        asyncio.create_task(seat_sweeper.run()),
+        asyncio.create_task(colleague_directory.run(employees_repository)),
+        asyncio.create_task(login_tracker.run(employees_repository)),
+        # before the ledger: its last drain records entries the ledger flushes
+        asyncio.create_task(outbox.run()),
+        asyncio.create_task(ledger.run()),
+        asyncio.create_task(occupancy.run(occupancy_samples)),
+        asyncio.create_task(storage.run()),
+    ]
+    yield
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    await close_http_client()
+    await storage.close()
+    worker_exit()
+
+app = FastAPI(lifespan=lifespan)
 app.include_router(auth_router)
 
 app.add_middleware(
@@ -38,6 +95,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Seat-Map-Version", "X-Seat-Map-Epoch", "X-Next-After"],
 )
 
 app.add_middleware(
@@ -47,138 +105,813 @@ app.add_middleware(
     https_only=False,
 )
 
+# outermost, so the timings include every other middleware
+app.add_middleware(MetricsMiddleware)
+
 # MODELS
 class Seat(BaseModel):
     id: int = Field(alias="_id")
     status: str
     price: int
     booked_by: Optional[str] = None
+    # when the live booking started; it auto-releases BOOKING_COOLDOWN later
+    booking_time: Optional[datetime] = None
+    site: Optional[str] = None
+    floor: Optional[int] = None
+    zone: Optional[str] = None
 
     class Config:
         populate_by_name = True
 
+# SITES — one snapshot and event hub per floor, built on first use
+floor_plans = load_sites()
+seat_floors = {
+    seat_id: key for key, plan in floor_plans.items() for seat_id in plan.seat_ids
+}
+default_floors = {}
+for site, floor in sorted(floor_plans):
+    default_floors.setdefault(site, floor)
+seat_snapshots = {
+    key: SeatSnapshot(
+        Seat,
+        # every write of an unshared engine is ours and patches the snapshot
+        ttl=SEAT_SNAPSHOT_TTL if storage.shared else 0,
+        scope={"site": key[0], "floor": key[1]},
+        row=seat_row,
+    )
+    for key in floor_plans
+}
+seat_hubs = {
+    key: SeatHub(snapshot, seats_repository) for key, snapshot in seat_snapshots.items()
+}
+reservation_book = ReservationBook(storage.bookings)
+ledger = BillingLedger(storage.collection("ledger"), storage.collection("cost_center_daily"))
+occupancy = OccupancyRecorder(storage.collection("occupancy"))
+outbox = SeatOutbox(seats_repository, lambda events: apply_seat_effects(events))
+seat_sweeper = SeatSweeper(
+    seats_repository,
+    employees_repository,
+    storage.collection("locks"),
+    hold=BOOKING_COOLDOWN,
+    refund=SEAT_COST,
+    on_release=lambda seats: on_auto_release(seats),
+)
+
 class BookingRequest(BaseModel):
     seat_id: int
     date: str
     time_slot: str
 
+class BatchBookingRequest(BaseModel):
+    seat_ids: Optional[List[int]] = None
+    site: Optional[str] = None
+    floor: Optional[int] = None
+    group_size: Optional[int] = Field(default=None, ge=1)
+    # colleagues booked alongside the caller, one seat each
+    members: List[str] = []
+
+class AssignRequest(BaseModel):
+    site: Optional[str] = None
+    floor: Optional[int] = None
+    zone: Optional[str] = None
+    # w3_id of a colleague to sit close to
+    near: Optional[str] = None
+    # avoid seats whose neighbours are taken
+    quiet: bool = True
+
 # STARTUP
-@app.on_event("startup")
 async def seed():
-    if await seats_collection.count_documents({}) == 0:
-        await seats_collection.insert_many(
-            [{"_id": i, "status": "available", "price": 5} for i in range(1, 101)]
+    # creates new seats and tags seats from before sites existed
+    for plan in floor_plans.values():
+        await seats_repository.seed(
+            plan.site,
+            plan.floor,
+            {seat_id: plan.zone_of(seat_id) for seat_id in plan.seat_ids},
+            plan.price,
+        )
+
+def floor_plan(site: Optional[str] = None, floor: Optional[int] = None):
+    site = site or DEFAULT_SITE
+    if floor is None:
+        floor = default_floors.get(site)
+    plan = floor_plans.get((site, floor))
+    if plan is None:
+        raise HTTPException(status_code=404, detail="Site or floor not found")
+    return plan
+
+async def refresh_seats(seat_ids):
+    # only the floors the seats are on are re-read
+    for key in {seat_floors.get(seat_id) for seat_id in seat_ids} - {None}:
+        await seat_snapshots[key].refresh(seats_repository)
+
+def apply_seats(docs):
+    # patch the snapshots from the documents a write returned, no re-read
+    for doc in docs:
+        key = seat_floors.get(doc["_id"])
+        if key is not None:
+            seat_snapshots[key].apply([doc])
+
+def expect_employee(w3_id: str, seat_id, at, tokens: int):
+    # mirror in the cache what the outbox is about to write
+    state = employee_cache.get(w3_id)
+    if state is not None:
+        employee_cache.set(
+            w3_id,
+            {
+                **state,
+                "last_booked_seat": seat_id,
+                "last_booking_at": at,
+                "blue_tokens_spent": state["blue_tokens_spent"] + tokens,
+            },
+        )
+
+async def apply_seat_effects(events):
+    """Outbox handler: token charges and refunds plus their ledger entries.
+
+    The employee repository skips events an employee already applied and
+    each ledger entry uses the event id as ``_id``, so redelivered events
+    are no-ops.
+    """
+    await employees_repository.apply_events(events, SEAT_COST)
+
+    centers = await cost_centers({event["w3_id"] for event in events})
+    await ledger.record(
+        *[
+            ledger.entry(
+                event["w3_id"],
+                SEAT_COST if event["kind"] == "book" else -SEAT_COST,
+                event["kind"],
+                event["seat_id"],
+                centers.get(event["w3_id"]),
+                event["at"],
+                key=event["id"],
+            )
+            for event in events
+        ]
+    )
+
+async def on_auto_release(seats):
+    for seat in seats:
+        employee_cache.invalidate(seat.get("booked_by"))
+    await refresh_seats([seat["_id"] for seat in seats])
+    record_occupancy([seat["_id"] for seat in seats], "release")
+    RELEASES.labels("expired").inc(len(seats))
+    owners = [seat["booked_by"] for seat in seats if seat.get("booked_by")]
+    centers = await cost_centers(owners)
+    await ledger.record(
+        *[
+            ledger.entry(w3_id, -SEAT_COST, "expire", seat["_id"], centers.get(w3_id))
+            for seat in seats
+            if (w3_id := seat.get("booked_by"))
+        ]
+    )
+
+async def cost_centers(w3_ids) -> dict:
+    """w3_id -> manager, from the employee cache or one lookup."""
+    centers, missing = {}, []
+    for w3_id in w3_ids:
+        state = employee_cache.get(w3_id)
+        if state is None:
+            missing.append(w3_id)
+        else:
+            centers[w3_id] = state.get("manager")
+    if missing:
+        for doc in await employees_repository.states(missing):
+            centers[doc["w3_id"]] = employee_cache.set(doc["w3_id"], doc)["manager"]
+    return centers
+
+def record_occupancy(seat_ids, kind: str):
+    for seat_id in seat_ids:
+        key = seat_floors.get(seat_id)
+        if key is not None:
+            occupancy.record(*key, floor_plans[key].zone_of(seat_id), kind)
+
+async def occupancy_samples():
+    # (site, floor, zone, occupied, capacity) for every zone of the floors
+    # in use; a floor nobody has looked at is not loaded just to sample it
+    samples = []
+    for key, plan in floor_plans.items():
+        if seat_snapshots[key].built_at is None:
+            continue
+        snapshot = await seat_snapshots[key].get(seats_repository)
+        occupied = Counter(
+            seat.get("zone") for seat in snapshot.seats.values() if seat["status"] == "occupied"
         )
+        for zone, seats in plan.zones.items():
+            samples.append((plan.site, plan.floor, zone, occupied[zone], len(seats)))
+    return samples
+
+def holds_seat(w3_id: str, state: Optional[dict]) -> bool:
+    # cached state is only trusted while the seat map agrees with it
+    if not state or state.get("last_booked_seat") is None:
+        return False
+    key = seat_floors.get(state["last_booked_seat"])
+    if key is None:
+        return False
+    seat = seat_snapshots[key].seats.get(state["last_booked_seat"])
+    return bool(seat) and seat.get("booked_by") == w3_id
+
+def resolve_slot(date_label: str, time_label: str):
+    try:
+        return resolve_date(date_label), parse_slot(time_label)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date or time slot")
+
+def is_advance(day: Date, start: int) -> bool:
+    # the slot under way is booked live; later slots, today's too, are reservations
+    today, minutes = clock()
+    if day < today or (day == today and start + SLOT_MINUTES <= minutes):
+        raise HTTPException(status_code=400, detail="Cannot book in the past")
+    return day > today or start > minutes - minutes % SLOT_MINUTES
+
+def held_live_at(seat: dict, day: Date, start: int) -> bool:
+    # a live booking holds its seat until it auto-releases, which may run
+    # into a later slot today
+    today, minutes = clock()
+    if day != today or seat.get("status") != "occupied" or seat.get("booking_time") is None:
+        return False
+    slot_start = datetime.utcnow() + timedelta(minutes=start - minutes)
+    return seat["booking_time"] + BOOKING_COOLDOWN > slot_start
+
+async def reserved_now() -> dict:
+    """seat_id -> [(day, start, w3_id)] of the reservations a live booking
+    made now would run into: the slot under way and every slot that starts
+    before the booking auto-releases."""
+    today, minutes = clock()
+    end = minutes + BOOKING_COOLDOWN.total_seconds() / 60
+    index = await reservation_book.day(today)
+    held = {}
+    for start, taken in index.between(minutes - minutes % SLOT_MINUTES, end):
+        for seat_id, w3_id in taken.items():
+            held.setdefault(seat_id, []).append((today, start, w3_id))
+    return held
+
+def reserved_by_others(held: dict, seat_id: int, w3_id: str) -> bool:
+    return any(holder != w3_id for _, _, holder in held.get(seat_id, ()))
 
 # ROUTES
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(render(), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/me")
-async def me(user=Depends(get_current_user)):
+async def me(
+    user=Depends(get_current_user),
+    employees_repository=Depends(get_employee_repository),
+):
+    state = await employee_cache.load(employees_repository, user["w3_id"]) or {}
     return {
         "w3_id": user["w3_id"],
         "name": user.get("name"),
         "email": user.get("email"),
+        "last_booked_seat": state.get("last_booked_seat"),
+        "blue_tokens_spent": state.get("blue_tokens_spent", 0),
     }
 
 
+@app.get("/sites")
+async def list_sites(user=Depends(get_current_user)):
+    return ORJSONResponse(
+        [
+            {
+                "site": plan.site,
+                "name": plan.name,
+                "floor": plan.floor,
+                "seats": len(plan.seat_ids),
+                "zones": {
+                    zone: [seats.start, seats.stop - 1] for zone, seats in plan.zones.items()
+                },
+            }
+            for plan in floor_plans.values()
+        ]
+    )
+
+
+@app.get("/colleagues/search")
+async def search_colleagues(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=COLLEAGUE_SEARCH_LIMIT),
+    site: Optional[str] = None,
+    floor: Optional[int] = None,
+    user=Depends(get_current_user),
+    seats_repository=Depends(get_seat_repository),
+):
+    # colleagues can sit on any floor; the one being viewed is looked at first
+    viewed = floor_plan(site, floor).key
+    keys = [viewed, *(key for key in floor_plans if key != viewed)]
+    colleagues = colleague_directory.search(q, limit)
+    seated = {}
+    for key in keys:
+        if len(seated) == len(colleagues):
+            break
+        snapshot = await seat_snapshots[key].get(seats_repository)
+        for colleague in colleagues:
+            seat_id = snapshot.by_user.get(colleague["w3_id"])
+            if seat_id is not None:
+                seated.setdefault(colleague["w3_id"], (key, seat_id))
+
+    results = []
+    for colleague in colleagues:
+        key, seat_id = seated.get(colleague["w3_id"], (None, None))
+        plan = floor_plans.get(key)
+        free_nearby = (
+            [
+                other
+                for other in plan.index.neighbors.get(seat_id, [])
+                if seat_snapshots[key].seats.get(other, {}).get("status") == "available"
+            ]
+            if plan
+            else []
+        )
+        results.append(
+            {
+                **colleague,
+                "seat_id": seat_id,
+                "site": plan.site if plan else None,
+                "floor": plan.floor if plan else None,
+                "zone": plan.zone_of(seat_id) if plan else None,
+                "free_nearby": free_nearby,
+            }
+        )
+    return ORJSONResponse(results)
+
+
 @app.get("/seats", response_model=List[Seat])
-async def get_seats(user=Depends(get_current_user)):
-    return await seats_collection.find().to_list(1000)
+async def get_seats(
+    request: Request,
+    since: Optional[int] = None,
+    epoch: Optional[str] = None,
+    date: Optional[str] = None,
+    time_slot: Optional[str] = None,
+    site: Optional[str] = None,
+    floor: Optional[int] = None,
+    after: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=SEAT_PAGE_LIMIT),
+    user=Depends(get_current_user),
+    seats_repository=Depends(get_seat_repository),
+):
+    plan = floor_plan(site, floor)
+    snapshot = await seat_snapshots[plan.key].get(seats_repository)
+
+    # availability of one future slot, from the in-memory day index
+    if date and time_slot:
+        day, start = resolve_slot(date, time_slot)
+        if is_advance(day, start):
+            taken = (await reservation_book.day(day)).taken(start)
+            seats = [
+                {**seat, "status": "occupied", "booked_by": taken[seat_id], "booking_time": None}
+                if seat_id in taken
+                else seat
+                if held_live_at(seat, day, start)
+                else {**seat, "status": "available", "booked_by": None, "booking_time": None}
+                for seat_id, seat in snapshot.seats.items()
+            ]
+            # rows come from the snapshot, already in the Seat shape
+            return ORJSONResponse(seats)
+
+        # the slot under way: live bookings plus the seats reserved through it
+        held = await reserved_now()
+        if held.keys() & snapshot.seats.keys():
+            seats = [
+                {**seat, "status": "occupied", "booked_by": held[seat_id][0][2]}
+                if seat_id in held and seat["status"] == "available"
+                else seat
+                for seat_id, seat in snapshot.seats.items()
+            ]
+            return ORJSONResponse(seats)
+
+    headers = {
+        "ETag": snapshot.etag,
+        "Cache-Control": "no-cache",
+        "X-Seat-Map-Version": str(snapshot.version),
+        "X-Seat-Map-Epoch": snapshot.epoch,
+    }
+
+    # client already holds the current map
+    if snapshot.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+
+    # only the seats that changed after `since`
+    if since is not None:
+        return Response(
+            content=snapshot.delta_body(since, epoch),
+            media_type="application/json",
+            headers=headers,
+        )
+
+    # one page of a large floor, by seat id
+    if limit is not None:
+        ids = list(snapshot.seats)
+        first = bisect_right(ids, after) if after is not None else 0
+        page = [snapshot.seats[seat_id] for seat_id in ids[first:first + limit]]
+        if first + limit < len(ids):
+            headers["X-Next-After"] = str(page[-1]["_id"])
+        return ORJSONResponse(page, headers=headers)
+
+    return Response(
+        content=snapshot.body,
+        media_type="application/json",
+        headers=headers,
+    )
+
+@app.get("/seats/export")
+async def export_seats(
+    site: Optional[str] = None,
+    floor: Optional[int] = None,
+    user=Depends(get_current_user),
+    seats_repository=Depends(get_seat_repository),
+):
+    # streamed from storage: fleet-wide listings never fit a snapshot
+    if site and floor is not None:
+        plan = floor_plan(site, floor)
+        docs = seats_repository.export(plan.site, plan.floor)
+    elif site:
+        if site not in default_floors:
+            raise HTTPException(status_code=404, detail="Site or floor not found")
+        docs = seats_repository.export(site)
+    else:
+        docs = seats_repository.export()
+    return StreamingResponse(stream_json_array(docs), media_type="application/json")
+
+@app.get("/seats/stream")
+async def stream_seats(
+    site: Optional[str] = None,
+    floor: Optional[int] = None,
+    user=Depends(get_current_user),
+):
+    hub = seat_hubs[floor_plan(site, floor).key]
+    return StreamingResponse(
+        hub.stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.post("/book")
-async def book_seat(payload: BookingRequest, user=Depends(get_current_user)):
-    employee = await employees_collection.find_one({"w3_id": user["w3_id"]})
+async def book_seat(
+    payload: BookingRequest,
+    user=Depends(get_current_user),
+    seats_repository=Depends(get_seat_repository),
+    employees_repository=Depends(get_employee_repository),
+):
+    w3_id = user["w3_id"]
+    day, start = resolve_slot(payload.date, payload.time_slot)
+    if is_advance(day, start):
+        return await reserve_seat(payload.seat_id, day, start, w3_id, employees_repository)
+
+    try:
+        await book_live(payload.seat_id, w3_id, seats_repository, employees_repository)
+    except SeatTaken:
+        raise HTTPException(status_code=400, detail="Seat unavailable")
 
-    # already has an active seat
-    if employee and employee.get("last_booked_seat"):
+    return {"message": "Seat booked"}
+
+async def book_live(seat_id: int, w3_id: str, seats_repository, employees_repository):
+    """Occupy ``seat_id`` for ``w3_id`` now; raises SeatTaken if it is gone
+    or reserved by someone else for the next ``BOOKING_COOLDOWN``.
+
+    The seat update is the only write on the request path: it carries the
+    outbox event that charges the employee and records the ledger entry.
+    The caller's own reservations of the seat are refunded, as the live
+    booking replaces them.
+    """
+    now = datetime.utcnow()
+    active_booking = HTTPException(
+        status_code=400,
+        detail="You already have an active booking. Release it first.",
+    )
+
+    # answered from memory when we already know about the active seat
+    if holds_seat(w3_id, employee_cache.get(w3_id)) or any(
+        w3_id in snapshot.by_user for snapshot in seat_snapshots.values()
+    ):
+        CONFLICTS.labels("active_booking").inc()
+        raise active_booking
+
+    held = await reserved_now()
+    if reserved_by_others(held, seat_id, w3_id):
+        CONFLICTS.labels("seat_reserved").inc()
+        raise SeatTaken()
+
+    # claim the seat: only matches while it is still available
+    event = outbox_event("book", w3_id, seat_id, now)
+    try:
+        seat = await seats_repository.claim(seat_id, w3_id, now, event)
+    except AlreadySeated:
+        # they sit elsewhere, booked by another replica or in a batch
+        CONFLICTS.labels("active_booking").inc()
+        raise active_booking
+    if seat is None:
+        CONFLICTS.labels("seat_taken").inc()
+        raise SeatTaken()
+
+    # checking in to a reserved seat: the live booking takes over the slot
+    for day, start, _ in held.get(seat_id, ()):
+        await cancel_reservation(seat_id, day, start, w3_id, employees_repository)
+
+    outbox.enqueue(event)
+    expect_employee(w3_id, seat_id, now, SEAT_COST)
+    apply_seats([seat])
+    record_occupancy([seat_id], "book")
+    BOOKINGS.labels("live").inc()
+
+@app.post("/assign")
+async def assign_seat(
+    payload: Optional[AssignRequest] = None,
+    user=Depends(get_current_user),
+    seats_repository=Depends(get_seat_repository),
+    employees_repository=Depends(get_employee_repository),
+):
+    payload = payload or AssignRequest()
+    plan = floor_plan(payload.site, payload.floor)
+    if payload.zone is not None and payload.zone not in plan.zones:
+        raise HTTPException(status_code=400, detail=f"Unknown zone: {payload.zone}")
+
+    snapshot = await seat_snapshots[plan.key].get(seats_repository)
+    held = await reserved_now()
+    free = {
+        seat_id
+        for seat_id, seat in snapshot.seats.items()
+        if seat["status"] == "available" and not reserved_by_others(held, seat_id, user["w3_id"])
+    }
+    near = snapshot.by_user.get(payload.near) if payload.near else None
+
+    picks = plan.index.pick(
+        free,
+        zone=payload.zone,
+        near=near,
+        quiet=payload.quiet,
+        limit=ASSIGN_ATTEMPTS,
+    )
+    if not picks:
+        raise HTTPException(status_code=400, detail="No seats available")
+
+    # the snapshot can trail other replicas; fall back to the next best seat
+    for seat_id in picks:
+        try:
+            await book_live(seat_id, user["w3_id"], seats_repository, employees_repository)
+        except SeatTaken:
+            continue
+        return {
+            "message": "Seat booked",
+            "seat_id": seat_id,
+            "zone": plan.zone_of(seat_id),
+            "near": near,
+        }
+    raise HTTPException(status_code=400, detail="Seats unavailable, try again")
+
+@app.post("/book/batch")
+async def book_batch(
+    payload: BatchBookingRequest,
+    user=Depends(get_current_user),
+    seats_repository=Depends(get_seat_repository),
+    employees_repository=Depends(get_employee_repository),
+):
+    members = list(dict.fromkeys([user["w3_id"], *payload.members]))
+    known = {doc["w3_id"] for doc in await employees_repository.states(members)}
+    unknown = [w3_id for w3_id in members if w3_id not in known]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown group members: {', '.join(unknown)}",
+        )
+    held = await reserved_now()
+
+    if payload.seat_ids:
+        seat_ids = list(dict.fromkeys(payload.seat_ids))
+    elif payload.group_size:
+        plan = floor_plan(payload.site, payload.floor)
+        snapshot = await seat_snapshots[plan.key].get(seats_repository)
+        free = {
+            seat_id
+            for seat_id, seat in snapshot.seats.items()
+            if seat["status"] == "available" and seat_id not in held
+        }
+        seat_ids = plan.find_adjacent(free, payload.group_size)
+        if not seat_ids:
+            raise HTTPException(
+                status_code=400,
+                detail=f"No {payload.group_size} adjacent seats available",
+            )
+    else:
+        raise HTTPException(status_code=422, detail="Give seat_ids or group_size")
+
+    if len(seat_ids) != len(members):
         raise HTTPException(
             status_code=400,
-            detail="You already have an active booking. Release it first.",
+            detail="Need exactly one seat per group member",
         )
 
-    # cooldown check ONLY if user still has a seat
-    if (
-        employee
-        and employee.get("last_booked_seat")
-        and employee.get("last_booking_at")
-    ):
-        last = employee["last_booking_at"]
-        if datetime.utcnow() - last < BOOKING_COOLDOWN:
+    now = datetime.utcnow()
+    batch_id = secrets.token_hex(8)
+    pairs = list(zip(members, seat_ids))
+    if any(reserved_by_others(held, seat_id, w3_id) for w3_id, seat_id in pairs):
+        CONFLICTS.labels("seat_reserved").inc()
+        raise HTTPException(status_code=400, detail="Seats unavailable")
+
+    # claim every member in one write, then every seat in one write
+    claimed = await employees_repository.claim_batch(pairs, now, SEAT_COST)
+    seats_claimed = None
+    if claimed == len(pairs):
+        seats_claimed = await seats_repository.claim_batch(pairs, now, batch_id)
+
+    if seats_claimed != len(pairs):
+        # all or nothing: undo whatever part of the batch went through
+        if seats_claimed:
+            await seats_repository.undo_batch(seat_ids, batch_id)
+            # a snapshot rebuilt since the claim shows the undone seats taken
+            await refresh_seats(seat_ids)
+        if claimed:
+            await employees_repository.undo_batch(pairs, now, SEAT_COST)
+        for w3_id in members:
+            employee_cache.invalidate(w3_id)
+        CONFLICTS.labels("batch").inc()
+        if seats_claimed is None:
             raise HTTPException(
                 status_code=400,
-                detail="You can book only once every 45 minutes.",
+                detail="A group member already has an active booking.",
             )
+        raise HTTPException(status_code=400, detail="Seats unavailable")
+
+    for w3_id in members:
+        employee_cache.invalidate(w3_id)
+    # members checking in to seats they reserved: the batch takes over the slot
+    for w3_id, seat_id in pairs:
+        for day, start, holder in held.get(seat_id, ()):
+            if holder == w3_id:
+                await cancel_reservation(seat_id, day, start, w3_id, employees_repository)
+    await refresh_seats(seat_ids)
+    record_occupancy(seat_ids, "book")
+    BOOKINGS.labels("batch").inc(len(pairs))
+    centers = await cost_centers(members)
+    await ledger.record(
+        *[
+            ledger.entry(w3_id, SEAT_COST, "book", seat_id, centers.get(w3_id), now)
+            for w3_id, seat_id in pairs
+        ]
+    )
 
+    return {
+        "message": "Seats booked",
+        "seats": [{"seat_id": seat_id, "w3_id": w3_id} for w3_id, seat_id in pairs],
+    }
 
-    seat = await seats_collection.find_one({"_id": payload.seat_id})
-    if not seat or seat["status"] == "occupied":
+async def reserve_seat(seat_id: int, day: Date, start: int, w3_id: str, employees_repository):
+    if seat_id not in seat_floors:
+        raise HTTPException(status_code=404, detail="Seat not found")
+
+    # someone sitting there now may still hold it when the slot starts
+    snapshot = await seat_snapshots[seat_floors[seat_id]].get(seats_repository)
+    if held_live_at(snapshot.seats[seat_id], day, start):
+        CONFLICTS.labels("seat_taken").inc()
         raise HTTPException(status_code=400, detail="Seat unavailable")
 
-    # update seat
-    await seats_collection.update_one(
-        {"_id": payload.seat_id},
-        {
-            "$set": {
-                "status": "occupied",
-                "booked_by": user["w3_id"],
-                "booking_time": datetime.utcnow(),
-            }
-        },
-    )
+    try:
+        await reservation_book.reserve(seat_id, day, start, w3_id)
+    except SeatTaken:
+        CONFLICTS.labels("seat_taken").inc()
+        raise HTTPException(status_code=400, detail="Seat unavailable")
+    except AlreadyReserved:
+        CONFLICTS.labels("active_booking").inc()
+        raise HTTPException(
+            status_code=400,
+            detail="You already have a reservation for this time slot.",
+        )
+
+    employee = await employees_repository.charge(w3_id, SEAT_COST, upsert=True)
+    employee_cache.set(w3_id, employee)
+    await ledger.record(ledger.entry(w3_id, SEAT_COST, "reserve", seat_id, employee.get("manager")))
+    BOOKINGS.labels("advance").inc()
+
+    return {
+        "message": "Seat reserved",
+        "date": day.isoformat(),
+        "time_slot": slot_label(start),
+    }
 
-    # update employee (INCLUDING blue tokens)
-    await employees_collection.update_one(
-        {"w3_id": user["w3_id"]},
+async def cancel_reservation(seat_id: int, day: Date, start: int, w3_id: str, employees_repository) -> bool:
+    if not await reservation_book.cancel(seat_id, day, start, w3_id):
+        return False
+    employee = await employees_repository.charge(w3_id, -SEAT_COST)
+    employee_cache.set(w3_id, employee)
+    await ledger.record(
+        ledger.entry(w3_id, -SEAT_COST, "cancel", seat_id, (employee or {}).get("manager"))
+    )
+    RELEASES.labels("cancel").inc()
+    return True
+
+@app.get("/billing/cost-centers")
+async def cost_center_report(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    cost_center: Optional[str] = None,
+    user=Depends(get_current_user),
+):
+    try:
+        # ledger days are UTC, like every other timestamp we store
+        start = Date.fromisoformat(start) if start else datetime.utcnow().date()
+        end = Date.fromisoformat(end) if end else start
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date")
+    rows = await ledger.report(start.isoformat(), end.isoformat(), cost_center)
+    return ORJSONResponse(rows)
+
+@app.get("/analytics/occupancy")
+async def occupancy_report(
+    site: Optional[str] = None,
+    floor: Optional[int] = None,
+    zone: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    user=Depends(get_current_user),
+    seats_repository=Depends(get_seat_repository),
+):
+    plan = floor_plan(site, floor)
+    if zone is not None and zone not in plan.zones:
+        raise HTTPException(status_code=400, detail=f"Unknown zone: {zone}")
+
+    # buckets are keyed by naive UTC, like every other timestamp we store
+    def utc(value: datetime) -> datetime:
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+    end = utc(end) if end else datetime.utcnow()
+    start = utc(start) if start else end - timedelta(hours=4)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start is after end")
+    try:
+        buckets = await occupancy.query(plan.site, plan.floor, start, end, zone)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    snapshot = await seat_snapshots[plan.key].get(seats_repository)
+    occupied = Counter(
+        seat.get("zone") for seat in snapshot.seats.values() if seat["status"] == "occupied"
+    )
+    return ORJSONResponse(
         {
-            "$addToSet": {"booked_seats": payload.seat_id},
-            "$inc": {"blue_tokens_spent": SEAT_COST},
-            "$set": {
-                "last_booking_at": datetime.utcnow(),
-                "last_booked_seat": payload.seat_id,
+            "site": plan.site,
+            "floor": plan.floor,
+            "bucket_minutes": BUCKET_MINUTES,
+            "live": {
+                name: {"occupied": occupied[name], "capacity": len(seats)}
+                for name, seats in plan.zones.items()
+                if zone is None or name == zone
             },
-        },
-        upsert=True,
+            "buckets": buckets,
+        }
     )
 
-    return {"message": "Seat booked"}
+@app.get("/reservations")
+async def my_reservations(date: str = "Today", user=Depends(get_current_user)):
+    try:
+        day = resolve_date(date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date")
+    index = await reservation_book.day(day)
+    return ORJSONResponse(
+        [
+            {"seat_id": seat_id, "date": day.isoformat(), "time_slot": slot_label(start)}
+            for start, seat_id in index.for_user(user["w3_id"])
+        ]
+    )
 
 @app.post("/release/{seat_id}")
-async def release_seat(seat_id: int, user=Depends(get_current_user)):
-    seat = await seats_collection.find_one({"_id": seat_id})
-
-    # seat not owned by user
-    if not seat or seat.get("booked_by") != user["w3_id"]:
-        raise HTTPException(status_code=403, detail="Not allowed")
-
-    # release the seat
-    await seats_collection.update_one(
-        {"_id": seat_id},
-        {
-            "$set": {
-                "status": "available",
-                "booked_by": None,
-                "booking_time": None,
+async def release_seat(
+    seat_id: int,
+    date: Optional[str] = None,
+    time_slot: Optional[str] = None,
+    user=Depends(get_current_user),
+    seats_repository=Depends(get_seat_repository),
+    employees_repository=Depends(get_employee_repository),
+):
+    # cancel a reservation; one for the slot under way may be a live booking
+    if date and time_slot:
+        day, start = resolve_slot(date, time_slot)
+        advance = is_advance(day, start)
+        if await cancel_reservation(seat_id, day, start, user["w3_id"], employees_repository):
+            return {
+                "message": "Reservation cancelled",
+                "tokens_refunded": SEAT_COST,
             }
-        },
-    )
-
-    # update employee (refund blue tokens + clear booking)
-    await employees_collection.update_one(
-    {"w3_id": user["w3_id"]},
-    {
-        "$inc": {"blue_tokens_spent": -SEAT_COST},
-        "$pull": {"booked_seats": seat_id},
-        "$set": {
-            "last_booked_seat": None,
-            "last_booking_at": None,  # 👈 reset cooldown
-        },
-    },
-)
+        if advance:
+            raise HTTPException(status_code=403, detail="Not allowed")
+
+    # release the seat only if this user holds it; the refund (and the
+    # cooldown reset) follows through the outbox
+    event = outbox_event("release", user["w3_id"], seat_id)
+    seat = await seats_repository.free(seat_id, user["w3_id"], event)
+    if seat is None:
+        raise HTTPException(status_code=403, detail="Not allowed")
 
+    outbox.enqueue(event)
+    expect_employee(user["w3_id"], None, None, -SEAT_COST)
+    apply_seats([seat])
+    record_occupancy([seat_id], "release")
+    RELEASES.labels("user").inc()
 
     return {
         "message": "Seat released",
         "tokens_refunded": SEAT_COST,
     }
-
-
@@ -1,13 +1,17 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, Field
 from typing import List, Optional
 from motor.motor_asyncio import AsyncIOMotorClient
 from jose import jwt
-import requests
+import httpx
 import os
 from dotenv import load_dotenv
+from jwks import JWKSCache
+from token_cache import VerifiedTokenCache
+from metrics import render
+from prometheus_client import CONTENT_TYPE_LATEST
 
 # ----------------- ENV -----------------
 load_dotenv()
@@ -21,25 +25,30 @@ if not JWKS_URL or not ISSUER or not MONGO_URL:
 # ----------------- SECURITY -----------------
 security = HTTPBearer()
 
-def get_jwks():
+jwks_cache = JWKSCache(JWKS_URL)
+token_cache = VerifiedTokenCache()
+
+async def get_signing_key(kid: str):
     try:
-        return requests.get(JWKS_URL, timeout=5).json()
-    except Exception:
+        return await jwks_cache.get_key(kid)
+    except httpx.HTTPError:
         raise HTTPException(status_code=503, detail="Unable to fetch JWKS")
 
-def verify_jwt(token: str):
+async def verify_jwt(token: str):
     header = jwt.get_unverified_header(token)
     kid = header.get("kid")
-    jwks = get_jwks()
-    key = next((k for k in jwks["keys"] if k["kid"] == kid), None)
+    key = await get_signing_key(kid)
     if not key:
         raise HTTPException(status_code=401, detail="Invalid token key")
     
     return jwt.decode(token, key, algorithms=["RS256"], issuer=ISSUER)
 
-def get_current_user(creds: HTTPAuthorizationCredentials = Depends(security)):
+async def get_current_user(creds: HTTPAuthorizationCredentials = Depends(security)):
     try:
-        payload = verify_jwt(creds.credentials)
+        payload = token_cache.get(creds.credentials)
+        if payload is None:
+            payload = await verify_jwt(creds.credentials)
+            token_cache.put(creds.credentials, payload)
         return {
             "w3_id": payload["sub"],
             "name": payload.get("name"),
@@ -90,6 +99,11 @@ async def seed_database():
         print("Database seeded with 100 seats")
 
 # ----------------- ROUTES -----------------
+# token cache hits and misses, as cache_lookups_total{cache="token"}
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(render(), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/seats", response_model=List[Seat])
 async def get_seats(user=Depends(get_current_user)):
     return await seats_collection.find().sort("_id", 1).to_list(1000)
@@ -0,0 +1,481 @@
+# memory_collections.py
+"""Motor-compatible collections held in process memory.
+
+They implement the subset of the collection API the backend uses: filters
+with equality, comparison, ``$in``/``$nin``/``$ne``/``$exists``/``$type``
+and ``$or``; the update operators the booking paths send; upserts; unique
+(and partial unique) indexes; ``bulk_write`` and ``insert_many`` with their
+write errors. The memory storage engine keeps its reporting collections
+(ledger, roll-ups, occupancy buckets, locks) here, and fake_mongo builds
+the test stand-in for the Motor client on top of them.
+"""
+import copy
+from collections import Counter
+from types import SimpleNamespace
+
+from bson import ObjectId
+from pymongo import InsertOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+
+DUPLICATE_KEY = 11000
+INDEX_NOT_FOUND = 27
+_MISSING = object()
+
+
+def _values(doc, path: str) -> list:
+    """Every value ``path`` reaches, descending into arrays like Mongo does."""
+    values = [doc]
+    for part in path.split("."):
+        found = []
+        for value in values:
+            if isinstance(value, list):
+                value = [
+                    item.get(part, _MISSING) if isinstance(item, dict) else _MISSING
+                    for item in value
+                ]
+                found.extend(value)
+            elif isinstance(value, dict):
+                found.append(value.get(part, _MISSING))
+            else:
+                found.append(_MISSING)
+        values = found
+    return values or [_MISSING]
+
+
+def _equals(value, expected) -> bool:
+    if expected is None:
+        return value is _MISSING or value is None
+    if isinstance(value, list) and not isinstance(expected, list):
+        return expected in value
+    return value is not _MISSING and value == expected
+
+
+def _compare(value, op: str, bound) -> bool:
+    if value is _MISSING or value is None:
+        return False
+    try:
+        if op == "$lt":
+            return value < bound
+        if op == "$lte":
+            return value <= bound
+        if op == "$gt":
+            return value > bound
+        return value >= bound
+    except TypeError:
+        return False
+
+
+_TYPES = {"string": str, "int": int, "bool": bool, "array": list, "object": dict}
+
+
+def _condition(values: list, op: str, arg) -> bool:
+    if op == "$ne":
+        return not any(_equals(value, arg) for value in values)
+    if op == "$in":
+        return any(_equals(value, expected) for value in values for expected in arg)
+    if op == "$nin":
+        return not any(_equals(value, expected) for value in values for expected in arg)
+    if op == "$exists":
+        return any(value is not _MISSING for value in values) == bool(arg)
+    if op == "$type":
+        return any(isinstance(value, _TYPES[arg]) for value in values)
+    if op in ("$lt", "$lte", "$gt", "$gte"):
+        return any(_compare(value, op, arg) for value in values)
+    raise NotImplementedError(f"memory collections do not support {op}")
+
+
+def matches(doc: dict, query: dict) -> bool:
+    for key, cond in query.items():
+        if key == "$or":
+            if not any(matches(doc, sub) for sub in cond):
+                return False
+            continue
+        if key == "$and":
+            if not all(matches(doc, sub) for sub in cond):
+                return False
+            continue
+        values = _values(doc, key)
+        if isinstance(cond, dict) and cond and all(op.startswith("$") for op in cond):
+            if not all(_condition(values, op, arg) for op, arg in cond.items()):
+                return False
+        elif not any(_equals(value, cond) for value in values):
+            return False
+    return True
+
+
+def _set(doc: dict, path: str, value):
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[last] = value
+
+
+def _get(doc: dict, path: str, default=None):
+    for part in path.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return default
+        doc = doc[part]
+    return doc
+
+
+def _pull_matches(item, cond) -> bool:
+    if isinstance(cond, dict) and isinstance(item, dict):
+        return matches(item, cond)
+    return item == cond
+
+
+def apply_update(doc: dict, update: dict, inserting: bool = False):
+    for op, fields in update.items():
+        if op == "$setOnInsert":
+            if inserting:
+                for path, value in fields.items():
+                    _set(doc, path, copy.deepcopy(value))
+            continue
+        for path, value in fields.items():
+            current = _get(doc, path, _MISSING)
+            if op == "$set":
+                _set(doc, path, copy.deepcopy(value))
+            elif op == "$unset":
+                parent = _get(doc, path.rpartition(".")[0]) if "." in path else doc
+                if isinstance(parent, dict):
+                    parent.pop(path.rpartition(".")[2], None)
+            elif op == "$inc":
+                _set(doc, path, (0 if current is _MISSING else current) + value)
+            elif op in ("$max", "$min"):
+                if current is _MISSING or current is None:
+                    _set(doc, path, value)
+                elif (value > current) if op == "$max" else (value < current):
+                    _set(doc, path, value)
+            elif op in ("$push", "$addToSet"):
+                items = list(current) if isinstance(current, list) else []
+                each = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                for item in each:
+                    if op == "$push" or item not in items:
+                        items.append(copy.deepcopy(item))
+                if isinstance(value, dict) and "$slice" in value:
+                    limit = value["$slice"]
+                    items = items[limit:] if limit < 0 else items[:limit]
+                _set(doc, path, items)
+            elif op == "$pull":
+                if isinstance(current, list):
+                    _set(doc, path, [item for item in current if not _pull_matches(item, value)])
+            else:
+                raise NotImplementedError(f"memory collections do not support {op}")
+
+
+def project(doc: dict, projection) -> dict:
+    if not projection:
+        return copy.deepcopy(doc)
+    shown = {field for field, flag in projection.items() if flag and field != "_id"}
+    hidden = {field for field, flag in projection.items() if not flag}
+    if shown:
+        result = {field: copy.deepcopy(doc[field]) for field in shown if field in doc}
+        if "_id" not in hidden and "_id" in doc:
+            result["_id"] = doc["_id"]
+        return result
+    return {field: copy.deepcopy(value) for field, value in doc.items() if field not in hidden}
+
+
+def _sort_key(spec):
+    def key(doc):
+        parts = []
+        for field, _ in spec:
+            value = _get(doc, field)
+            parts.append((value is not None, value))
+        return parts
+
+    return key
+
+
+class MemoryCursor:
+    def __init__(self, collection, query, projection):
+        self.collection = collection
+        self.query = query or {}
+        self.projection = projection
+        self._sort = []
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key, direction=1):
+        self._sort = list(key) if isinstance(key, list) else [(key, direction)]
+        return self
+
+    def skip(self, count: int):
+        self._skip = count
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    def batch_size(self, size: int):
+        return self
+
+    def _docs(self) -> list:
+        docs = [doc for doc in self.collection.docs.values() if matches(doc, self.query)]
+        # stable sorts, last key first, so mixed directions work
+        for field, direction in reversed(self._sort):
+            docs.sort(key=_sort_key([(field, direction)]), reverse=direction < 0)
+        docs = docs[self._skip :]
+        if self._limit:
+            docs = docs[: self._limit]
+        return [project(doc, self.projection) for doc in docs]
+
+    async def to_list(self, length=None):
+        await self.collection._round_trip("find")
+        docs = self._docs()
+        return docs if length is None else docs[:length]
+
+    async def __aiter__(self):
+        for doc in await self.to_list(None):
+            yield doc
+
+
+class MemoryCollection:
+    def __init__(self, database, name: str):
+        self.database = database
+        self.name = name
+        self.docs = {}  # _id -> document, in insertion order
+        self.unique = []  # (name, keys, partial filter)
+        self.indexes = set()  # names of the created indexes
+
+    async def _round_trip(self, op: str):
+        """Called once per operation; fake_mongo counts and delays them."""
+
+    # -- writes
+    def _check_unique(self, doc: dict):
+        for name, keys, partial in self.unique:
+            if partial and not matches(doc, partial):
+                continue
+            key = [_get(doc, field) for field in keys]
+            for other in self.docs.values():
+                if other is doc or other.get("_id") == doc.get("_id"):
+                    continue
+                if partial and not matches(other, partial):
+                    continue
+                if [_get(other, field) for field in keys] == key:
+                    raise DuplicateKeyError(
+                        f"E11000 duplicate key error index: {name}",
+                        DUPLICATE_KEY,
+                        {"keyPattern": dict.fromkeys(keys, 1)},
+                    )
+
+    def _insert(self, doc: dict):
+        doc = copy.deepcopy(doc)
+        doc.setdefault("_id", ObjectId())
+        if doc["_id"] in self.docs:
+            raise DuplicateKeyError("E11000 duplicate key error index: _id_", DUPLICATE_KEY)
+        self._check_unique(doc)
+        self.docs[doc["_id"]] = doc
+        self.database.writes += 1
+        return doc
+
+    def load(self, docs):
+        """Insert ``docs`` as they are, e.g. from a snapshot; no round trip."""
+        for doc in docs:
+            self._insert(doc)
+
+    def _update(self, query: dict, update: dict, upsert: bool, many: bool):
+        """Returns (matched, modified, upserted_id, documents after)."""
+        if list(query) == ["_id"] and not isinstance(query["_id"], dict):
+            # by primary key, like the roll-up and bucket upserts
+            doc = self.docs.get(query["_id"])
+            found = [] if doc is None else [doc]
+        else:
+            found = [doc for doc in self.docs.values() if matches(doc, query)]
+        if not many:
+            found = found[:1]
+        if not found:
+            if not upsert:
+                return 0, 0, None, []
+            doc = {
+                field: value
+                for field, value in query.items()
+                if not field.startswith("$")
+                and not (isinstance(value, dict) and any(k.startswith("$") for k in value))
+            }
+            apply_update(doc, update, inserting=True)
+            doc = self._insert(doc)
+            return 0, 0, doc["_id"], [doc]
+
+        modified = 0
+        for doc in found:
+            after = copy.deepcopy(doc)
+            apply_update(after, update)
+            if after != doc:
+                self._check_unique(after)
+                doc.clear()
+                doc.update(after)
+                modified += 1
+        self.database.writes += modified
+        return len(found), modified, None, found
+
+    async def insert_one(self, doc: dict):
+        await self._round_trip("insert")
+        doc_id = self._insert(doc)["_id"]
+        doc.setdefault("_id", doc_id)
+        return SimpleNamespace(inserted_id=doc_id, acknowledged=True)
+
+    async def insert_many(self, docs: list, ordered: bool = True):
+        await self._round_trip("insert")
+        errors, inserted = [], []
+        for index, doc in enumerate(docs):
+            try:
+                inserted.append(self._insert(doc)["_id"])
+            except DuplicateKeyError as exc:
+                errors.append({"index": index, "code": DUPLICATE_KEY, "errmsg": str(exc)})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError(
+                {"writeErrors": errors, "nInserted": len(inserted), "nModified": 0}
+            )
+        return SimpleNamespace(inserted_ids=inserted, acknowledged=True)
+
+    async def update_one(self, query: dict, update: dict, upsert: bool = False):
+        await self._round_trip("update")
+        matched, modified, upserted_id, _ = self._update(query, update, upsert, many=False)
+        return SimpleNamespace(
+            matched_count=matched, modified_count=modified, upserted_id=upserted_id
+        )
+
+    async def update_many(self, query: dict, update: dict, upsert: bool = False):
+        await self._round_trip("update")
+        matched, modified, upserted_id, _ = self._update(query, update, upsert, many=True)
+        return SimpleNamespace(
+            matched_count=matched, modified_count=modified, upserted_id=upserted_id
+        )
+
+    async def find_one_and_update(
+        self,
+        query: dict,
+        update: dict,
+        projection=None,
+        return_document=ReturnDocument.BEFORE,
+        upsert: bool = False,
+        sort=None,
+    ):
+        await self._round_trip("findAndModify")
+        matched = next((doc for doc in self.docs.values() if matches(doc, query)), None)
+        before = copy.deepcopy(matched) if matched else None
+        _, _, upserted_id, after = self._update(query, update, upsert, many=False)
+        if return_document == ReturnDocument.AFTER:
+            return project(after[0], projection) if after else None
+        return project(before, projection) if before else None
+
+    async def bulk_write(self, requests: list, ordered: bool = True):
+        await self._round_trip("bulkWrite")
+        counts = Counter()
+        errors = []
+        for index, request in enumerate(requests):
+            try:
+                if isinstance(request, InsertOne):
+                    self._insert(request._doc)
+                    counts["inserted"] += 1
+                    continue
+                if not isinstance(request, (UpdateOne, UpdateMany)):
+                    raise NotImplementedError(type(request).__name__)
+                matched, modified, upserted_id, _ = self._update(
+                    request._filter,
+                    request._doc,
+                    request._upsert,
+                    many=isinstance(request, UpdateMany),
+                )
+                counts["matched"] += matched
+                counts["modified"] += modified
+                counts["upserted"] += upserted_id is not None
+            except DuplicateKeyError as exc:
+                errors.append({"index": index, "code": DUPLICATE_KEY, "errmsg": str(exc)})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError(
+                {
+                    "writeErrors": errors,
+                    "nInserted": counts["inserted"],
+                    "nMatched": counts["matched"],
+                    "nModified": counts["modified"],
+                    "nUpserted": counts["upserted"],
+                }
+            )
+        return SimpleNamespace(
+            inserted_count=counts["inserted"],
+            matched_count=counts["matched"],
+            modified_count=counts["modified"],
+            upserted_count=counts["upserted"],
+            acknowledged=True,
+        )
+
+    async def delete_one(self, query: dict):
+        await self._round_trip("delete")
+        doc = next((doc for doc in self.docs.values() if matches(doc, query)), None)
+        if doc is not None:
+            del self.docs[doc["_id"]]
+            self.database.writes += 1
+        return SimpleNamespace(deleted_count=int(doc is not None))
+
+    async def delete_many(self, query: dict):
+        await self._round_trip("delete")
+        ids = [doc["_id"] for doc in self.docs.values() if matches(doc, query)]
+        for doc_id in ids:
+            del self.docs[doc_id]
+        self.database.writes += len(ids)
+        return SimpleNamespace(deleted_count=len(ids))
+
+    # -- reads
+    def find(self, query: dict = None, projection=None):
+        return MemoryCursor(self, query, projection)
+
+    async def find_one(self, query: dict = None, projection=None):
+        docs = await self.find(query, projection).limit(1).to_list(1)
+        return docs[0] if docs else None
+
+    async def count_documents(self, query: dict):
+        await self._round_trip("count")
+        return sum(1 for doc in self.docs.values() if matches(doc, query))
+
+    def aggregate(self, pipeline):
+        raise NotImplementedError("memory collections do not run aggregation pipelines")
+
+    async def create_indexes(self, models):
+        await self._round_trip("createIndexes")
+        for model in models:
+            spec = model.document
+            if spec["name"] in self.indexes:
+                continue
+            self.indexes.add(spec["name"])
+            if spec.get("unique"):
+                self.unique.append(
+                    (spec["name"], list(spec["key"]), spec.get("partialFilterExpression"))
+                )
+        return [model.document["name"] for model in models]
+
+    async def drop_index(self, name: str):
+        await self._round_trip("dropIndexes")
+        if name not in self.indexes:
+            raise OperationFailure(f"index not found with name [{name}]", INDEX_NOT_FOUND)
+        self.indexes.discard(name)
+        self.unique = [index for index in self.unique if index[0] != name]
+
+
+class MemoryDatabase:
+    collection_class = MemoryCollection
+
+    def __init__(self, name: str):
+        self.name = name
+        self.writes = 0  # documents inserted, changed or deleted
+        self._collections = {}
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        if name not in self._collections:
+            self._collections[name] = self.collection_class(self, name)
+        return self._collections[name]
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def collections(self) -> dict:
+        """Name -> collection, for every collection used so far."""
+        return dict(self._collections)
@@ -0,0 +1,461 @@
+# memory_storage.py
+"""The repositories in process memory, for a single-process deployment,
+the test suite and benchmarks.
+
+Documents live in dicts keyed the way they are looked up (seat id, w3_id,
+(date, start, seat)), with side indexes for the unique rules Mongo
+enforces with indexes: who occupies which seat and who holds which
+reservation slot. Every write runs under one ``asyncio.Lock`` and
+replaces the document it changes instead of mutating it, so a snapshot is
+a cheap copy of the dicts that can be pickled off the event loop.
+
+With ``MEMORY_SNAPSHOT_PATH`` set, the state is loaded from that file on
+start, written to it every ``MEMORY_SNAPSHOT_INTERVAL`` seconds when it
+changed and once more on shutdown. Without it nothing survives a restart.
+Run one process only: nothing here is shared between workers.
+"""
+import asyncio
+import copy
+import logging
+import os
+import pickle
+from bisect import insort
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from db import DB_NAME
+from employee_cache import EMPLOYEE_STATE
+from memory_collections import MemoryDatabase
+from reservations import AlreadyReserved, SeatTaken
+from seat_stream import SEAT_FIELDS
+from storage import (
+    APPLIED_EVENTS_KEPT,
+    AlreadySeated,
+    BookingRepository,
+    EmployeeRepository,
+    SeatRepository,
+    Storage,
+)
+
+logger = logging.getLogger(__name__)
+
+MEMORY_SNAPSHOT_PATH = os.getenv("MEMORY_SNAPSHOT_PATH")
+MEMORY_SNAPSHOT_INTERVAL = float(os.getenv("MEMORY_SNAPSHOT_INTERVAL", "30"))
+SNAPSHOT_FORMAT = 1
+
+FREED = {"status": "available", "booked_by": None, "booking_time": None}
+STATE_FIELDS = [field for field, shown in EMPLOYEE_STATE.items() if shown]
+
+
+def seat_fields(doc: dict) -> dict:
+    return {field: doc[field] for field in SEAT_FIELDS if field in doc}
+
+
+def state_fields(doc: dict) -> dict:
+    return {field: doc[field] for field in STATE_FIELDS if field in doc}
+
+
+class MemorySeats(SeatRepository):
+    def __init__(self, storage):
+        self.storage = storage
+        self.docs = {}  # seat id -> document
+        self.floors = {}  # (site, floor) -> sorted seat ids
+        self.occupied = {}  # w3_id -> id of the seat they occupy
+        self.events = {}  # outbox event id -> event, while on its seat
+
+    def _put(self, doc: dict):
+        old = self.docs.get(doc["_id"])
+        if old is not None:
+            if self.occupied.get(old.get("booked_by")) == old["_id"]:
+                del self.occupied[old["booked_by"]]
+            if (old.get("site"), old.get("floor")) != (doc.get("site"), doc.get("floor")):
+                self.floors[old.get("site"), old.get("floor")].remove(old["_id"])
+                old = None
+        if old is None:
+            insort(self.floors.setdefault((doc.get("site"), doc.get("floor")), []), doc["_id"])
+        if doc["status"] == "occupied" and doc.get("booked_by"):
+            self.occupied[doc["booked_by"]] = doc["_id"]
+        self.docs[doc["_id"]] = doc
+        self.storage.writes += 1
+
+    def _ids(self, site=None, floor=None) -> list:
+        if site is not None and floor is not None:
+            return self.floors.get((site, floor), [])
+        return sorted(
+            seat_id
+            for seat_id, doc in self.docs.items()
+            if site is None or doc.get("site") == site
+        )
+
+    async def seed(self, site, floor, zones, price) -> bool:
+        async with self.storage.lock:
+            if len(self.floors.get((site, floor), [])) >= len(zones):
+                return False
+            for seat_id, zone in zones.items():
+                doc = self.docs.get(seat_id) or {"_id": seat_id, "status": "available", "price": price}
+                self._put({**doc, "site": site, "floor": floor, "zone": zone})
+            return True
+
+    async def list(self, site=None, floor=None) -> list:
+        return [seat_fields(self.docs[seat_id]) for seat_id in self._ids(site, floor)]
+
+    async def export(self, site=None, floor=None) -> AsyncIterator[dict]:
+        ids = self._ids(site, floor)
+        if site is not None and floor is None:
+            ids = sorted(ids, key=lambda seat_id: (self.docs[seat_id].get("floor"), seat_id))
+        for seat_id in ids:
+            doc = self.docs.get(seat_id)
+            if doc is not None:
+                yield seat_fields(doc)
+
+    async def claim(self, seat_id, w3_id, at, event) -> Optional[dict]:
+        async with self.storage.lock:
+            doc = self.docs.get(seat_id)
+            if doc is None or doc["status"] != "available":
+                return None
+            if w3_id in self.occupied:
+                raise AlreadySeated()
+            doc = {
+                **doc,
+                "status": "occupied",
+                "booked_by": w3_id,
+                "booking_time": at,
+                "outbox": [*doc.get("outbox", []), event],
+            }
+            self._put(doc)
+            self.events[event["id"]] = event
+            return seat_fields(doc)
+
+    async def free(self, seat_id, w3_id, event) -> Optional[dict]:
+        async with self.storage.lock:
+            doc = self.docs.get(seat_id)
+            if doc is None or doc.get("booked_by") != w3_id:
+                return None
+            doc = {**doc, **FREED, "outbox": [*doc.get("outbox", []), event]}
+            self._put(doc)
+            self.events[event["id"]] = event
+            return seat_fields(doc)
+
+    async def claim_batch(self, pairs, at, batch_id) -> int:
+        claimed = 0
+        async with self.storage.lock:
+            for w3_id, seat_id in pairs:
+                doc = self.docs.get(seat_id)
+                if doc is None or doc["status"] != "available" or w3_id in self.occupied:
+                    continue
+                self._put(
+                    {
+                        **doc,
+                        "status": "occupied",
+                        "booked_by": w3_id,
+                        "booking_time": at,
+                        "batch_id": batch_id,
+                    }
+                )
+                claimed += 1
+        return claimed
+
+    async def undo_batch(self, seat_ids, batch_id):
+        async with self.storage.lock:
+            for seat_id in seat_ids:
+                doc = self.docs.get(seat_id)
+                if doc is not None and doc.get("batch_id") == batch_id:
+                    doc = {**doc, **FREED}
+                    del doc["batch_id"]
+                    self._put(doc)
+
+    async def release_expired(self, cutoff) -> list:
+        expired = []
+        async with self.storage.lock:
+            for seat_id in list(self.occupied.values()):
+                doc = self.docs[seat_id]
+                if doc.get("booking_time") is not None and doc["booking_time"] <= cutoff:
+                    expired.append(
+                        {"_id": seat_id, "booked_by": doc["booked_by"], "booking_time": doc["booking_time"]}
+                    )
+                    self._put({**doc, **FREED})
+        expired.sort(key=lambda seat: seat["_id"])
+        return expired
+
+    async def stale_events(self, cutoff) -> list:
+        return [event for event in self.events.values() if event["at"] < cutoff]
+
+    async def clear_events(self, events):
+        async with self.storage.lock:
+            for event in events:
+                if self.events.pop(event["id"], None) is None:
+                    continue
+                doc = self.docs.get(event["seat_id"])
+                if doc is not None:
+                    outbox = [e for e in doc.get("outbox", []) if e["id"] != event["id"]]
+                    self._put({**doc, "outbox": outbox})
+
+    def dump(self) -> list:
+        return list(self.docs.values())
+
+    def restore(self, docs):
+        for doc in docs:
+            self._put(doc)
+            for event in doc.get("outbox", []):
+                self.events[event["id"]] = event
+
+
+class MemoryEmployees(EmployeeRepository):
+    def __init__(self, storage):
+        self.storage = storage
+        self.docs = {}  # w3_id -> document, in the order they registered
+
+    def _update(self, doc: dict, **changes) -> dict:
+        doc = {**doc, **changes}
+        self.docs[doc["w3_id"]] = doc
+        self.storage.writes += 1
+        return doc
+
+    def _refund(self, doc: dict, seat_id, cost: int) -> dict:
+        return self._update(
+            doc,
+            blue_tokens_spent=doc.get("blue_tokens_spent", 0) - cost,
+            booked_seats=[seat for seat in doc.get("booked_seats", []) if seat != seat_id],
+            last_booked_seat=None,
+            last_booking_at=None,
+        )
+
+    async def state(self, w3_id) -> Optional[dict]:
+        doc = self.docs.get(w3_id)
+        return None if doc is None else state_fields(doc)
+
+    async def states(self, w3_ids) -> list:
+        return [state_fields(self.docs[w3_id]) for w3_id in w3_ids if w3_id in self.docs]
+
+    async def register(self, document) -> dict:
+        async with self.storage.lock:
+            doc = self.docs.get(document["w3_id"])
+            if doc is None:
+                doc = self._update(copy.deepcopy(document))
+            return state_fields(doc)
+
+    async def charge(self, w3_id, tokens, upsert=False) -> Optional[dict]:
+        async with self.storage.lock:
+            doc = self.docs.get(w3_id)
+            if doc is None:
+                if not upsert:
+                    return None
+                doc = {"w3_id": w3_id}
+            doc = self._update(doc, blue_tokens_spent=doc.get("blue_tokens_spent", 0) + tokens)
+            return state_fields(doc)
+
+    async def apply_events(self, events, cost):
+        async with self.storage.lock:
+            for event in events:
+                doc = self.docs.get(event["w3_id"])
+                if doc is None or event["id"] in doc.get("applied_events", ()):
+                    continue
+                applied = [*doc.get("applied_events", []), event["id"]][-APPLIED_EVENTS_KEPT:]
+                seat_id = event["seat_id"]
+                if event["kind"] == "book":
+                    booked = doc.get("booked_seats", [])
+                    self._update(
+                        doc,
+                        booked_seats=booked if seat_id in booked else [*booked, seat_id],
+                        blue_tokens_spent=doc.get("blue_tokens_spent", 0) + cost,
+                        last_booking_at=event["at"],
+                        last_booked_seat=seat_id,
+                        applied_events=applied,
+                    )
+                else:
+                    doc = self._refund(doc, seat_id, cost)
+                    self._update(doc, applied_events=applied)
+
+    async def claim_batch(self, pairs, at, cost) -> int:
+        claimed = 0
+        async with self.storage.lock:
+            for w3_id, seat_id in pairs:
+                doc = self.docs.get(w3_id)
+                if doc is None or doc.get("last_booked_seat") is not None:
+                    continue
+                booked = doc.get("booked_seats", [])
+                self._update(
+                    doc,
+                    booked_seats=booked if seat_id in booked else [*booked, seat_id],
+                    blue_tokens_spent=doc.get("blue_tokens_spent", 0) + cost,
+                    last_booking_at=at,
+                    last_booked_seat=seat_id,
+                )
+                claimed += 1
+        return claimed
+
+    async def undo_batch(self, pairs, at, cost):
+        async with self.storage.lock:
+            for w3_id, seat_id in pairs:
+                doc = self.docs.get(w3_id)
+                if doc and doc.get("last_booked_seat") == seat_id and doc.get("last_booking_at") == at:
+                    self._refund(doc, seat_id, cost)
+
+    async def refund_expired(self, seats, cost):
+        async with self.storage.lock:
+            for seat in seats:
+                doc = self.docs.get(seat.get("booked_by"))
+                # refund only the booking that expired, never a newer one
+                if (
+                    doc
+                    and doc.get("last_booked_seat") == seat["_id"]
+                    and doc.get("last_booking_at") == seat["booking_time"]
+                ):
+                    self._refund(doc, seat["_id"], cost)
+
+    async def record_logins(self, logins):
+        async with self.storage.lock:
+            for w3_id, at in logins.items():
+                doc = self.docs.get(w3_id)
+                if doc is not None and (doc.get("last_login_at") is None or at > doc["last_login_at"]):
+                    self._update(doc, last_login_at=at)
+
+    async def directory(self) -> AsyncIterator[dict]:
+        for doc in list(self.docs.values()):
+            yield {"w3_id": doc["w3_id"], "full_name": doc.get("full_name"), "email": doc.get("email")}
+
+    def dump(self) -> list:
+        return list(self.docs.values())
+
+    def restore(self, docs):
+        for doc in docs:
+            self.docs[doc["w3_id"]] = doc
+
+
+class MemoryBookings(BookingRepository):
+    def __init__(self, storage):
+        self.storage = storage
+        self.days = {}  # iso date -> {(start, seat_id): reservation}
+        self.holders = set()  # (iso date, start, w3_id)
+
+    async def day(self, day) -> list:
+        return [
+            {"start": doc["start"], "seat_id": doc["seat_id"], "w3_id": doc["w3_id"]}
+            for doc in self.days.get(day, {}).values()
+        ]
+
+    async def reserve(self, doc):
+        async with self.storage.lock:
+            slots = self.days.setdefault(doc["date"], {})
+            if (doc["start"], doc["seat_id"]) in slots:
+                raise SeatTaken()
+            if (doc["date"], doc["start"], doc["w3_id"]) in self.holders:
+                raise AlreadyReserved()
+            slots[doc["start"], doc["seat_id"]] = dict(doc)
+            self.holders.add((doc["date"], doc["start"], doc["w3_id"]))
+            self.storage.writes += 1
+
+    async def cancel(self, day, start, seat_id, w3_id) -> bool:
+        async with self.storage.lock:
+            slots = self.days.get(day, {})
+            doc = slots.get((start, seat_id))
+            if doc is None or doc["w3_id"] != w3_id:
+                return False
+            del slots[start, seat_id]
+            self.holders.discard((day, start, w3_id))
+            self.storage.writes += 1
+            return True
+
+    def dump(self) -> list:
+        return [doc for slots in self.days.values() for doc in slots.values()]
+
+    def restore(self, docs):
+        for doc in docs:
+            self.days.setdefault(doc["date"], {})[doc["start"], doc["seat_id"]] = doc
+            self.holders.add((doc["date"], doc["start"], doc["w3_id"]))
+
+
+def write_snapshot(path: Path, state: dict):
+    # a crash mid-write leaves the previous snapshot in place
+    partial = path.with_name(path.name + ".tmp")
+    with open(partial, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(partial, path)
+
+
+class MemoryStorage(Storage):
+    """All three repositories plus the reporting collections, which are
+    Motor-compatible memory collections so the ledger and occupancy
+    recorders run on them unchanged."""
+
+    shared = False
+
+    def __init__(self, path=MEMORY_SNAPSHOT_PATH, interval: float = MEMORY_SNAPSHOT_INTERVAL):
+        self.path = Path(path) if path else None
+        self.interval = interval
+        self.lock = asyncio.Lock()
+        self._saving = asyncio.Lock()
+        self.writes = 0
+        self.saved = None  # change marker of the last snapshot
+        self.seats = MemorySeats(self)
+        self.employees = MemoryEmployees(self)
+        self.bookings = MemoryBookings(self)
+        self.reporting = MemoryDatabase(DB_NAME)
+
+    def collection(self, name: str):
+        return self.reporting[name]
+
+    def _marker(self) -> tuple:
+        return self.writes, self.reporting.writes
+
+    def dump(self) -> dict:
+        return {
+            "format": SNAPSHOT_FORMAT,
+            "seats": self.seats.dump(),
+            "employees": self.employees.dump(),
+            "reservations": self.bookings.dump(),
+            # reporting documents are updated in place, so they are copied
+            "collections": {
+                name: copy.deepcopy(list(collection.docs.values()))
+                for name, collection in self.reporting.collections().items()
+            },
+        }
+
+    def restore(self, state: dict):
+        if state.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"Unknown snapshot format: {state.get('format')}")
+        self.seats.restore(state["seats"])
+        self.employees.restore(state["employees"])
+        self.bookings.restore(state["reservations"])
+        for name, docs in state["collections"].items():
+            self.reporting[name].load(docs)
+
+    async def save(self) -> bool:
+        if self.path is None:
+            return False
+        async with self._saving:
+            if self._marker() == self.saved:
+                return False
+            async with self.lock:
+                marker, state = self._marker(), self.dump()
+            await asyncio.to_thread(write_snapshot, self.path, state)
+            self.saved = marker
+            return True
+
+    async def open(self):
+        if self.path is None or not self.path.exists():
+            return
+        with open(self.path, "rb") as f:
+            self.restore(pickle.load(f))
+        self.saved = self._marker()
+        logger.info(
+            "Loaded %d seats and %d employees from %s",
+            len(self.seats.docs),
+            len(self.employees.docs),
+            self.path,
+        )
+
+    async def run(self):
+        if self.path is None:
+            return
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.save()
+            except Exception:
+                logger.exception("Memory snapshot failed")
+
+    async def close(self):
+        await self.save()
@@ -0,0 +1,130 @@
+# metrics.py
+"""Prometheus metrics for the API, served at GET /metrics.
+
+With several uvicorn workers, point PROMETHEUS_MULTIPROC_DIR at an empty
+directory shared by the workers (wiped on deploy) before they start; each
+worker then writes its samples there and /metrics sums them, whichever
+worker answers the scrape.
+"""
+import os
+import time
+
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# long-lived responses: counted, but neither timed nor kept in flight
+STREAMING_TYPES = (b"text/event-stream",)
+
+# Most routes answer from memory; the tail is Mongo and the IdP
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 10)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5)
+
+REQUESTS = Counter(
+    "http_requests_total", "Requests by route template and status.", ["method", "route", "status"]
+)
+LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time from request to the end of the response body.",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Requests being handled right now.", multiprocess_mode="livesum"
+)
+SEAT_STREAMS = Gauge(
+    "seat_stream_clients", "Open GET /seats/stream connections.", multiprocess_mode="livesum"
+)
+
+BOOKINGS = Counter("seat_bookings_total", "Seats booked.", ["kind"])
+RELEASES = Counter("seat_releases_total", "Seats freed.", ["reason"])
+CONFLICTS = Counter("booking_conflicts_total", "Bookings refused.", ["reason"])
+
+CACHE_LOOKUPS = Counter("cache_lookups_total", "In-memory cache lookups.", ["cache", "result"])
+
+MONGO_COMMANDS = Histogram(
+    "mongo_command_duration_seconds",
+    "Mongo command round trips.",
+    ["command", "outcome"],
+    buckets=MONGO_BUCKETS,
+)
+MONGO_CHECKOUT = Histogram(
+    "mongo_pool_checkout_seconds",
+    "Time spent waiting for a pooled Mongo connection.",
+    buckets=MONGO_BUCKETS,
+)
+MONGO_CHECKOUT_FAILURES = Counter(
+    "mongo_pool_checkout_failures_total", "Pool checkouts that failed.", ["reason"]
+)
+
+
+def cache_counters(cache: str):
+    """(hit, miss) counters bound once, so a lookup costs one increment."""
+    return CACHE_LOOKUPS.labels(cache, "hit"), CACHE_LOOKUPS.labels(cache, "miss")
+
+
+def render() -> bytes:
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def worker_exit(pid: int = None):
+    # drop this worker's live gauges from the shared directory
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid or os.getpid())
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request.
+
+    Requests are labelled with the route template the router matched
+    (``/release/{seat_id}``, not the raw path), so label sets stay bounded;
+    anything unmatched is counted as ``unmatched``. Event streams stay open
+    for as long as a client watches, so they leave the in-flight gauge once
+    their response starts and stay out of the latency histogram;
+    ``seat_stream_clients`` tracks them instead.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        streaming = False
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                content_type = dict(message.get("headers", ())).get(b"content-type", b"")
+                if content_type.startswith(STREAMING_TYPES):
+                    streaming = True
+                    IN_FLIGHT.dec()
+            await send(message)
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            if not streaming:
+                IN_FLIGHT.dec()
+                LATENCY.labels(method, path).observe(time.perf_counter() - started)
+            REQUESTS.labels(method, path, str(status)).inc()
@@ -0,0 +1,334 @@
+# mongo_storage.py
+"""The repositories on Mongo, through the process's shared Motor client.
+
+The queries are the ones indexes.py plans for: every seat write is a
+single conditional update, and the unique indexes (one occupied seat per
+person, one reservation per seat and per person and slot) turn races
+between replicas into duplicate key errors.
+"""
+import secrets
+from typing import AsyncIterator, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from db import close_client, open_client
+from directory import DIRECTORY_BATCH_SIZE, DIRECTORY_FIELDS
+from employee_cache import EMPLOYEE_STATE
+from indexes import ensure_indexes
+from reservations import AlreadyReserved, SeatTaken
+from seat_stream import SEAT_FIELDS, SEAT_STREAM_BATCH
+from storage import (
+    APPLIED_EVENTS_KEPT,
+    AlreadySeated,
+    BookingRepository,
+    EmployeeRepository,
+    SeatRepository,
+    Storage,
+)
+
+FREED = {"status": "available", "booked_by": None, "booking_time": None}
+
+
+def scope(site: str = None, floor: int = None) -> dict:
+    query = {}
+    if site is not None:
+        query["site"] = site
+    if floor is not None:
+        query["floor"] = floor
+    return query
+
+
+class MongoSeats(SeatRepository):
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def seed(self, site, floor, zones, price) -> bool:
+        query = {"site": site, "floor": floor}
+        if await self.collection.count_documents(query) >= len(zones):
+            return False
+        # creates new seats and tags seats from before sites existed
+        await self.collection.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": seat_id},
+                    {
+                        "$set": {**query, "zone": zone},
+                        "$setOnInsert": {"status": "available", "price": price},
+                    },
+                    upsert=True,
+                )
+                for seat_id, zone in zones.items()
+            ],
+            ordered=False,
+        )
+        return True
+
+    async def list(self, site=None, floor=None) -> list:
+        return await self.collection.find(scope(site, floor), SEAT_FIELDS).sort("_id", 1).to_list(None)
+
+    async def export(self, site=None, floor=None) -> AsyncIterator[dict]:
+        sort = [("floor", 1), ("_id", 1)] if site and floor is None else [("_id", 1)]
+        cursor = self.collection.find(scope(site, floor), SEAT_FIELDS).sort(sort)
+        async for doc in cursor.batch_size(SEAT_STREAM_BATCH):
+            yield doc
+
+    async def claim(self, seat_id, w3_id, at, event) -> Optional[dict]:
+        try:
+            # only matches while the seat is still available
+            return await self.collection.find_one_and_update(
+                {"_id": seat_id, "status": "available"},
+                {
+                    "$set": {"status": "occupied", "booked_by": w3_id, "booking_time": at},
+                    "$push": {"outbox": event},
+                },
+                projection=SEAT_FIELDS,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # occupied seats are unique per booked_by: they already sit elsewhere
+            raise AlreadySeated()
+
+    async def free(self, seat_id, w3_id, event) -> Optional[dict]:
+        return await self.collection.find_one_and_update(
+            {"_id": seat_id, "booked_by": w3_id},
+            {"$set": FREED, "$push": {"outbox": event}},
+            projection=SEAT_FIELDS,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def claim_batch(self, pairs, at, batch_id) -> int:
+        try:
+            result = await self.collection.bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": seat_id, "status": "available"},
+                        {
+                            "$set": {
+                                "status": "occupied",
+                                "booked_by": w3_id,
+                                "booking_time": at,
+                                "batch_id": batch_id,
+                            }
+                        },
+                    )
+                    for w3_id, seat_id in pairs
+                ],
+                ordered=False,
+            )
+        except BulkWriteError as exc:
+            # a member already occupies a seat their record does not show yet
+            return exc.details["nModified"]
+        return result.modified_count
+
+    async def undo_batch(self, seat_ids, batch_id):
+        await self.collection.update_many(
+            {"_id": {"$in": seat_ids}, "batch_id": batch_id},
+            {"$set": FREED, "$unset": {"batch_id": ""}},
+        )
+
+    async def release_expired(self, cutoff) -> list:
+        expired = await self.collection.find(
+            {"status": "occupied", "booking_time": {"$lte": cutoff}},
+            {"_id": 1, "booked_by": 1, "booking_time": 1},
+        ).to_list(None)
+        if not expired:
+            return []
+
+        # seats released or re-booked since the find no longer match
+        sweep_id = secrets.token_hex(8)
+        ids = [seat["_id"] for seat in expired]
+        result = await self.collection.update_many(
+            {"_id": {"$in": ids}, "status": "occupied", "booking_time": {"$lte": cutoff}},
+            {"$set": {**FREED, "sweep_id": sweep_id}},
+        )
+        if result.modified_count < len(expired):
+            # only report the seats this sweep actually released
+            released = {
+                seat["_id"]
+                for seat in await self.collection.find(
+                    {"_id": {"$in": ids}, "sweep_id": sweep_id}, {"_id": 1}
+                ).to_list(None)
+            }
+            expired = [seat for seat in expired if seat["_id"] in released]
+        return expired
+
+    async def stale_events(self, cutoff) -> list:
+        events = []
+        async for seat in self.collection.find({"outbox.at": {"$lt": cutoff}}, {"outbox": 1}):
+            events.extend(event for event in seat["outbox"] if event["at"] < cutoff)
+        return events
+
+    async def clear_events(self, events):
+        await self.collection.bulk_write(
+            [
+                UpdateOne({"_id": event["seat_id"]}, {"$pull": {"outbox": {"id": event["id"]}}})
+                for event in events
+            ],
+            ordered=False,
+        )
+
+
+class MongoEmployees(EmployeeRepository):
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def state(self, w3_id) -> Optional[dict]:
+        return await self.collection.find_one({"w3_id": w3_id}, EMPLOYEE_STATE)
+
+    async def states(self, w3_ids) -> list:
+        return await self.collection.find({"w3_id": {"$in": list(w3_ids)}}, EMPLOYEE_STATE).to_list(None)
+
+    async def register(self, document) -> dict:
+        return await self.collection.find_one_and_update(
+            {"w3_id": document["w3_id"]},
+            {"$setOnInsert": document},
+            projection=EMPLOYEE_STATE,
+            return_document=ReturnDocument.AFTER,
+            upsert=True,
+        )
+
+    async def charge(self, w3_id, tokens, upsert=False) -> Optional[dict]:
+        return await self.collection.find_one_and_update(
+            {"w3_id": w3_id},
+            {"$inc": {"blue_tokens_spent": tokens}},
+            projection=EMPLOYEE_STATE,
+            return_document=ReturnDocument.AFTER,
+            upsert=upsert,
+        )
+
+    async def apply_events(self, events, cost):
+        updates = []
+        for event in events:
+            w3_id, seat_id, event_id = event["w3_id"], event["seat_id"], event["id"]
+            applied = {"applied_events": {"$each": [event_id], "$slice": -APPLIED_EVENTS_KEPT}}
+            if event["kind"] == "book":
+                update = {
+                    "$addToSet": {"booked_seats": seat_id},
+                    "$inc": {"blue_tokens_spent": cost},
+                    "$set": {"last_booking_at": event["at"], "last_booked_seat": seat_id},
+                    "$push": applied,
+                }
+            else:
+                update = {
+                    "$inc": {"blue_tokens_spent": -cost},
+                    "$pull": {"booked_seats": seat_id},
+                    "$set": {"last_booked_seat": None, "last_booking_at": None},
+                    "$push": applied,
+                }
+            updates.append(UpdateOne({"w3_id": w3_id, "applied_events": {"$ne": event_id}}, update))
+        # ordered: a release must land after the booking it undoes
+        await self.collection.bulk_write(updates, ordered=True)
+
+    async def claim_batch(self, pairs, at, cost) -> int:
+        result = await self.collection.bulk_write(
+            [
+                UpdateOne(
+                    {"w3_id": w3_id, "last_booked_seat": None},
+                    {
+                        "$addToSet": {"booked_seats": seat_id},
+                        "$inc": {"blue_tokens_spent": cost},
+                        "$set": {"last_booking_at": at, "last_booked_seat": seat_id},
+                    },
+                )
+                for w3_id, seat_id in pairs
+            ],
+            ordered=False,
+        )
+        return result.modified_count
+
+    async def undo_batch(self, pairs, at, cost):
+        await self.collection.bulk_write(
+            [
+                UpdateOne(
+                    {"w3_id": w3_id, "last_booked_seat": seat_id, "last_booking_at": at},
+                    {
+                        "$pull": {"booked_seats": seat_id},
+                        "$inc": {"blue_tokens_spent": -cost},
+                        "$set": {"last_booking_at": None, "last_booked_seat": None},
+                    },
+                )
+                for w3_id, seat_id in pairs
+            ],
+            ordered=False,
+        )
+
+    async def refund_expired(self, seats, cost):
+        # refund only the booking that expired, never a newer one
+        refunds = [
+            UpdateOne(
+                {
+                    "w3_id": seat["booked_by"],
+                    "last_booked_seat": seat["_id"],
+                    "last_booking_at": seat["booking_time"],
+                },
+                {
+                    "$inc": {"blue_tokens_spent": -cost},
+                    "$pull": {"booked_seats": seat["_id"]},
+                    "$set": {"last_booked_seat": None, "last_booking_at": None},
+                },
+            )
+            for seat in seats
+            if seat.get("booked_by")
+        ]
+        if refunds:
+            await self.collection.bulk_write(refunds, ordered=False)
+
+    async def record_logins(self, logins):
+        # $max keeps the newest time when several replicas flush one employee
+        await self.collection.bulk_write(
+            [
+                UpdateOne({"w3_id": w3_id}, {"$max": {"last_login_at": at}})
+                for w3_id, at in logins.items()
+            ],
+            ordered=False,
+        )
+
+    async def directory(self) -> AsyncIterator[dict]:
+        cursor = self.collection.find({}, DIRECTORY_FIELDS).sort("_id", 1)
+        async for doc in cursor.batch_size(DIRECTORY_BATCH_SIZE):
+            yield doc
+
+
+class MongoBookings(BookingRepository):
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def day(self, day) -> list:
+        return await self.collection.find(
+            {"date": day}, {"_id": 0, "start": 1, "seat_id": 1, "w3_id": 1}
+        ).to_list(None)
+
+    async def reserve(self, doc):
+        try:
+            # insert_one adds _id to the dict it is given
+            await self.collection.insert_one(dict(doc))
+        except DuplicateKeyError as e:
+            if "w3_id" in (e.details or {}).get("keyPattern", {}):
+                raise AlreadyReserved()
+            raise SeatTaken()
+
+    async def cancel(self, day, start, seat_id, w3_id) -> bool:
+        result = await self.collection.delete_one(
+            {"date": day, "start": start, "seat_id": seat_id, "w3_id": w3_id}
+        )
+        return bool(result.deleted_count)
+
+
+class MongoStorage(Storage):
+    def __init__(self, database):
+        self.database = database
+        self.seats = MongoSeats(database.seats)
+        self.employees = MongoEmployees(database.employees)
+        self.bookings = MongoBookings(database.reservations)
+
+    def collection(self, name: str):
+        return self.database[name]
+
+    async def open(self):
+        # connect up front so the first request does not pay for it
+        await open_client()
+        await ensure_indexes(self.database)
+
+    async def close(self):
+        close_client()
@@ -0,0 +1,128 @@
+# outbox.py
+import asyncio
+import logging
+import os
+import secrets
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "200"))
+OUTBOX_INTERVAL = float(os.getenv("OUTBOX_INTERVAL", "0.05"))
+# events this old that are still on a seat were lost by a dead process
+OUTBOX_RETRY_AFTER = timedelta(seconds=float(os.getenv("OUTBOX_RETRY_AFTER", "30")))
+
+
+def outbox_event(kind: str, w3_id: str, seat_id: int, at: datetime = None) -> dict:
+    """A side effect to apply later; ``id`` is its idempotency key."""
+    return {
+        "id": secrets.token_hex(12),
+        "kind": kind,
+        "w3_id": w3_id,
+        "seat_id": seat_id,
+        "at": at or datetime.utcnow(),
+    }
+
+
+class SeatOutbox:
+    """Write-behind queue for the side effects of a booking or release.
+
+    The event is stored on the seat by the same write that claims or frees
+    it (``SeatRepository.claim``/``free``), so it is durable the moment the
+    request succeeds without a second write. It is also put on an
+    in-process queue; the worker hands batches of up to ``batch_size``
+    events to ``handler`` and then clears them off their seats.
+
+    Delivery is at least once: a batch that fails is retried in order, and
+    events left on a seat by a process that died are picked up again after
+    ``retry_after``. ``handler`` must therefore be idempotent on ``id``.
+    """
+
+    def __init__(
+        self,
+        seats,
+        handler,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        interval: float = OUTBOX_INTERVAL,
+        retry_after: timedelta = OUTBOX_RETRY_AFTER,
+    ):
+        self.seats = seats
+        self.handler = handler
+        self.batch_size = batch_size
+        self.interval = interval
+        self.retry_after = retry_after
+        self.queue = asyncio.Queue()
+        self.queued = set()  # ids waiting or being applied in this process
+        self.applied = 0
+
+    def enqueue(self, event: dict):
+        if event["id"] in self.queued:
+            return
+        self.queued.add(event["id"])
+        self.queue.put_nowait(event)
+
+    def _take(self, limit: int = None) -> list:
+        limit = self.batch_size if limit is None else limit
+        batch = []
+        while len(batch) < limit and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def drain(self, batch: list):
+        await self.handler(batch)
+        await self.seats.clear_events(batch)
+        self.applied += len(batch)
+        self.queued.difference_update(event["id"] for event in batch)
+
+    async def recover(self) -> int:
+        """Re-queue events older than ``retry_after`` still sitting on seats."""
+        cutoff = datetime.utcnow() - self.retry_after
+        found = 0
+        for event in await self.seats.stale_events(cutoff):
+            if event["id"] not in self.queued:
+                self.enqueue(event)
+                found += 1
+        return found
+
+    async def flush(self):
+        while not self.queue.empty():
+            await self.drain(self._take())
+
+    async def run(self):
+        last_recovery = None
+        try:
+            while True:
+                now = datetime.utcnow()
+                if last_recovery is None or now - last_recovery >= self.retry_after:
+                    last_recovery = now
+                    try:
+                        await self.recover()
+                    except Exception:
+                        logger.exception("Outbox recovery failed")
+
+                if self.queue.empty():
+                    try:
+                        first = await asyncio.wait_for(
+                            self.queue.get(), self.retry_after.total_seconds()
+                        )
+                    except asyncio.TimeoutError:
+                        continue
+                    # let a burst of bookings pile up into one batch
+                    await asyncio.sleep(self.interval)
+                    batch = [first, *self._take(self.batch_size - 1)]
+                else:
+                    batch = self._take()
+
+                # retry the same batch so effects stay in order
+                while True:
+                    try:
+                        await self.drain(batch)
+                        break
+                    except Exception:
+                        logger.exception("Applying %d outbox events failed", len(batch))
+                        await asyncio.sleep(1)
+        finally:
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Final outbox flush failed")
@@ -0,0 +1,168 @@
+# reservations.py
+import asyncio
+import os
+import time
+from bisect import bisect_left, insort
+from datetime import date, datetime, timedelta
+
+SLOT_MINUTES = 30
+RESERVATION_CACHE_TTL = float(os.getenv("RESERVATION_CACHE_TTL", "2"))
+
+DATE_LABELS = {"today": 0, "tomorrow": 1, "day after": 2}
+
+
+class SeatTaken(Exception):
+    pass
+
+
+class AlreadyReserved(Exception):
+    pass
+
+
+def resolve_date(label: str, today: date = None) -> date:
+    """Turn "Today"/"Tomorrow"/"Day After" or an ISO date into a date."""
+    today = today or date.today()
+    offset = DATE_LABELS.get(label.strip().lower())
+    if offset is not None:
+        return today + timedelta(days=offset)
+    return date.fromisoformat(label.strip())
+
+
+def parse_slot(label: str) -> int:
+    """Start of the slot in minutes after midnight ("12:30 PM" -> 750)."""
+    for fmt in ("%I:%M %p", "%H:%M"):
+        try:
+            parsed = datetime.strptime(label.strip().upper(), fmt)
+        except ValueError:
+            continue
+        minutes = parsed.hour * 60 + parsed.minute
+        if minutes % SLOT_MINUTES:
+            break
+        return minutes
+    raise ValueError(f"Invalid time slot: {label}")
+
+
+def clock(now: datetime = None):
+    """Today and the minutes since midnight, on the local clock resolve_date uses."""
+    now = now or datetime.now()
+    return now.date(), now.hour * 60 + now.minute
+
+
+def slot_label(start: int) -> str:
+    return datetime(2000, 1, 1, start // 60, start % 60).strftime("%I:%M %p").lstrip("0")
+
+
+class DayIndex:
+    """All reservations of one day, indexed by slot and by user.
+
+    ``starts`` and the per-user lists are kept sorted so range and per-user
+    lookups are a bisect away; a single slot is a dict lookup.
+    """
+
+    def __init__(self, docs=()):
+        self.by_slot = {}  # start -> {seat_id: w3_id}
+        self.starts = []
+        self.by_user = {}  # w3_id -> sorted [(start, seat_id)]
+        for doc in docs:
+            self.add(doc["start"], doc["seat_id"], doc["w3_id"])
+
+    def add(self, start: int, seat_id: int, w3_id: str):
+        slot = self.by_slot.get(start)
+        if slot is None:
+            slot = self.by_slot[start] = {}
+            insort(self.starts, start)
+        slot[seat_id] = w3_id
+        insort(self.by_user.setdefault(w3_id, []), (start, seat_id))
+
+    def remove(self, start: int, seat_id: int, w3_id: str):
+        slot = self.by_slot.get(start, {})
+        if slot.pop(seat_id, None) is None:
+            return
+        if not slot:
+            del self.by_slot[start]
+            del self.starts[bisect_left(self.starts, start)]
+        mine = self.by_user.get(w3_id, [])
+        i = bisect_left(mine, (start, seat_id))
+        if i < len(mine) and mine[i] == (start, seat_id):
+            del mine[i]
+
+    def taken(self, start: int) -> dict:
+        return self.by_slot.get(start, {})
+
+    def between(self, start: int, end: int):
+        """(start, {seat_id: w3_id}) for every reserved slot in [start, end)."""
+        lo = bisect_left(self.starts, start)
+        hi = bisect_left(self.starts, end)
+        return [(s, self.by_slot[s]) for s in self.starts[lo:hi]]
+
+    def for_user(self, w3_id: str) -> list:
+        return list(self.by_user.get(w3_id, []))
+
+    def user_has(self, w3_id: str, start: int) -> bool:
+        mine = self.by_user.get(w3_id, [])
+        i = bisect_left(mine, (start,))
+        return i < len(mine) and mine[i][0] == start
+
+
+class ReservationBook:
+    """Advance bookings keyed by (seat, date, slot).
+
+    The BookingRepository is the source of truth and makes a claim one
+    atomic write that fails when the seat or the person already holds the
+    slot. Reads come from a per-day DayIndex loaded with one query and kept
+    for ``ttl`` seconds, or updated in place by this process's own writes.
+    """
+
+    def __init__(self, bookings, ttl: float = RESERVATION_CACHE_TTL):
+        self.bookings = bookings
+        self.ttl = ttl
+        self._days = {}  # iso date -> (DayIndex, loaded_at)
+        self._lock = asyncio.Lock()
+
+    async def day(self, day: date) -> DayIndex:
+        key = day.isoformat()
+        cached = self._days.get(key)
+        if cached and time.monotonic() - cached[1] < self.ttl:
+            return cached[0]
+        async with self._lock:
+            cached = self._days.get(key)
+            if cached and time.monotonic() - cached[1] < self.ttl:
+                return cached[0]
+            index = DayIndex(await self.bookings.day(key))
+            self._days[key] = (index, time.monotonic())
+            self._forget_past_days()
+            return index
+
+    def _forget_past_days(self):
+        today = date.today().isoformat()
+        for key in [key for key in self._days if key < today]:
+            del self._days[key]
+
+    async def reserve(self, seat_id: int, day: date, start: int, w3_id: str) -> dict:
+        index = await self.day(day)
+        if seat_id in index.taken(start):
+            raise SeatTaken()
+        if index.user_has(w3_id, start):
+            raise AlreadyReserved()
+
+        doc = {
+            "seat_id": seat_id,
+            "date": day.isoformat(),
+            "start": start,
+            "end": start + SLOT_MINUTES,
+            "w3_id": w3_id,
+            "created_at": datetime.utcnow(),
+        }
+        # raises SeatTaken or AlreadyReserved when we lost a race with another
+        # request or replica
+        await self.bookings.reserve(doc)
+        index.add(start, seat_id, w3_id)
+        return doc
+
+    async def cancel(self, seat_id: int, day: date, start: int, w3_id: str) -> bool:
+        if not await self.bookings.cancel(day.isoformat(), start, seat_id, w3_id):
+            return False
+        cached = self._days.get(day.isoformat())
+        if cached:
+            cached[0].remove(start, seat_id, w3_id)
+        return True
@@ -0,0 +1,183 @@
+# seat_cache.py
+import asyncio
+import hashlib
+import os
+import secrets
+import time
+
+import orjson
+
+from metrics import cache_counters
+
+# Upper bound on how stale a snapshot may get when another replica writes
+# to Mongo. Local writes update the snapshot immediately.
+SEAT_SNAPSHOT_TTL = float(os.getenv("SEAT_SNAPSHOT_TTL", "2"))
+
+
+class SeatSnapshot:
+    """In-memory, pre-serialized copy of the seat map.
+
+    Every poll of GET /seats is answered from ``body`` without touching
+    storage. The snapshot is rebuilt when a booking or release changes a seat
+    (``refresh``) or when it is older than ``ttl`` seconds. ``version`` only
+    moves forward when the rebuilt map differs from the previous one.
+
+    ``etag`` is a digest of ``body`` so it is the same on every replica for
+    the same seat map. Versions are per process, so deltas are tagged with
+    ``epoch`` and a client holding another process's version gets a full map.
+
+    A local write that got the changed seat documents back can ``apply``
+    them instead, which re-encodes the map without reading the seats again;
+    writes applied while a rebuild is reading are laid over its result.
+
+    ``scope`` (``site`` and ``floor``) limits the snapshot to one floor of
+    one site, so a rebuild only reads that floor's seats from the
+    SeatRepository.
+
+    Rows are validated through ``model`` unless a ``row`` function is given;
+    the documents come from our own repository, so a plain function that
+    picks the fields gives the same output without building a model per
+    seat.
+    """
+
+    def __init__(
+        self,
+        model,
+        ttl: float = SEAT_SNAPSHOT_TTL,
+        scope: dict = None,
+        row=None,
+    ):
+        self.model = model
+        self.ttl = ttl
+        self.scope = scope or {}
+        self.row = row or (lambda doc: model.model_validate(doc).model_dump(by_alias=True))
+        self.version = 0
+        self.body = b"[]"
+        self.seats = {}
+        # w3_id -> id of the seat they occupy
+        self.by_user = {}
+        self.etag = None
+        self.epoch = secrets.token_hex(4)
+        # seat id -> version it last changed at, oldest change first
+        self.changed = {}
+        # called as listener(snapshot, previous_version) after each change
+        self.listeners = []
+        self.built_at = None
+        # seats applied while a rebuild is reading, None when none is
+        self._applied = None
+        self._lock = asyncio.Lock()
+        self._hit, self._miss = cache_counters("seat_snapshot")
+
+    def is_fresh(self) -> bool:
+        if self.built_at is None:
+            return False
+        if self.ttl <= 0:
+            return True
+        return time.monotonic() - self.built_at < self.ttl
+
+    async def get(self, seats):
+        if self.is_fresh():
+            self._hit.inc()
+        else:
+            self._miss.inc()
+            async with self._lock:
+                # another request may have rebuilt it while we waited
+                if not self.is_fresh():
+                    await self._rebuild(seats)
+        return self
+
+    async def refresh(self, seats):
+        async with self._lock:
+            await self._rebuild(seats)
+        return self
+
+    def apply(self, docs):
+        """Patch the snapshot with seat documents a local write returned."""
+        rows = [self.row(doc) for doc in docs]
+        if self._applied is not None:
+            self._applied.extend(rows)
+        if self.built_at is None:
+            return
+        if any(row["_id"] not in self.seats for row in rows):
+            # a new seat would break the sort order; rebuild on next get
+            self.invalidate()
+            return
+        seats = dict(self.seats)
+        for row in rows:
+            seats[row["_id"]] = row
+        self._install(seats)
+
+    def invalidate(self):
+        self.built_at = None
+
+    def matches(self, if_none_match) -> bool:
+        if not if_none_match or self.etag is None:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any(
+            tag.removeprefix("W/") == self.etag for tag in tags
+        )
+
+    def delta(self, since: int, epoch=None) -> dict:
+        if (epoch and epoch != self.epoch) or since < 0 or since > self.version:
+            return {
+                "version": self.version,
+                "epoch": self.epoch,
+                "full": True,
+                "seats": list(self.seats.values()),
+                "removed": [],
+            }
+
+        seats, removed = [], []
+        for seat_id, version in reversed(self.changed.items()):
+            if version <= since:
+                break
+            if seat_id in self.seats:
+                seats.append(self.seats[seat_id])
+            else:
+                removed.append(seat_id)
+
+        return {
+            "version": self.version,
+            "epoch": self.epoch,
+            "full": False,
+            "seats": seats,
+            "removed": removed,
+        }
+
+    def delta_body(self, since: int, epoch=None) -> bytes:
+        return orjson.dumps(self.delta(since, epoch))
+
+    async def _rebuild(self, seats):
+        self._applied = []
+        try:
+            docs = await seats.list(**self.scope)
+            by_id = {seat["_id"]: seat for seat in map(self.row, docs)}
+            # the read may predate writes applied meanwhile
+            for row in self._applied:
+                if row["_id"] in by_id:
+                    by_id[row["_id"]] = row
+        finally:
+            self._applied = None
+        self._install(by_id)
+        self.built_at = time.monotonic()
+
+    def _install(self, by_id: dict):
+        body = orjson.dumps(list(by_id.values()))
+
+        if body != self.body or self.built_at is None:
+            self.version += 1
+            for seat_id in by_id.keys() | self.seats.keys():
+                if by_id.get(seat_id) != self.seats.get(seat_id):
+                    self.changed.pop(seat_id, None)
+                    self.changed[seat_id] = self.version
+            self.body = body
+            self.seats = by_id
+            self.by_user = {
+                seat["booked_by"]: seat_id
+                for seat_id, seat in by_id.items()
+                if seat.get("booked_by")
+            }
+            self.etag = '"%s"' % hashlib.blake2b(body, digest_size=8).hexdigest()
+            for listener in self.listeners:
+                listener(self, self.version - 1)
@@ -0,0 +1,102 @@
+# seat_events.py
+import asyncio
+import logging
+import os
+
+from metrics import SEAT_STREAMS
+
+logger = logging.getLogger(__name__)
+
+# Slow subscribers are dropped once this many events are waiting for them;
+# the browser's EventSource reconnects and starts again from a full map.
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("SEAT_STREAM_QUEUE_SIZE", "64"))
+KEEPALIVE_SECONDS = 15
+
+
+def sse_frame(event: str, event_id, data: bytes) -> bytes:
+    return b"event: %s\nid: %s\ndata: %s\n\n" % (
+        event.encode(),
+        str(event_id).encode(),
+        data,
+    )
+
+
+class SeatHub:
+    """Fans seat-map changes out to every /seats/stream subscriber.
+
+    The hub listens to the SeatSnapshot, so each change is encoded once and
+    pushed to all subscriber queues without any per-subscriber read.
+    While anyone is subscribed, a single watcher task keeps the snapshot
+    fresh so that writes made by other replicas are pushed as well.
+    """
+
+    def __init__(self, snapshot, seats, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.snapshot = snapshot
+        self.seats = seats
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self._watcher = None
+        snapshot.listeners.append(self.on_change)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.add(queue)
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.create_task(self._watch())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def on_change(self, snapshot, previous_version: int):
+        if not self.subscribers:
+            return
+        frame = sse_frame(
+            "seats",
+            snapshot.version,
+            snapshot.delta_body(previous_version),
+        )
+        self.publish(frame)
+
+    def publish(self, frame: bytes):
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                # too far behind: close its stream so it resyncs
+                self.subscribers.discard(queue)
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+    async def stream(self):
+        """The SSE frames of one subscriber: the full map, then deltas.
+
+        It subscribes on its first iteration, so a client that disconnects
+        before the body starts never leaves a queue behind.
+        """
+        queue = self.subscribe()
+        SEAT_STREAMS.inc()
+        try:
+            snapshot = await self.snapshot.get(self.seats)
+            yield sse_frame("seats", snapshot.version, snapshot.delta_body(-1))
+            while True:
+                try:
+                    frame = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                if frame is None:
+                    return
+                yield frame
+        finally:
+            SEAT_STREAMS.dec()
+            self.unsubscribe(queue)
+
+    async def _watch(self):
+        interval = self.snapshot.ttl if self.snapshot.ttl > 0 else KEEPALIVE_SECONDS
+        while self.subscribers:
+            try:
+                await self.snapshot.get(self.seats)
+            except Exception:
+                logger.exception("Seat map refresh failed")
+            await asyncio.sleep(interval)
@@ -0,0 +1,53 @@
+# seat_stream.py
+import os
+
+import orjson
+
+SEAT_STREAM_BATCH = int(os.getenv("SEAT_STREAM_BATCH", "500"))
+
+# Only the fields the Seat model exposes
+SEAT_FIELDS = {
+    "_id": 1,
+    "status": 1,
+    "price": 1,
+    "booked_by": 1,
+    "booking_time": 1,
+    "site": 1,
+    "floor": 1,
+    "zone": 1,
+}
+
+
+def seat_row(doc: dict) -> dict:
+    """A seat document in the shape Seat.model_dump(by_alias=True) gives."""
+    return {
+        "_id": doc["_id"],
+        "status": doc["status"],
+        "price": doc["price"],
+        "booked_by": doc.get("booked_by"),
+        "booking_time": doc.get("booking_time"),
+        "site": doc.get("site"),
+        "floor": doc.get("floor"),
+        "zone": doc.get("zone"),
+    }
+
+
+async def stream_json_array(docs, batch_size: int = SEAT_STREAM_BATCH):
+    """Encode an async iterator of seats as one JSON array, ``batch_size``
+    rows per chunk.
+
+    Only one batch of documents and its encoded chunk are held at a time,
+    so memory stays flat however many seats ``docs`` yields.
+    """
+    yield b"["
+    rows = []
+    first = True
+    async for doc in docs:
+        rows.append(orjson.dumps(seat_row(doc)))
+        if len(rows) >= batch_size:
+            yield (b"" if first else b",") + b",".join(rows)
+            first = False
+            rows = []
+    if rows:
+        yield (b"" if first else b",") + b",".join(rows)
+    yield b"]"
@@ -0,0 +1,206 @@
+# storage.py
+"""Where seats, employees and bookings live.
+
+Routes and workers talk to three repositories instead of Motor
+collections:
+
+- ``SeatRepository``: the seat map, live bookings and the outbox events
+  stored on the seats
+- ``EmployeeRepository``: employee booking state, token charges and logins
+- ``BookingRepository``: advance reservations of a (seat, date, slot)
+
+``STORAGE_BACKEND`` picks the engine for the process: ``mongo`` (the
+default, see mongo_storage.py) or ``memory`` (memory_storage.py, for a
+single-process deployment, tests and benchmarks). Reporting data (the
+billing ledger, its roll-ups, occupancy buckets and the sweeper lease)
+stays collection-shaped and is reached through ``Storage.collection``.
+"""
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import AsyncIterator, Iterable, List, Optional, Tuple
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo")
+
+# outbox event ids remembered per employee to drop redeliveries
+APPLIED_EVENTS_KEPT = 50
+
+
+class AlreadySeated(Exception):
+    """The employee already occupies another seat."""
+
+
+class SeatRepository(ABC):
+    """Seat documents: ``_id``, ``site``, ``floor``, ``zone``, ``price``,
+    ``status``, ``booked_by``, ``booking_time`` and pending ``outbox``
+    events. Reads return the fields of ``seat_stream.SEAT_FIELDS``."""
+
+    @abstractmethod
+    async def seed(self, site: str, floor: int, zones: dict, price: int) -> bool:
+        """Create the seats of a floor (``zones`` is seat id -> zone) and tag
+        existing ones with it; False when the floor was already complete."""
+
+    @abstractmethod
+    async def list(self, site: str = None, floor: int = None) -> List[dict]:
+        """Seats of one floor (or all of them), by id."""
+
+    @abstractmethod
+    def export(self, site: str = None, floor: int = None) -> AsyncIterator[dict]:
+        """Stream seats by id, or by floor and id when only ``site`` is given."""
+
+    @abstractmethod
+    async def claim(self, seat_id: int, w3_id: str, at: datetime, event: dict) -> Optional[dict]:
+        """Occupy an available seat and store ``event`` on it in the same
+        write. None if the seat is not available; raises AlreadySeated if
+        ``w3_id`` occupies another seat."""
+
+    @abstractmethod
+    async def free(self, seat_id: int, w3_id: str, event: dict) -> Optional[dict]:
+        """Free a seat ``w3_id`` occupies, storing ``event`` on it; None if
+        they do not."""
+
+    @abstractmethod
+    async def claim_batch(self, pairs: List[Tuple[str, int]], at: datetime, batch_id: str) -> int:
+        """Occupy every (w3_id, seat_id) that is available; returns how many
+        were claimed. Claims are tagged with ``batch_id`` for ``undo_batch``."""
+
+    @abstractmethod
+    async def undo_batch(self, seat_ids: List[int], batch_id: str):
+        """Free the seats a ``claim_batch`` with ``batch_id`` occupied."""
+
+    @abstractmethod
+    async def release_expired(self, cutoff: datetime) -> List[dict]:
+        """Free seats booked at or before ``cutoff``; returns the
+        ``_id``/``booked_by``/``booking_time`` of the bookings it ended."""
+
+    @abstractmethod
+    async def stale_events(self, cutoff: datetime) -> List[dict]:
+        """Outbox events stored on seats before ``cutoff``."""
+
+    @abstractmethod
+    async def clear_events(self, events: Iterable[dict]):
+        """Take delivered outbox events off their seats."""
+
+
+class EmployeeRepository(ABC):
+    """Employee documents keyed by ``w3_id``. Reads return the fields of
+    ``employee_cache.EMPLOYEE_STATE``."""
+
+    @abstractmethod
+    async def state(self, w3_id: str) -> Optional[dict]:
+        pass
+
+    @abstractmethod
+    async def states(self, w3_ids: Iterable[str]) -> List[dict]:
+        pass
+
+    @abstractmethod
+    async def register(self, document: dict) -> dict:
+        """Insert ``document`` unless its employee exists; returns the state."""
+
+    @abstractmethod
+    async def charge(self, w3_id: str, tokens: int, upsert: bool = False) -> Optional[dict]:
+        """Add ``tokens`` (negative to refund) to what they spent."""
+
+    @abstractmethod
+    async def apply_events(self, events: List[dict], cost: int):
+        """Charge ``book`` and refund ``release`` outbox events in order,
+        skipping events an employee already applied."""
+
+    @abstractmethod
+    async def claim_batch(self, pairs: List[Tuple[str, int]], at: datetime, cost: int) -> int:
+        """Charge every (w3_id, seat_id) whose employee has no active seat;
+        returns how many were charged."""
+
+    @abstractmethod
+    async def undo_batch(self, pairs: List[Tuple[str, int]], at: datetime, cost: int):
+        """Refund the charges a ``claim_batch`` at ``at`` made."""
+
+    @abstractmethod
+    async def refund_expired(self, seats: List[dict], cost: int):
+        """Refund bookings ``SeatRepository.release_expired`` ended, unless
+        the employee booked again since."""
+
+    @abstractmethod
+    async def record_logins(self, logins: dict):
+        """Move ``last_login_at`` forward to the given w3_id -> time."""
+
+    @abstractmethod
+    def directory(self) -> AsyncIterator[dict]:
+        """``w3_id``, ``full_name`` and ``email`` of every employee."""
+
+
+class BookingRepository(ABC):
+    """Advance reservations; a seat and a person each hold at most one
+    reservation per (date, start)."""
+
+    @abstractmethod
+    async def day(self, day: str) -> List[dict]:
+        """``start``/``seat_id``/``w3_id`` of every reservation on ``day``."""
+
+    @abstractmethod
+    async def reserve(self, doc: dict):
+        """Store a reservation; raises reservations.SeatTaken or
+        reservations.AlreadyReserved when the slot is held."""
+
+    @abstractmethod
+    async def cancel(self, day: str, start: int, seat_id: int, w3_id: str) -> bool:
+        pass
+
+
+class Storage(ABC):
+    """One engine: its three repositories and its lifecycle, which the app
+    lifespan drives (``open`` on start, ``run`` as a background task,
+    ``close`` after every worker has stopped)."""
+
+    seats: SeatRepository
+    employees: EmployeeRepository
+    bookings: BookingRepository
+    # other processes write to it too, so in-memory copies go stale
+    shared = True
+
+    @abstractmethod
+    def collection(self, name: str):
+        """A Motor-compatible collection for reporting data."""
+
+    async def open(self):
+        """Connect or load; seats are seeded after this."""
+
+    async def run(self):
+        """Background upkeep, if the engine needs any."""
+
+    async def close(self):
+        pass
+
+
+_storage: Optional[Storage] = None
+
+
+def get_storage() -> Storage:
+    """The storage engine of this process, picked by ``STORAGE_BACKEND``.
+    Creating it does not connect, so modules may bind repositories at
+    import time."""
+    global _storage
+    if _storage is None:
+        if STORAGE_BACKEND == "memory":
+            from memory_storage import MemoryStorage
+
+            _storage = MemoryStorage()
+        elif STORAGE_BACKEND == "mongo":
+            from db import get_database
+            from mongo_storage import MongoStorage
+
+            _storage = MongoStorage(get_database())
+        else:
+            raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+    return _storage
+
+
+# DEPENDENCIES — routes take their repositories from here, so tests and
+# benchmarks can swap them with app.dependency_overrides
+async def get_seat_repository() -> SeatRepository:
+    return get_storage().seats
+
+
+async def get_employee_repository() -> EmployeeRepository:
+    return get_storage().employees
@@ -0,0 +1,91 @@
+# sweeper.py
+import asyncio
+import logging
+import os
+import secrets
+import socket
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+SWEEP_INTERVAL = float(os.getenv("SEAT_SWEEP_INTERVAL", "30"))
+SWEEPER_LOCK = "seat-sweeper"
+
+
+class SeatSweeper:
+    """Releases seats that have been occupied for longer than ``hold``.
+
+    Every replica runs the loop, but only the holder of the ``locks`` lease
+    sweeps; the lease expires after three missed intervals so another
+    replica takes over if the leader dies. A sweep frees the expired seats
+    through the SeatRepository, then refunds their employees through the
+    EmployeeRepository in one call.
+    """
+
+    def __init__(
+        self,
+        seats,
+        employees,
+        locks,
+        hold: timedelta,
+        refund: int,
+        on_release=None,
+        interval: float = SWEEP_INTERVAL,
+    ):
+        self.seats = seats
+        self.employees = employees
+        self.locks = locks
+        self.hold = hold
+        self.refund = refund
+        self.on_release = on_release
+        self.interval = interval
+        self.lease = timedelta(seconds=interval * 3)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+
+    async def acquire_lease(self) -> bool:
+        now = datetime.utcnow()
+        try:
+            await self.locks.find_one_and_update(
+                {
+                    "_id": SWEEPER_LOCK,
+                    "$or": [{"owner": self.owner}, {"expires_at": {"$lt": now}}],
+                },
+                {"$set": {"owner": self.owner, "expires_at": now + self.lease}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # someone else holds a live lease
+            return False
+        return True
+
+    async def release_lease(self):
+        await self.locks.delete_one({"_id": SWEEPER_LOCK, "owner": self.owner})
+
+    async def sweep(self) -> int:
+        cutoff = datetime.utcnow() - self.hold
+        expired = await self.seats.release_expired(cutoff)
+        if not expired:
+            return 0
+        await self.employees.refund_expired(expired, self.refund)
+
+        if self.on_release:
+            await self.on_release(expired)
+        logger.info("Auto-released %d seats", len(expired))
+        return len(expired)
+
+    async def run(self):
+        try:
+            while True:
+                try:
+                    if await self.acquire_lease():
+                        await self.sweep()
+                except Exception:
+                    logger.exception("Seat sweep failed")
+                await asyncio.sleep(self.interval)
+        finally:
+            try:
+                await self.release_lease()
+            except Exception:
+                logger.exception("Could not release sweeper lease")
@@ -0,0 +1,78 @@
+import asyncio
+from datetime import datetime
+
+from analytics import OccupancyRecorder, bucket_start
+
+
+class FakeBuckets:
+    def __init__(self):
+        self.docs = {}
+        self.writes = 0
+
+    async def bulk_write(self, ops, ordered=True):
+        self.writes += 1
+        for op in ops:
+            update = op._doc
+            doc = self.docs.setdefault(op._filter["_id"], dict(update["$setOnInsert"]))
+            for field, value in update.get("$inc", {}).items():
+                doc[field] = doc.get(field, 0) + value
+            for field, value in update.get("$max", {}).items():
+                doc[field] = max(doc.get(field, value), value)
+            doc.update(update.get("$set", {}))
+
+
+def test_bucket_start():
+    assert bucket_start(datetime(2026, 3, 2, 12, 44, 59, 1)) == datetime(2026, 3, 2, 12, 30)
+    assert bucket_start(datetime(2026, 3, 2, 12, 45)) == datetime(2026, 3, 2, 12, 45)
+
+
+# BUCKETS — events and samples land in one document per zone and bucket
+def test_flush_aggregates_per_bucket():
+    buckets = FakeBuckets()
+    recorder = OccupancyRecorder(buckets)
+    noon = datetime(2026, 3, 2, 12, 5)
+
+    for _ in range(3):
+        recorder.record("hq", 3, "coffee", "book", noon)
+    recorder.record("hq", 3, "coffee", "release", noon)
+    recorder.record("hq", 3, "pizza", "book", datetime(2026, 3, 2, 12, 20))
+
+    async def run():
+        await recorder.flush([("hq", 3, "coffee", 2, 25), ("hq", 3, "pizza", 1, 25)], at=noon)
+        await recorder.flush([("hq", 3, "coffee", 1, 25)], at=datetime(2026, 3, 2, 12, 10))
+
+    asyncio.run(run())
+    assert buckets.writes == 2
+    coffee = buckets.docs["hq|3|coffee|2026-03-02T12:00:00"]
+    assert coffee["bookings"] == 3
+    assert coffee["releases"] == 1
+    # the peak survives a later, lower sample
+    assert coffee["peak"] == 2
+    assert coffee["occupied"] == 1
+    assert coffee["capacity"] == 25
+    assert buckets.docs["hq|3|pizza|2026-03-02T12:15:00"]["bookings"] == 1
+    assert recorder.pending == {}
+
+
+# SHUTDOWN — counters recorded since the last flush are written when cancelled
+def test_run_flushes_pending_on_cancel():
+    buckets = FakeBuckets()
+    recorder = OccupancyRecorder(buckets, interval=3600)
+    noon = datetime(2026, 3, 2, 12, 5)
+
+    async def sampler():
+        return []
+
+    async def run():
+        task = asyncio.create_task(recorder.run(sampler))
+        await asyncio.sleep(0)
+        recorder.record("hq", 3, "coffee", "book", noon)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(run())
+    assert buckets.docs["hq|3|coffee|2026-03-02T12:00:00"]["bookings"] == 1
+    assert recorder.pending == {}
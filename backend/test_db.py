@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+from prometheus_client import REGISTRY
+
+from db import MONGO_MAX_POOL_SIZE, MongoStats, create_client, mongo_stats
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_client_uses_configured_pool():
+    client = create_client()
+    try:
+        assert client.options.pool_options.max_pool_size == MONGO_MAX_POOL_SIZE
+        assert mongo_stats in client.options.event_listeners
+    finally:
+        client.close()
+
+
+# MONITORING — per-command latency and pool checkout wait
+def test_listener_observes_commands_and_checkouts():
+    before = {
+        "find": sample("mongo_command_duration_seconds_count", command="find", outcome="ok"),
+        "find_sum": sample("mongo_command_duration_seconds_sum", command="find", outcome="ok"),
+        "update": sample("mongo_command_duration_seconds_count", command="update", outcome="failed"),
+        "checkout": sample("mongo_pool_checkout_seconds_count"),
+        "checkout_sum": sample("mongo_pool_checkout_seconds_sum"),
+        "timeout": sample("mongo_pool_checkout_failures_total", reason="timeout"),
+    }
+
+    stats = MongoStats()
+    stats.succeeded(SimpleNamespace(command_name="find", duration_micros=2000))
+    stats.succeeded(SimpleNamespace(command_name="find", duration_micros=4000))
+    stats.failed(SimpleNamespace(command_name="update", duration_micros=1000))
+    stats.connection_checked_out(SimpleNamespace(duration=0.003))
+    stats.connection_check_out_failed(SimpleNamespace(duration=2.0, reason="timeout"))
+
+    find = sample("mongo_command_duration_seconds_count", command="find", outcome="ok")
+    assert find - before["find"] == 2
+    find_sum = sample("mongo_command_duration_seconds_sum", command="find", outcome="ok")
+    assert round(find_sum - before["find_sum"], 6) == 0.006
+    update = sample("mongo_command_duration_seconds_count", command="update", outcome="failed")
+    assert update - before["update"] == 1
+    assert sample("mongo_pool_checkout_seconds_count") - before["checkout"] == 2
+    assert round(sample("mongo_pool_checkout_seconds_sum") - before["checkout_sum"], 6) == 2.003
+    assert sample("mongo_pool_checkout_failures_total", reason="timeout") - before["timeout"] == 1
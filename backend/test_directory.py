@@ -0,0 +1,40 @@
+from directory import ColleagueDirectory
+
+PEOPLE = [
+    {"w3_id": "ann@ibm.com", "full_name": "Ann Smith", "email": "ann.smith@ibm.com"},
+    {"w3_id": "bob@ibm.com", "full_name": "Bob Smithers", "email": "bob@ibm.com"},
+    {"w3_id": "cy@ibm.com", "full_name": "Cy Young", "email": "cyoung@ibm.com"},
+    {"w3_id": "nameless@ibm.com", "full_name": None, "email": None},
+]
+
+
+def ids(results):
+    return [person["w3_id"] for person in results]
+
+
+def test_prefix_search():
+    directory = ColleagueDirectory()
+    directory.build(PEOPLE)
+
+    assert ids(directory.search("smi")) == ["ann@ibm.com", "bob@ibm.com"]
+    assert ids(directory.search("SMITHERS")) == ["bob@ibm.com"]
+    assert ids(directory.search("ann s")) == ["ann@ibm.com"]
+    assert ids(directory.search("cyoung@")) == ["cy@ibm.com"]
+    assert ids(directory.search("nameless")) == ["nameless@ibm.com"]
+    assert directory.search("zz") == []
+    assert directory.search("  ") == []
+    assert len(directory.search("", limit=5)) == 0
+    assert len(directory.search("s", limit=1)) == 1
+
+
+def test_add_keeps_index_sorted():
+    directory = ColleagueDirectory()
+    directory.build(PEOPLE)
+
+    directory.add({"w3_id": "dee@ibm.com", "full_name": "Dee Smart", "email": "dee@ibm.com"})
+    directory.add({"w3_id": "ann@ibm.com", "full_name": "Someone Else"})
+
+    assert directory.keys == sorted(directory.keys)
+    assert ids(directory.search("sm")) == ["dee@ibm.com", "ann@ibm.com", "bob@ibm.com"]
+    assert ids(directory.search("someone")) == []
+    assert len(directory) == 5
@@ -0,0 +1,45 @@
+import asyncio
+
+from employee_cache import EmployeeCache
+
+
+class FakeEmployees:
+    def __init__(self, docs):
+        self.docs = {doc["w3_id"]: doc for doc in docs}
+        self.reads = 0
+
+    async def state(self, w3_id):
+        self.reads += 1
+        return self.docs.get(w3_id)
+
+
+# WRITE-THROUGH — loads hit storage once, then are served from memory
+def test_load_reads_once():
+    employees = FakeEmployees([{"w3_id": "a", "last_booked_seat": 7, "blue_tokens_spent": 5}])
+    cache = EmployeeCache(maxsize=10)
+
+    async def run():
+        for _ in range(5):
+            state = await cache.load(employees, "a")
+            assert state["last_booked_seat"] == 7
+        assert await cache.load(employees, "nobody") is None
+
+    asyncio.run(run())
+    assert employees.reads == 2
+
+    cache.set("a", {"last_booked_seat": None, "blue_tokens_spent": 0})
+    assert cache.get("a")["last_booked_seat"] is None
+    cache.invalidate("a")
+    assert cache.get("a") is None
+
+
+def test_lru_and_ttl():
+    cache = EmployeeCache(maxsize=2, ttl=60)
+    for w3_id in ("a", "b", "c"):
+        cache.set(w3_id, {"blue_tokens_spent": 0})
+    assert cache.get("a") is None
+    assert cache.get("c") is not None
+
+    expired = EmployeeCache(maxsize=2, ttl=0)
+    expired.set("a", {"blue_tokens_spent": 0})
+    assert expired.get("a") is None
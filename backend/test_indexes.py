@@ -0,0 +1,52 @@
+import asyncio
+import os
+
+import pytest
+
+from indexes import audit, ensure_indexes, find_collscans
+
+
+def test_find_collscans_walks_nested_plans():
+    ixscan = {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "w3_id_unique"}}
+    collscan = {"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}}
+    union = {"stage": "OR", "inputStages": [ixscan, collscan]}
+
+    assert not find_collscans(ixscan)
+    assert find_collscans(collscan)
+    assert find_collscans(union)
+
+
+# QUERY PLAN AUDIT — needs a reachable MongoDB (MONGO_URL)
+@pytest.mark.skipif(not os.getenv("MONGO_URL"), reason="MONGO_URL not set")
+def test_no_query_shape_scans_a_collection():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    async def run():
+        db = AsyncIOMotorClient(os.getenv("MONGO_URL"), serverSelectionTimeoutMS=2000)[
+            "index_audit_test"
+        ]
+        await ensure_indexes(db)
+        return await audit(db)
+
+    assert asyncio.run(run()) == []
+
+
+# RETIRED — indexes no query uses are dropped where they exist
+def test_ensure_indexes_drops_retired_indexes():
+    from pymongo import ASCENDING, IndexModel
+
+    from fake_mongo import FakeClient
+    from indexes import RETIRED_INDEXES
+
+    async def run():
+        db = FakeClient()["office_booking_db"]
+        for name, index in RETIRED_INDEXES:
+            await db[name].create_indexes([IndexModel([("x", ASCENDING)], name=index)])
+        await ensure_indexes(db)
+        await ensure_indexes(db)
+        return db
+
+    db = asyncio.run(run())
+    for name, index in RETIRED_INDEXES:
+        assert index not in db[name].indexes
+    assert "occupied_booked_by_unique" in db["seats"].indexes
@@ -0,0 +1,89 @@
+import asyncio
+
+import httpx
+import rsa
+from jose import jwt
+from jose.backends import RSAKey
+
+import http_client
+from jwks import JWKSCache
+
+
+def make_key(kid):
+    _, private = rsa.newkeys(1024)
+    pem = private.save_pkcs1().decode()
+    public = RSAKey(pem, "RS256").public_key().to_dict()
+    return pem, {**public, "kid": kid}
+
+
+class FakeIdP:
+    def __init__(self, *jwks):
+        self.jwks = list(jwks)
+        self.calls = 0
+
+    def __call__(self, request):
+        self.calls += 1
+        return httpx.Response(200, json={"keys": self.jwks})
+
+
+def use_idp(monkeypatch, idp):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(idp))
+    monkeypatch.setattr(http_client, "_client", client)
+
+
+# HOT PATH — lookups after the first fetch do no network I/O
+def test_keys_are_cached_by_kid(monkeypatch):
+    pem, jwk = make_key("k1")
+    idp = FakeIdP(jwk)
+    use_idp(monkeypatch, idp)
+    cache = JWKSCache("https://idp/jwks", ttl=60)
+    token = jwt.encode({"sub": "a@ibm.com"}, pem, algorithm="RS256", headers={"kid": "k1"})
+
+    async def run():
+        for _ in range(100):
+            key = await cache.get_key("k1")
+            assert jwt.decode(token, key, algorithms=["RS256"])["sub"] == "a@ibm.com"
+
+    asyncio.run(run())
+    assert idp.calls == 1
+
+
+# ROTATION — an unknown kid refetches once, then is throttled
+def test_unknown_kid_refetches_once(monkeypatch):
+    _, old = make_key("old")
+    _, new = make_key("new")
+    idp = FakeIdP(old)
+    use_idp(monkeypatch, idp)
+    cache = JWKSCache("https://idp/jwks", ttl=60, miss_cooldown=0)
+
+    async def run():
+        assert await cache.get_key("old") is not None
+        idp.jwks = [new]
+        assert await cache.get_key("new") is not None
+        assert idp.calls == 2
+
+        cache.miss_cooldown = 30
+        assert await cache.get_key("bogus") is None
+        assert await cache.get_key("bogus") is None
+        assert idp.calls == 2
+
+    asyncio.run(run())
+
+
+# BACKGROUND REFRESH — near expiry, requests keep the old keys while refreshing
+def test_refresh_before_expiry_runs_in_background(monkeypatch):
+    _, jwk = make_key("k1")
+    idp = FakeIdP(jwk)
+    use_idp(monkeypatch, idp)
+    cache = JWKSCache("https://idp/jwks", ttl=60)
+
+    async def run():
+        await cache.get_key("k1")
+        cache.fetched_at -= 50
+        assert await cache.get_key("k1") is not None
+        assert idp.calls == 1
+        await cache._refresh_task
+        assert idp.calls == 2
+        assert cache.age() < 1
+
+    asyncio.run(run())
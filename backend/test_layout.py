@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from layout import load_sites
+
+PLAN = load_sites()[("north-wing", 3)]
+ALL_SEATS = set(range(1, 101))
+
+
+def test_zones_and_positions():
+    assert PLAN.zone_of(1) == "coffee"
+    assert PLAN.zone_of(26) == "asian"
+    assert PLAN.zone_of(75) == "pizza"
+    assert PLAN.zone_of(100) == "salad"
+    assert PLAN.zone_of(101) is None
+
+    index = PLAN.index
+    assert set(index.positions) == {s for table in PLAN.tables for s in table}
+    # the neighbour graph is symmetric and never points at the seat itself
+    for seat_id, neighbors in index.neighbors.items():
+        assert seat_id not in neighbors
+        for other in neighbors:
+            assert seat_id in index.neighbors[other]
+
+
+# SMART ASSIGN — zone, colleague and crowding preferences
+def test_pick_preferences():
+    index = PLAN.index
+
+    assert all(PLAN.zone_of(s) == "salad" for s in index.pick(ALL_SEATS, zone="salad"))
+    # a full zone falls back to any free seat
+    free = ALL_SEATS - set(range(76, 101))
+    assert index.pick(free, zone="salad", limit=1)
+
+    # the colleague's own table comes first
+    free = ALL_SEATS - {34}
+    assert all(s in range(33, 39) for s in index.pick(free, near=34))
+
+    # seats next to taken ones lose to quiet ones
+    free = ALL_SEATS - {2, 4}
+    assert 1 not in index.pick(free, limit=10)
+    assert index.pick(free, quiet=False, limit=1) == [1]
+
+    assert index.pick(set()) == []
+
+
+def test_find_adjacent():
+    assert PLAN.find_adjacent(ALL_SEATS, 3) == [1, 2, 3]
+    assert PLAN.find_adjacent(ALL_SEATS, 7) == [63, 64, 65, 66, 67, 68, 69]
+    # no single table fits 8: take neighbouring tables in one row
+    seats = PLAN.find_adjacent(ALL_SEATS, 8)
+    assert len(seats) == 8
+    assert PLAN.find_adjacent(set(), 2) is None
+
+
+# SITES — every floor comes from a data file, seat ids never overlap
+def test_load_sites(tmp_path):
+    def write(name, site, floors):
+        (tmp_path / name).write_text(json.dumps({"site": site, "floors": floors}))
+
+    write("a.json", "a", [{"floor": 1, "seats": [1, 10]}, {"floor": 2, "seats": [11, 20]}])
+    write(
+        "b.json",
+        "b",
+        [{"floor": 1, "seats": [21, 24], "rows": [[{"shape": "round", "x": 0, "y": 0, "seats": [21, 24]}]]}],
+    )
+    plans = load_sites(tmp_path)
+    assert sorted(plans) == [("a", 1), ("a", 2), ("b", 1)]
+    assert plans[("a", 2)].seat_ids == list(range(11, 21))
+    assert plans[("b", 1)].tables == [[21, 22, 23, 24]]
+
+    write("c.json", "c", [{"floor": 1, "seats": [20, 30]}])
+    with pytest.raises(ValueError):
+        load_sites(tmp_path)
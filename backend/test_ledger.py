@@ -0,0 +1,115 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from ledger import UNASSIGNED, BillingLedger
+
+
+class FakeEntries:
+    def __init__(self):
+        self.docs = []
+
+    async def insert_many(self, docs, ordered=True):
+        self.docs.extend(docs)
+
+
+class FakeRollups:
+    def __init__(self):
+        self.docs = {}
+        self.writes = 0
+        self.fail = False
+
+    async def bulk_write(self, ops, ordered=True):
+        if self.fail:
+            raise RuntimeError("mongo down")
+        self.writes += 1
+        for op in ops:
+            doc = self.docs.setdefault(op._filter["_id"], dict(op._doc["$setOnInsert"]))
+            for field, value in op._doc["$inc"].items():
+                doc[field] = doc.get(field, 0) + value
+
+
+AT = datetime(2026, 3, 2, 12, 30)
+
+
+# ROLL-UP — many ledger entries become one $inc per (cost center, day)
+def test_flush_batches_totals_per_cost_center():
+    entries, rollups = FakeEntries(), FakeRollups()
+    ledger = BillingLedger(entries, rollups)
+
+    async def run():
+        await ledger.record(
+            ledger.entry("a", 5, "book", 1, "mgr1", AT),
+            ledger.entry("b", 5, "book", 2, "mgr1", AT),
+            ledger.entry("c", 5, "book", 3, None, AT),
+        )
+        await ledger.record(ledger.entry("a", -5, "release", 1, "mgr1", AT))
+        assert await ledger.flush() == 2
+        assert await ledger.flush() == 0
+
+    asyncio.run(run())
+    assert len(entries.docs) == 4
+    assert all("_id" not in entry for entry in ledger.pending)
+    assert rollups.writes == 1
+    assert rollups.docs["mgr1|2026-03-02"] == {
+        "cost_center": "mgr1",
+        "day": "2026-03-02",
+        "charged": 10,
+        "refunded": 5,
+        "net": 5,
+        "entries": 3,
+    }
+    assert rollups.docs[f"{UNASSIGNED}|2026-03-02"]["net"] == 5
+
+
+def test_failed_flush_keeps_totals():
+    entries, rollups = FakeEntries(), FakeRollups()
+    ledger = BillingLedger(entries, rollups)
+
+    async def run():
+        await ledger.record(ledger.entry("a", 5, "book", 1, "mgr1", AT))
+        rollups.fail = True
+        with pytest.raises(RuntimeError):
+            await ledger.flush()
+        await ledger.record(ledger.entry("b", 5, "book", 2, "mgr1", AT))
+        rollups.fail = False
+        await ledger.flush()
+
+    asyncio.run(run())
+    assert rollups.docs["mgr1|2026-03-02"]["charged"] == 10
+    assert rollups.docs["mgr1|2026-03-02"]["entries"] == 2
+
+
+class DuplicateEntries(FakeEntries):
+    async def insert_many(self, docs, ordered=True):
+        from pymongo.errors import BulkWriteError
+
+        ids = {doc.get("_id") for doc in self.docs}
+        errors = [
+            {"index": index, "code": 11000}
+            for index, doc in enumerate(docs)
+            if "_id" in doc and doc["_id"] in ids
+        ]
+        self.docs.extend(doc for doc in docs if doc.get("_id") not in ids)
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+
+# IDEMPOTENCY — a redelivered entry is neither stored nor totalled twice
+def test_record_skips_entries_already_in_the_ledger():
+    entries, rollups = DuplicateEntries(), FakeRollups()
+    ledger = BillingLedger(entries, rollups)
+
+    async def run():
+        await ledger.record(ledger.entry("a", 5, "book", 1, "mgr1", AT, key="evt1"))
+        await ledger.record(
+            ledger.entry("a", 5, "book", 1, "mgr1", AT, key="evt1"),
+            ledger.entry("a", -5, "release", 1, "mgr1", AT, key="evt2"),
+        )
+        await ledger.flush()
+
+    asyncio.run(run())
+    assert [entry["_id"] for entry in entries.docs] == ["evt1", "evt2"]
+    assert rollups.docs["mgr1|2026-03-02"]["entries"] == 2
+    assert rollups.docs["mgr1|2026-03-02"]["net"] == 0
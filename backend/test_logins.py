@@ -0,0 +1,47 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from logins import LoginTracker
+
+
+class FakeEmployees:
+    def __init__(self):
+        self.docs = {}
+        self.writes = 0
+        self.fail = False
+
+    async def record_logins(self, logins):
+        if self.fail:
+            raise RuntimeError("mongo down")
+        self.writes += 1
+        for w3_id, at in logins.items():
+            doc = self.docs.setdefault(w3_id, {})
+            doc["last_login_at"] = max(doc.get("last_login_at", at), at)
+
+
+# COALESCING — a login rush becomes one bulk write, newest login wins
+def test_flush_keeps_latest_login_per_employee():
+    employees, tracker = FakeEmployees(), LoginTracker()
+    tracker.record("a", datetime(2026, 3, 2, 9, 1))
+    tracker.record("a", datetime(2026, 3, 2, 9, 0))
+    tracker.record("b", datetime(2026, 3, 2, 9, 2))
+
+    assert asyncio.run(tracker.flush(employees)) == 2
+    assert asyncio.run(tracker.flush(employees)) == 0
+    assert employees.writes == 1
+    assert employees.docs["a"]["last_login_at"] == datetime(2026, 3, 2, 9, 1)
+
+
+def test_failed_flush_keeps_logins():
+    employees, tracker = FakeEmployees(), LoginTracker()
+    tracker.record("a", datetime(2026, 3, 2, 9, 0))
+    employees.fail = True
+    with pytest.raises(RuntimeError):
+        asyncio.run(tracker.flush(employees))
+    tracker.record("a", datetime(2026, 3, 2, 8, 0))
+    employees.fail = False
+    asyncio.run(tracker.flush(employees))
+
+    assert employees.docs["a"]["last_login_at"] == datetime(2026, 3, 2, 9, 0)
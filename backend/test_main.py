@@ -1,85 +1,453 @@
+from datetime import date, datetime, time
+
+import asyncio
+
+import pytest
 from fastapi.testclient import TestClient
-from main import app
 
-client = TestClient(app)
+import db
+from fake_mongo import install
+
+fake_mongo = install()
+
+import main  # noqa: E402  (binds its collections to the fake)
+from auth import get_current_user  # noqa: E402
+from reservations import clock  # noqa: E402
+from schemas import employee_document  # noqa: E402
+
+current = {"user": None}
+
+
+async def settle():
+    # the outbox worker may hold events a flush does not see
+    await main.outbox.flush()
+    while main.outbox.queued:
+        await asyncio.sleep(0.01)
+
+
+def login(w3_id: str):
+    current["user"] = {"w3_id": w3_id, "name": w3_id.split("@")[0], "email": w3_id}
+
+
+@pytest.fixture(scope="module")
+def client():
+    # the lifespan closes the process client on the way out; keep the fake
+    db._client = fake_mongo
+    main.app.dependency_overrides[get_current_user] = lambda: current["user"]
+    # pin the clock inside today's 12:00 PM slot
+    main.clock = lambda: clock(datetime.combine(date.today(), time(12, 10)))
+    with TestClient(main.app) as client:
+        yield client
+    main.app.dependency_overrides.clear()
+    main.clock = clock
+
+
+def book(client, seat_id, date="Today", time_slot="12:00 PM"):
+    return client.post(
+        "/book", json={"seat_id": seat_id, "date": date, "time_slot": time_slot}
+    )
+
+
+def register(*w3_ids):
+    employees = fake_mongo["office_booking_db"]["employees"]
+    for w3_id in w3_ids:
+        employees._insert(employee_document({"uid": w3_id}))
+
+
+def employee(w3_id):
+    employees = fake_mongo["office_booking_db"]["employees"]
+    return next(doc for doc in employees.docs.values() if doc["w3_id"] == w3_id)
+
+
+def seat_status(client, seat_id):
+    return next(seat for seat in client.get("/seats").json() if seat["_id"] == seat_id)["status"]
+
 
 # API TESTING — Endpoint availability
-def test_get_seats_api():
+def test_get_seats_api(client):
+    login("viewer@ibm.com")
     response = client.get("/seats")
     assert response.status_code == 200
     assert len(response.json()) == 100
 
 
 # FUNCTIONAL TESTING — Business rule
-def test_successful_seat_booking():
-    payload = {
-        "seat_id": 1,
-        "w3_id": "test.user@ibm.com",
-        "name": "Test User",
-        "date": "Today",
-        "time_slot": "12:00 PM"
-    }
-
-    response = client.post("/book", json=payload)
+def test_successful_seat_booking(client):
+    login("test.user@ibm.com")
+    response = book(client, 1)
     assert response.status_code == 200
-    assert "Blu Dollars" in response.json()["message"]
+    assert response.json()["message"] == "Seat booked"
 
-#NEGATIVE TESTING — Double booking
-def test_double_booking_not_allowed():
-    payload = {
-        "seat_id": 2,
-        "w3_id": "user2@ibm.com",
-        "name": "User Two",
-        "date": "Today",
-        "time_slot": "12:30 PM"
-    }
+    seat = next(seat for seat in client.get("/seats").json() if seat["_id"] == 1)
+    assert seat["status"] == "occupied"
+    assert seat["booked_by"] == "test.user@ibm.com"
 
-    response1 = client.post("/book", json=payload)
-    assert response1.status_code == 200
 
-    response2 = client.post("/book", json=payload)
-    assert response2.status_code == 400
-    assert response2.json()["detail"] == "Seat taken"
+# NEGATIVE TESTING — Double booking
+def test_double_booking_not_allowed(client):
+    login("user2@ibm.com")
+    assert book(client, 2).status_code == 200
 
+    # the same seat for someone else
+    login("user3@ibm.com")
+    response = book(client, 2)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Seat unavailable"
 
-# VALIDATION TESTING — Missing fields
-def test_booking_missing_fields():
-    payload = {
-        "seat_id": 3,
-        "w3_id": "invalid@ibm.com"
-    }
+    # a second seat for the same person
+    login("user2@ibm.com")
+    response = book(client, 3)
+    assert response.status_code == 400
+    assert "active booking" in response.json()["detail"]
 
-    response = client.post("/book", json=payload)
-    assert response.status_code == 422
 
+# VALIDATION TESTING — Missing fields
+def test_booking_missing_fields(client):
+    login("invalid@ibm.com")
+    response = client.post("/book", json={"seat_id": 3})
+    assert response.status_code == 422
 
-#BOUNDARY TESTING — Invalid seat ID
-def test_invalid_seat_id():
-    payload = {
-        "seat_id": 999,
-        "w3_id": "ghost@ibm.com",
-        "name": "Ghost",
-        "date": "Tomorrow",
-        "time_slot": "1:00 PM"
-    }
 
-    response = client.post("/book", json=payload)
+# BOUNDARY TESTING — Invalid seat ID
+def test_invalid_seat_id(client):
+    login("ghost@ibm.com")
+    response = book(client, 999, date="Tomorrow", time_slot="1:00 PM")
     assert response.status_code == 404
 
 
+# STATE TRANSITION TESTING — Release seat
+def test_release_seat(client):
+    login("release@ibm.com")
+    assert book(client, 10).status_code == 200
 
-#STATE TRANSITION TESTING — Release seat
-def test_release_seat():
-    payload = {
-        "seat_id": 10,
-        "w3_id": "release@ibm.com",
-        "name": "Release User",
-        "date": "Today",
-        "time_slot": "2:00 PM"
-    }
+    response = client.post("/release/10")
+    assert response.status_code == 200
+    assert response.json() == {"message": "Seat released", "tokens_refunded": 5}
 
-    client.post("/book", json=payload)
+    seat = next(seat for seat in client.get("/seats").json() if seat["_id"] == 10)
+    assert seat["status"] == "available"
+    assert client.post("/release/10").status_code == 403
 
-    response = client.post("/release/10")
+
+# WRITE-BEHIND — the outbox settles the token charge after the response
+def test_outbox_charges_the_employee(client):
+    employees = fake_mongo["office_booking_db"]["employees"]
+    # what the login callback upserts
+    employees._insert(employee_document({"uid": "charged@ibm.com"}))
+
+    login("charged@ibm.com")
+    assert book(client, 20).status_code == 200
+    client.portal.call(settle)
+
+    employee = next(doc for doc in employees.docs.values() if doc["w3_id"] == "charged@ibm.com")
+    assert employee["blue_tokens_spent"] == 5
+    assert employee["last_booked_seat"] == 20
+
+
+# RESERVATIONS — a later slot today is reserved and holds the seat until then
+def test_same_day_reservation_holds_the_seat(client):
+    login("holder@ibm.com")
+    response = book(client, 30, time_slot="12:30 PM")
+    assert response.status_code == 200
+    assert response.json()["message"] == "Seat reserved"
+
+    # the slot under way shows the seat as taken by its holder
+    seats = client.get("/seats", params={"date": "Today", "time_slot": "12:00 PM"}).json()
+    assert next(seat for seat in seats if seat["_id"] == 30)["booked_by"] == "holder@ibm.com"
+
+    login("walkin@ibm.com")
+    response = book(client, 30)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Seat unavailable"
+
+    login("holder@ibm.com")
+    response = client.post("/release/30", params={"date": "Today", "time_slot": "12:30 PM"})
+    assert response.status_code == 200
+    assert response.json() == {"message": "Reservation cancelled", "tokens_refunded": 5}
+
+    login("walkin@ibm.com")
+    assert book(client, 30).status_code == 200
+
+
+# CHECK-IN — the holder booking their reserved seat is not charged twice
+def test_holder_checks_in_to_reserved_seat(client):
+    employees = fake_mongo["office_booking_db"]["employees"]
+    login("checkin@ibm.com")
+    assert book(client, 31, time_slot="12:30 PM").json()["message"] == "Seat reserved"
+
+    assert book(client, 31).json()["message"] == "Seat booked"
+    client.portal.call(settle)
+
+    assert client.get("/reservations").json() == []
+    employee = next(doc for doc in employees.docs.values() if doc["w3_id"] == "checkin@ibm.com")
+    assert employee["blue_tokens_spent"] == 5
+    assert employee["last_booked_seat"] == 31
+
+
+# GROUP BOOKING — one seat per member, everyone charged
+def test_batch_booking(client):
+    register("lead@ibm.com", "mate@ibm.com")
+    login("lead@ibm.com")
+    response = client.post("/book/batch", json={"seat_ids": [40, 41], "members": ["mate@ibm.com"]})
+    assert response.status_code == 200
+    assert response.json()["seats"] == [
+        {"seat_id": 40, "w3_id": "lead@ibm.com"},
+        {"seat_id": 41, "w3_id": "mate@ibm.com"},
+    ]
+    assert seat_status(client, 40) == seat_status(client, 41) == "occupied"
+    assert employee("mate@ibm.com")["blue_tokens_spent"] == 5
+
+
+# GROUP BOOKING — one taken seat rolls the whole group back
+def test_batch_booking_rolls_back_on_conflict(client):
+    register("taker@ibm.com", "first@ibm.com", "second@ibm.com")
+    login("taker@ibm.com")
+    assert book(client, 51).status_code == 200
+
+    login("first@ibm.com")
+    response = client.post("/book/batch", json={"seat_ids": [50, 51], "members": ["second@ibm.com"]})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Seats unavailable"
+    assert seat_status(client, 50) == "available"
+    for w3_id in ("first@ibm.com", "second@ibm.com"):
+        assert employee(w3_id)["blue_tokens_spent"] == 0
+        assert employee(w3_id)["last_booked_seat"] is None
+
+
+# GROUP BOOKING — a member's own reservation of their seat is taken over, not charged twice
+def test_batch_booking_checks_in_reservations(client):
+    register("early@ibm.com")
+    login("early@ibm.com")
+    assert book(client, 85, time_slot="12:30 PM").json()["message"] == "Seat reserved"
+
+    response = client.post("/book/batch", json={"seat_ids": [85]})
+    assert response.status_code == 200
+    assert client.get("/reservations").json() == []
+    assert employee("early@ibm.com")["blue_tokens_spent"] == 5
+
+
+# GROUP BOOKING — a map rebuilt before the rollback does not keep the undone seats
+def test_batch_rollback_refreshes_the_seat_map(client, monkeypatch):
+    register("blocker@ibm.com", "pair1@ibm.com", "pair2@ibm.com")
+    login("blocker@ibm.com")
+    assert book(client, 71).status_code == 200
+
+    seats = main.storage.seats
+    claim_batch = seats.claim_batch
+
+    async def claim_then_rebuild(pairs, at, batch_id):
+        claimed = await claim_batch(pairs, at, batch_id)
+        # another request rebuilds the map while the batch is half done
+        await main.refresh_seats([seat_id for _, seat_id in pairs])
+        return claimed
+
+    monkeypatch.setattr(seats, "claim_batch", claim_then_rebuild)
+    login("pair1@ibm.com")
+    response = client.post("/book/batch", json={"seat_ids": [70, 71], "members": ["pair2@ibm.com"]})
+    assert response.status_code == 400
+    assert seat_status(client, 70) == "available"
+
+
+# GROUP BOOKING — group_size picks seats that sit together
+def test_batch_booking_picks_adjacent_seats(client):
+    register("trio1@ibm.com", "trio2@ibm.com", "trio3@ibm.com")
+    login("trio1@ibm.com")
+    response = client.post(
+        "/book/batch", json={"group_size": 3, "members": ["trio2@ibm.com", "trio3@ibm.com"]}
+    )
+    assert response.status_code == 200
+    seat_ids = {seat["seat_id"] for seat in response.json()["seats"]}
+    plan = main.floor_plan()
+    assert len(seat_ids) == 3
+    assert any(seat_ids <= set(table) for table in plan.tables)
+
+
+# GROUP BOOKING — invalid sizes and unknown members are refused up front
+def test_batch_booking_validation(client):
+    register("solo@ibm.com")
+    login("solo@ibm.com")
+    assert client.post("/book/batch", json={"group_size": -1}).status_code == 422
+
+    response = client.post("/book/batch", json={"seat_ids": [60, 61], "members": ["nobody@ibm.com"]})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Unknown group members: nobody@ibm.com"
+
+
+# PAST SLOTS — a slot that already ended today is neither booked nor shown
+def test_past_slot_today_is_refused(client):
+    login("late@ibm.com")
+    response = book(client, 90, time_slot="8:00 AM")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Cannot book in the past"
+    assert client.get("/seats", params={"date": "Today", "time_slot": "8:00 AM"}).status_code == 400
+    assert seat_status(client, 90) == "available"
+
+
+# LIVE HOLDS — a seat occupied now cannot be reserved for a slot its booking runs into
+def test_reservation_waits_for_the_live_booking(client):
+    login("sitter@ibm.com")
+    assert book(client, 80).status_code == 200
+
+    login("planner@ibm.com")
+    response = book(client, 80, time_slot="12:30 PM")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Seat unavailable"
+    seats = client.get("/seats", params={"date": "Today", "time_slot": "12:30 PM"}).json()
+    assert next(seat for seat in seats if seat["_id"] == 80)["booked_by"] == "sitter@ibm.com"
+
+    # the booking auto-releases by 12:55, before the 1:00 PM slot
+    response = book(client, 80, time_slot="1:00 PM")
+    assert response.json()["message"] == "Seat reserved"
+
+
+# COLLEAGUE SEARCH — a colleague is found with their floor and the free seats around them
+def test_colleague_search_finds_the_seat(client):
+    main.colleague_directory.add(
+        {"w3_id": "findme@ibm.com", "full_name": "Findme Person", "email": "findme@ibm.com"}
+    )
+    login("findme@ibm.com")
+    assert book(client, 45).status_code == 200
+
+    login("looker@ibm.com")
+    response = client.get("/colleagues/search", params={"q": "findme"})
+    assert response.status_code == 200
+    [found] = response.json()
+    plan = main.floor_plan()
+    statuses = {seat["_id"]: seat["status"] for seat in client.get("/seats").json()}
+    assert found["w3_id"] == "findme@ibm.com"
+    assert (found["seat_id"], found["site"], found["floor"]) == (45, plan.site, plan.floor)
+    assert found["zone"] == plan.zone_of(45)
+    assert found["free_nearby"] == [
+        seat_id for seat_id in plan.index.neighbors[45] if statuses[seat_id] == "available"
+    ]
+    assert found["free_nearby"]
+
+    # someone not sitting anywhere has no seat and no floor
+    main.colleague_directory.add({"w3_id": "away@ibm.com", "full_name": "Away Person"})
+    [away] = client.get("/colleagues/search", params={"q": "away"}).json()
+    assert (away["seat_id"], away["floor"], away["free_nearby"]) == (None, None, [])
+
+
+# OCCUPANCY — only floors already in memory are sampled
+def test_occupancy_samples_skip_unbuilt_floors(client):
+    snapshot = main.seat_snapshots[main.floor_plan().key]
+    snapshot.invalidate()
+    assert asyncio.run(main.occupancy_samples()) == []
+    assert snapshot.built_at is None
+
+    client.get("/seats")
+    samples = asyncio.run(main.occupancy_samples())
+    plan = main.floor_plan()
+    assert [(site, floor, zone) for site, floor, zone, _, _ in samples] == [
+        (plan.site, plan.floor, zone) for zone in plan.zones
+    ]
+
+
+# OCCUPANCY — bookings land in the current bucket next to the live counts
+def test_occupancy_report(client):
+    login("counted@ibm.com")
+    assert book(client, 55).status_code == 200
+    plan = main.floor_plan()
+    zone = plan.zone_of(55)
+    asyncio.run(main.occupancy.flush(asyncio.run(main.occupancy_samples())))
+
+    response = client.get("/analytics/occupancy", params={"zone": zone})
+    assert response.status_code == 200
+    report = response.json()
+    statuses = {seat["_id"]: seat["status"] for seat in client.get("/seats").json()}
+    occupied = sum(statuses[seat_id] == "occupied" for seat_id in plan.zones[zone])
+    assert report["live"] == {zone: {"occupied": occupied, "capacity": len(plan.zones[zone])}}
+    buckets = report["buckets"]
+    assert {bucket["zone"] for bucket in buckets} == {zone}
+    assert sum(bucket.get("bookings", 0) for bucket in buckets) >= 1
+    assert buckets[-1]["occupied"] == occupied
+
+    assert client.get("/analytics/occupancy", params={"zone": "nowhere"}).status_code == 400
+    response = client.get(
+        "/analytics/occupancy",
+        params={"start": "2030-01-02T00:00:00", "end": "2030-01-01T00:00:00"},
+    )
+    assert response.status_code == 400
+
+
+# BILLING — a booking is charged to the booker's cost center
+def test_cost_center_report(client):
+    employees = fake_mongo["office_booking_db"]["employees"]
+    employees._insert(employee_document({"uid": "billed@ibm.com", "manager": "mgr-billing"}))
+    login("billed@ibm.com")
+    assert book(client, 57).status_code == 200
+    asyncio.run(settle())
+    asyncio.run(main.ledger.flush())
+
+    response = client.get("/billing/cost-centers", params={"cost_center": "mgr-billing"})
+    assert response.status_code == 200
+    [row] = response.json()
+    assert row["cost_center"] == "mgr-billing"
+    assert (row["charged"], row["refunded"], row["net"], row["entries"]) == (5, 0, 5, 1)
+
+    assert client.get("/billing/cost-centers", params={"start": "yesterday"}).status_code == 400
+
+
+# ASSIGN — the picked seat is claimed for the caller, once
+def test_assign_claims_a_seat(client):
+    register("assigned@ibm.com")
+    login("assigned@ibm.com")
+    response = client.post("/assign", json={"zone": "salad"})
+    assert response.status_code == 200
+    seat_id = response.json()["seat_id"]
+    assert response.json()["zone"] == "salad"
+    seat = next(seat for seat in client.get("/seats").json() if seat["_id"] == seat_id)
+    assert (seat["status"], seat["booked_by"]) == ("occupied", "assigned@ibm.com")
+
+    response = client.post("/assign", json={"zone": "salad"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "You already have an active booking. Release it first."
+
+
+def test_assign_rejects_unknown_zone(client):
+    login("lost@ibm.com")
+    response = client.post("/assign", json={"zone": "nowhere"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Unknown zone: nowhere"
+
+
+# ASSIGN — a seat taken behind a stale map falls through to the next pick
+def test_assign_falls_back_when_the_map_is_stale(client, monkeypatch):
+    register("ghost@ibm.com", "fallback@ibm.com")
+    index = main.floor_plan().index
+    pick = index.pick
+    picked = []
+
+    def pick_then_lose_the_first(free, **kwargs):
+        picks = pick(free, **kwargs)
+        # another replica books the best seat; this snapshot does not know
+        seats = fake_mongo["office_booking_db"]["seats"]
+        seats.docs[picks[0]].update(
+            status="occupied", booked_by="ghost@ibm.com", booking_time=datetime.utcnow()
+        )
+        picked.extend(picks)
+        return picks
+
+    monkeypatch.setattr(index, "pick", pick_then_lose_the_first)
+    login("fallback@ibm.com")
+    response = client.post("/assign", json={"zone": "asian"})
+    assert response.status_code == 200
+    assert response.json()["seat_id"] == picked[1]
+    asyncio.run(main.refresh_seats(picked[:2]))
+    statuses = {seat["_id"]: seat["booked_by"] for seat in client.get("/seats").json()}
+    assert statuses[picked[0]] == "ghost@ibm.com"
+    assert statuses[picked[1]] == "fallback@ibm.com"
+
+
+# ASSIGN — near a colleague means their table first
+def test_assign_sits_near_a_colleague(client):
+    register("anchor@ibm.com", "follower@ibm.com")
+    login("anchor@ibm.com")
+    assert book(client, 65).status_code == 200
+
+    login("follower@ibm.com")
+    response = client.post("/assign", json={"near": "anchor@ibm.com", "quiet": False})
     assert response.status_code == 200
-    assert response.json()["seat"]["status"] == "available"
+    index = main.floor_plan().index
+    assert response.json()["near"] == 65
+    assert index.table[response.json()["seat_id"]] == index.table[65]
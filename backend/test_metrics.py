@@ -0,0 +1,63 @@
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from metrics import MetricsMiddleware, render
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+# ROUTE LABELS — requests are counted per route template, not per raw path
+def test_middleware_labels_by_route_template():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/things/{thing_id}")
+    def thing(thing_id: int):
+        return {"id": thing_id}
+
+    before = sample("http_requests_total", method="GET", route="/things/{thing_id}", status="200")
+    unmatched = sample("http_requests_total", method="GET", route="unmatched", status="404")
+    client = TestClient(app)
+    client.get("/things/1")
+    client.get("/things/2")
+    client.get("/missing")
+
+    assert sample(
+        "http_requests_total", method="GET", route="/things/{thing_id}", status="200"
+    ) == before + 2
+    assert sample("http_requests_total", method="GET", route="unmatched", status="404") == unmatched + 1
+    assert sample(
+        "http_request_duration_seconds_count", method="GET", route="/things/{thing_id}"
+    ) >= 2
+    assert sample("http_requests_in_flight") == 0
+    assert b'route="/things/{thing_id}"' in render()
+
+
+# STREAMS — an open event stream is neither in flight nor timed
+def test_middleware_skips_event_streams():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+    seen = []
+
+    @app.get("/events")
+    def events():
+        def stream():
+            yield "data: 1\n\n"
+            # the response has started: the stream no longer counts as in flight
+            seen.append(sample("http_requests_in_flight"))
+            yield "data: 2\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    before = sample("http_requests_total", method="GET", route="/events", status="200")
+    response = TestClient(app).get("/events")
+
+    assert response.text == "data: 1\n\ndata: 2\n\n"
+    assert seen == [0]
+    assert sample("http_requests_in_flight") == 0
+    assert sample("http_requests_total", method="GET", route="/events", status="200") == before + 1
+    assert sample("http_request_duration_seconds_count", method="GET", route="/events") == 0
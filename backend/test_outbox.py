@@ -0,0 +1,119 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from outbox import SeatOutbox, outbox_event
+
+
+class FakeSeats:
+    def __init__(self):
+        self.outbox = {}  # seat id -> pending events
+        self.pulls = 0
+
+    async def clear_events(self, events):
+        for event in events:
+            pending = self.outbox.get(event["seat_id"], [])
+            self.outbox[event["seat_id"]] = [e for e in pending if e["id"] != event["id"]]
+            self.pulls += 1
+
+    async def stale_events(self, cutoff):
+        return [
+            event for events in self.outbox.values() for event in events if event["at"] < cutoff
+        ]
+
+
+class Handler:
+    def __init__(self, failures=0):
+        self.batches = []
+        self.failures = failures
+
+    async def __call__(self, events):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("mongo down")
+        self.batches.append([event["id"] for event in events])
+
+
+def stored(seats, event):
+    seats.outbox.setdefault(event["seat_id"], []).append(event)
+    return event
+
+
+# BATCHING — one handler call per batch, then the events leave their seats
+def test_flush_applies_in_batches_and_clears_seats():
+    seats, handler = FakeSeats(), Handler()
+    outbox = SeatOutbox(seats, handler, batch_size=2)
+    events = [stored(seats, outbox_event("book", f"u{i}", i)) for i in range(5)]
+    for event in events:
+        outbox.enqueue(event)
+    outbox.enqueue(events[0])  # already queued
+
+    asyncio.run(outbox.flush())
+
+    assert [len(batch) for batch in handler.batches] == [2, 2, 1]
+    assert sum(handler.batches, []) == [event["id"] for event in events]
+    assert all(not pending for pending in seats.outbox.values())
+    assert outbox.applied == 5
+    assert not outbox.queued
+
+
+# DELIVERY — a failed batch is retried in order before anything newer
+def test_run_retries_failed_batch_in_order(monkeypatch):
+    seats, handler = FakeSeats(), Handler(failures=1)
+    outbox = SeatOutbox(seats, handler, interval=0)
+    book = stored(seats, outbox_event("book", "a", 1))
+    release = stored(seats, outbox_event("release", "a", 1))
+    real_sleep = asyncio.sleep
+    monkeypatch.setattr("outbox.asyncio.sleep", lambda delay: real_sleep(0))
+
+    async def run():
+        task = asyncio.create_task(outbox.run())
+        outbox.enqueue(book)
+        outbox.enqueue(release)
+        while outbox.applied < 2:
+            await real_sleep(0)
+        task.cancel()
+
+    asyncio.run(run())
+    assert handler.batches == [[book["id"], release["id"]]]
+    assert seats.outbox[1] == []
+
+
+# BURST — a burst bigger than one batch is applied in full
+def test_run_applies_every_event_of_a_burst(monkeypatch):
+    seats, handler = FakeSeats(), Handler()
+    outbox = SeatOutbox(seats, handler, batch_size=4, interval=0)
+    events = [stored(seats, outbox_event("book", f"u{i}", i)) for i in range(10)]
+
+    async def run():
+        task = asyncio.create_task(outbox.run())
+        await asyncio.sleep(0)
+        for event in events:
+            outbox.enqueue(event)
+        for _ in range(100):
+            if outbox.applied == len(events):
+                break
+            await asyncio.sleep(0)
+        task.cancel()
+
+    asyncio.run(run())
+    assert sum(handler.batches, []) == [event["id"] for event in events]
+    assert all(len(batch) <= 4 for batch in handler.batches)
+    assert not outbox.queued
+
+
+# RECOVERY — events a dead process left on a seat are picked up again
+def test_recover_requeues_only_old_events():
+    seats, handler = FakeSeats(), Handler()
+    outbox = SeatOutbox(seats, handler, retry_after=timedelta(seconds=30))
+    lost = stored(seats, outbox_event("book", "a", 1, datetime.utcnow() - timedelta(minutes=5)))
+    stored(seats, outbox_event("book", "b", 2))
+
+    async def run():
+        assert await outbox.recover() == 1
+        assert await outbox.recover() == 0
+        await outbox.flush()
+
+    asyncio.run(run())
+    assert handler.batches == [[lost["id"]]]
+    assert seats.outbox[1] == []
+    assert len(seats.outbox[2]) == 1
@@ -0,0 +1,46 @@
+from datetime import date
+
+import pytest
+
+from reservations import DayIndex, parse_slot, resolve_date, slot_label
+
+
+def test_date_and_slot_parsing():
+    today = date(2026, 3, 2)
+    assert resolve_date("Today", today) == today
+    assert resolve_date("Tomorrow", today) == date(2026, 3, 3)
+    assert resolve_date("Day After", today) == date(2026, 3, 4)
+    assert resolve_date("2026-03-09", today) == date(2026, 3, 9)
+
+    assert parse_slot("12:00 PM") == 720
+    assert parse_slot("1:30 pm") == 810
+    assert parse_slot("13:30") == 810
+    assert slot_label(810) == "1:30 PM"
+    for bad in ("12:15 PM", "noon"):
+        with pytest.raises(ValueError):
+            parse_slot(bad)
+
+
+# SLOT INDEX — availability per slot and bookings per user
+def test_day_index_lookups():
+    index = DayIndex(
+        [
+            {"start": 720, "seat_id": 1, "w3_id": "a"},
+            {"start": 720, "seat_id": 2, "w3_id": "b"},
+            {"start": 780, "seat_id": 1, "w3_id": "a"},
+            {"start": 840, "seat_id": 9, "w3_id": "c"},
+        ]
+    )
+
+    assert index.taken(720) == {1: "a", 2: "b"}
+    assert index.taken(750) == {}
+    assert [start for start, _ in index.between(720, 840)] == [720, 780]
+    assert index.for_user("a") == [(720, 1), (780, 1)]
+    assert index.user_has("a", 780)
+    assert not index.user_has("a", 750)
+
+    index.remove(720, 2, "b")
+    index.remove(840, 9, "c")
+    assert index.taken(720) == {1: "a"}
+    assert index.starts == [720, 780]
+    assert index.for_user("c") == []
@@ -0,0 +1,154 @@
+import asyncio
+import json
+
+from pydantic import BaseModel, Field
+from typing import Optional
+
+from seat_cache import SeatSnapshot
+
+
+class Seat(BaseModel):
+    id: int = Field(alias="_id")
+    status: str
+    price: int
+    booked_by: Optional[str] = None
+
+    class Config:
+        populate_by_name = True
+
+
+class FakeSeats:
+    def __init__(self, docs):
+        self.docs = docs
+        self.reads = 0
+
+    async def list(self, site=None, floor=None):
+        self.reads += 1
+        return [dict(d) for d in sorted(self.docs, key=lambda d: d["_id"])]
+
+
+def make_seats(n):
+    return [{"_id": i, "status": "available", "price": 5} for i in range(1, n + 1)]
+
+
+# CACHE HITS — repeated polls are served from memory
+def test_polls_reuse_snapshot():
+    seats = FakeSeats(make_seats(100))
+    snapshot = SeatSnapshot(Seat, ttl=0)
+
+    async def run():
+        for _ in range(50):
+            await snapshot.get(seats)
+
+    asyncio.run(run())
+    assert seats.reads == 1
+    assert snapshot.version == 1
+    body = json.loads(snapshot.body)
+    assert len(body) == 100
+    assert body[0] == {"_id": 1, "status": "available", "price": 5, "booked_by": None}
+
+
+# INVALIDATION — a write bumps the version, a no-op refresh does not
+def test_refresh_bumps_version_only_on_change():
+    seats = FakeSeats(make_seats(3))
+    snapshot = SeatSnapshot(Seat, ttl=0)
+
+    async def run():
+        await snapshot.get(seats)
+        await snapshot.refresh(seats)
+        assert snapshot.version == 1
+
+        seats.docs[1].update(status="occupied", booked_by="a@ibm.com")
+        await snapshot.refresh(seats)
+
+    asyncio.run(run())
+    assert snapshot.version == 2
+    assert snapshot.seats[2]["status"] == "occupied"
+
+
+# CONDITIONAL GET — ETag follows the seat map contents
+def test_etag_matches_until_map_changes():
+    seats = FakeSeats(make_seats(3))
+    snapshot = SeatSnapshot(Seat, ttl=0)
+    asyncio.run(snapshot.get(seats))
+    etag = snapshot.etag
+
+    assert snapshot.matches(etag)
+    assert snapshot.matches(f'W/{etag}, "other"')
+    assert not snapshot.matches('"other"')
+    assert not snapshot.matches(None)
+
+    seats.docs[0]["status"] = "occupied"
+    asyncio.run(snapshot.refresh(seats))
+    assert not snapshot.matches(etag)
+
+    # identical contents give identical tags, e.g. on another replica
+    other = SeatSnapshot(Seat, ttl=0)
+    asyncio.run(other.get(seats))
+    assert other.etag == snapshot.etag
+
+
+# DELTA — only seats changed after `since` are returned
+def test_delta_since_version():
+    seats = FakeSeats(make_seats(5))
+    snapshot = SeatSnapshot(Seat, ttl=0)
+    asyncio.run(snapshot.get(seats))
+    v1 = snapshot.version
+
+    seats.docs[2].update(status="occupied", booked_by="a@ibm.com")
+    asyncio.run(snapshot.refresh(seats))
+    v2 = snapshot.version
+    seats.docs[4].update(status="occupied", booked_by="b@ibm.com")
+    asyncio.run(snapshot.refresh(seats))
+
+    delta = snapshot.delta(v1)
+    assert not delta["full"]
+    assert sorted(seat["_id"] for seat in delta["seats"]) == [3, 5]
+    assert [seat["_id"] for seat in snapshot.delta(v2)["seats"]] == [5]
+    assert snapshot.delta(snapshot.version)["seats"] == []
+
+    seats.docs.pop()
+    asyncio.run(snapshot.refresh(seats))
+    assert snapshot.delta(v2 + 1)["removed"] == [5]
+
+
+def test_delta_falls_back_to_full_map():
+    seats = FakeSeats(make_seats(4))
+    snapshot = SeatSnapshot(Seat, ttl=0)
+    asyncio.run(snapshot.get(seats))
+
+    for since, epoch in [(99, None), (-1, None), (0, "someone-else")]:
+        delta = snapshot.delta(since, epoch)
+        assert delta["full"]
+        assert len(delta["seats"]) == 4
+
+
+# LOCAL WRITES — apply patches the map without another read
+def test_apply_patches_without_reading():
+    seats = FakeSeats(make_seats(3))
+    snapshot = SeatSnapshot(Seat, ttl=0)
+    asyncio.run(snapshot.refresh(seats))
+
+    snapshot.apply([{"_id": 2, "status": "occupied", "price": 5, "booked_by": "a"}])
+
+    assert seats.reads == 1
+    assert snapshot.version == 2
+    assert snapshot.by_user == {"a": 2}
+    assert [seat["_id"] for seat in json.loads(snapshot.body)] == [1, 2, 3]
+    assert snapshot.delta(1)["seats"] == [
+        {"_id": 2, "status": "occupied", "price": 5, "booked_by": "a"}
+    ]
+
+
+def test_apply_during_rebuild_wins_over_stale_read():
+    class SlowSeats(FakeSeats):
+        async def list(self, site=None, floor=None):
+            docs = await super().list(site, floor)
+            # the write lands while the read is in flight
+            snapshot.apply([{"_id": 1, "status": "occupied", "price": 5, "booked_by": "a"}])
+            return docs
+
+    snapshot = SeatSnapshot(Seat, ttl=0)
+    asyncio.run(snapshot.refresh(SlowSeats(make_seats(2))))
+
+    assert snapshot.seats[1]["status"] == "occupied"
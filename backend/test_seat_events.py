@@ -0,0 +1,85 @@
+import asyncio
+import json
+
+from seat_cache import SeatSnapshot
+from seat_events import SeatHub
+from test_seat_cache import FakeSeats, Seat, make_seats
+
+
+def parse(frame):
+    lines = dict(line.split(": ", 1) for line in frame.decode().strip().split("\n"))
+    return lines["event"], json.loads(lines["data"])
+
+
+# FAN-OUT — one change reaches every subscriber with a single Mongo read
+def test_change_is_pushed_to_all_subscribers():
+    seats = FakeSeats(make_seats(10))
+    snapshot = SeatSnapshot(Seat, ttl=0)
+    hub = SeatHub(snapshot, seats)
+
+    async def run():
+        await snapshot.get(seats)
+        queues = [hub.subscribe() for _ in range(1000)]
+        reads = seats.reads
+
+        seats.docs[3].update(status="occupied", booked_by="a@ibm.com")
+        await snapshot.refresh(seats)
+
+        assert seats.reads == reads + 1
+        frames = {queue.get_nowait() for queue in queues}
+        assert len(frames) == 1
+        event, data = parse(frames.pop())
+        assert event == "seats"
+        assert not data["full"]
+        assert [seat["_id"] for seat in data["seats"]] == [4]
+
+    asyncio.run(run())
+
+
+# STREAM — new subscribers get the full map first
+def test_stream_starts_with_full_map():
+    seats = FakeSeats(make_seats(5))
+    snapshot = SeatSnapshot(Seat, ttl=0)
+    hub = SeatHub(snapshot, seats)
+
+    async def run():
+        stream = hub.stream()
+        event, data = parse(await stream.__anext__())
+        assert data["full"]
+        assert len(data["seats"]) == 5
+        assert len(hub.subscribers) == 1
+        await stream.aclose()
+        assert not hub.subscribers
+
+    asyncio.run(run())
+
+
+# DISCONNECT — a stream that never started leaves no subscriber behind
+def test_unstarted_stream_does_not_subscribe():
+    seats = FakeSeats(make_seats(2))
+    snapshot = SeatSnapshot(Seat, ttl=0)
+    hub = SeatHub(snapshot, seats)
+
+    async def run():
+        stream = hub.stream()
+        await stream.aclose()
+        assert not hub.subscribers
+
+    asyncio.run(run())
+
+
+# BACKPRESSURE — a subscriber that stops reading is dropped, not buffered forever
+def test_slow_subscriber_is_dropped():
+    seats = FakeSeats(make_seats(2))
+    snapshot = SeatSnapshot(Seat, ttl=0)
+    hub = SeatHub(snapshot, seats, queue_size=2)
+
+    async def run():
+        queue = hub.subscribe()
+        for _ in range(3):
+            hub.publish(b"frame")
+        assert queue not in hub.subscribers
+        assert queue.get_nowait() == b"frame"
+        assert queue.get_nowait() is None
+
+    asyncio.run(run())
@@ -0,0 +1,54 @@
+import asyncio
+import json
+
+import orjson
+
+from main import Seat
+from seat_stream import seat_row, stream_json_array
+
+
+async def iterate(docs):
+    for doc in docs:
+        yield doc
+
+
+def collect(docs, batch_size):
+    async def run():
+        return [chunk async for chunk in stream_json_array(iterate(docs), batch_size)]
+
+    return asyncio.run(run())
+
+
+def make_docs(n):
+    return [
+        {"_id": i, "status": "available", "price": 5, "site": "s", "floor": 1, "zone": "coffee"}
+        for i in range(1, n + 1)
+    ]
+
+
+# STREAMING — one chunk per batch, and the chunks form one JSON array
+def test_stream_is_batched_json_array():
+    chunks = collect(make_docs(1001), 100)
+
+    # "[", eleven batches, "]"
+    assert len(chunks) == 13
+    body = json.loads(b"".join(chunks))
+    assert [seat["_id"] for seat in body] == list(range(1, 1002))
+
+
+def test_stream_edge_sizes():
+    assert json.loads(b"".join(collect([], 10))) == []
+    assert len(json.loads(b"".join(collect(make_docs(10), 10)))) == 10
+
+
+# FAST PATH — plain rows encode exactly like the Seat model served today
+def test_row_matches_seat_model():
+    docs = [
+        {"_id": 7, "status": "occupied", "price": 5, "booked_by": "a@ibm.com", "booking_time": None},
+        {"_id": 8, "status": "available", "price": 5, "site": "s", "floor": 2, "zone": "pizza"},
+        *make_docs(3),
+    ]
+    for doc in docs:
+        expected = Seat.model_validate(doc).model_dump(by_alias=True)
+        assert seat_row(doc) == expected
+        assert orjson.dumps(seat_row(doc)) == json.dumps(expected, separators=(",", ":")).encode()
@@ -0,0 +1,210 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from fake_mongo import FakeClient
+from indexes import ensure_indexes
+from memory_storage import MemoryStorage
+from mongo_storage import MongoStorage
+from outbox import outbox_event
+from reservations import AlreadyReserved, SeatTaken
+from schemas import employee_document
+from storage import AlreadySeated
+
+NOW = datetime(2026, 3, 2, 12, 0)
+
+
+async def mongo_storage():
+    database = FakeClient()["office_booking_db"]
+    await ensure_indexes(database)
+    return MongoStorage(database)
+
+
+async def memory_storage():
+    return MemoryStorage(path=None)
+
+
+ENGINES = pytest.mark.parametrize("make", [mongo_storage, memory_storage], ids=["mongo", "memory"])
+
+
+async def seeded(make):
+    storage = await make()
+    await storage.seats.seed("north", 1, {1: "coffee", 2: "coffee", 3: "pizza"}, 5)
+    for w3_id in ("a", "b"):
+        await storage.employees.register(employee_document({"uid": w3_id, "name": w3_id.upper()}))
+    return storage
+
+
+# SEATS — one occupied seat per person, the outbox event rides on the claim
+@ENGINES
+def test_claim_and_free(make):
+    async def run():
+        storage = await seeded(make)
+        seats = storage.seats
+        assert not await seats.seed("north", 1, {1: "coffee", 2: "coffee", 3: "pizza"}, 5)
+        assert [seat["_id"] for seat in await seats.list("north", 1)] == [1, 2, 3]
+
+        book = outbox_event("book", "a", 1, NOW)
+        seat = await seats.claim(1, "a", NOW, book)
+        assert seat == {
+            "_id": 1,
+            "status": "occupied",
+            "price": 5,
+            "booked_by": "a",
+            "booking_time": NOW,
+            "site": "north",
+            "floor": 1,
+            "zone": "coffee",
+        }
+        assert await seats.claim(1, "b", NOW, outbox_event("book", "b", 1, NOW)) is None
+        with pytest.raises(AlreadySeated):
+            await seats.claim(2, "a", NOW, outbox_event("book", "a", 2, NOW))
+
+        assert await seats.free(1, "b", outbox_event("release", "b", 1, NOW)) is None
+        release = outbox_event("release", "a", 1, NOW)
+        assert (await seats.free(1, "a", release))["status"] == "available"
+        assert await seats.claim(2, "a", NOW, outbox_event("book", "a", 2, NOW))
+
+        stale = await seats.stale_events(NOW + timedelta(seconds=1))
+        assert {book["id"], release["id"]} <= {event["id"] for event in stale}
+        await seats.clear_events([book, release])
+        left = await seats.stale_events(NOW + timedelta(seconds=1))
+        assert not {book["id"], release["id"]} & {event["id"] for event in left}
+        assert [seat["_id"] async for seat in seats.export("north")] == [1, 2, 3]
+
+    asyncio.run(run())
+
+
+# BATCH — all or nothing, undone by batch id
+@ENGINES
+def test_batch_claim_and_undo(make):
+    async def run():
+        storage = await seeded(make)
+        pairs = [("a", 1), ("b", 2)]
+        assert await storage.employees.claim_batch(pairs, NOW, 5) == 2
+        assert await storage.employees.claim_batch(pairs, NOW, 5) == 0
+        await storage.seats.claim(2, "c", NOW, outbox_event("book", "c", 2, NOW))
+        assert await storage.seats.claim_batch(pairs, NOW, "batch") == 1
+
+        await storage.seats.undo_batch([1, 2], "batch")
+        await storage.employees.undo_batch(pairs, NOW, 5)
+        seats = {seat["_id"]: seat for seat in await storage.seats.list("north", 1)}
+        assert seats[1]["status"] == "available"
+        assert seats[2]["booked_by"] == "c"
+        assert (await storage.employees.state("a"))["blue_tokens_spent"] == 0
+        assert (await storage.employees.state("a"))["last_booked_seat"] is None
+
+    asyncio.run(run())
+
+
+# SWEEPER — expired seats are freed and refunded, newer bookings are not
+@ENGINES
+def test_release_expired_and_refund(make):
+    async def run():
+        storage = await seeded(make)
+        old = NOW - timedelta(hours=1)
+        events = [outbox_event("book", "a", 1, old), outbox_event("book", "b", 2, NOW)]
+        await storage.seats.claim(1, "a", old, events[0])
+        await storage.seats.claim(2, "b", NOW, events[1])
+        await storage.employees.apply_events(events, 5)
+
+        expired = await storage.seats.release_expired(NOW - timedelta(minutes=45))
+        assert expired == [{"_id": 1, "booked_by": "a", "booking_time": old}]
+        await storage.employees.refund_expired(expired, 5)
+        assert (await storage.employees.state("a"))["blue_tokens_spent"] == 0
+        assert (await storage.employees.state("b"))["blue_tokens_spent"] == 5
+        assert await storage.seats.release_expired(NOW - timedelta(minutes=45)) == []
+
+    asyncio.run(run())
+
+
+# EMPLOYEES — idempotent outbox delivery, charges, logins, directory
+@ENGINES
+def test_employee_writes(make):
+    async def run():
+        storage = await seeded(make)
+        employees = storage.employees
+        book = outbox_event("book", "a", 3, NOW)
+        await employees.apply_events([book, book], 5)
+        await employees.apply_events([book], 5)
+        state = await employees.state("a")
+        assert state["blue_tokens_spent"] == 5
+        assert state["last_booked_seat"] == 3
+
+        await employees.apply_events([outbox_event("release", "a", 3, NOW)], 5)
+        assert (await employees.state("a"))["blue_tokens_spent"] == 0
+        assert (await employees.charge("a", 5))["blue_tokens_spent"] == 5
+        assert await employees.charge("nobody", 5) is None
+        assert (await employees.charge("new", 5, upsert=True))["blue_tokens_spent"] == 5
+        assert (await employees.register(employee_document({"uid": "a"})))["blue_tokens_spent"] == 5
+        assert {doc["w3_id"] for doc in await employees.states(["a", "b", "ghost"])} == {"a", "b"}
+
+        await employees.record_logins({"a": NOW, "ghost": NOW})
+        await employees.record_logins({"a": NOW - timedelta(hours=1)})
+        people = [doc async for doc in employees.directory()]
+        assert people[:2] == [
+            {"w3_id": "a", "full_name": "A", "email": None},
+            {"w3_id": "b", "full_name": "B", "email": None},
+        ]
+
+    asyncio.run(run())
+
+
+# BOOKINGS — one reservation per seat and per person and slot
+@ENGINES
+def test_reservations(make):
+    async def run():
+        storage = await make()
+        bookings = storage.bookings
+
+        def doc(seat_id, w3_id, start=720):
+            return {"seat_id": seat_id, "date": "2026-03-03", "start": start, "w3_id": w3_id}
+
+        await bookings.reserve(doc(1, "a"))
+        with pytest.raises(SeatTaken):
+            await bookings.reserve(doc(1, "b"))
+        with pytest.raises(AlreadyReserved):
+            await bookings.reserve(doc(2, "a"))
+        await bookings.reserve(doc(2, "a", start=750))
+        assert sorted((r["start"], r["seat_id"]) for r in await bookings.day("2026-03-03")) == [
+            (720, 1),
+            (750, 2),
+        ]
+
+        assert not await bookings.cancel("2026-03-03", 720, 1, "b")
+        assert await bookings.cancel("2026-03-03", 720, 1, "a")
+        await bookings.reserve(doc(1, "b"))
+
+    asyncio.run(run())
+
+
+# PERSISTENCE — a snapshot brings back documents and their indexes
+def test_memory_snapshot_round_trip(tmp_path):
+    path = tmp_path / "state.pickle"
+
+    async def run():
+        storage = MemoryStorage(path=path)
+        await storage.seats.seed("north", 1, {1: "coffee", 2: "coffee"}, 5)
+        await storage.employees.register(employee_document({"uid": "a"}))
+        event = outbox_event("book", "a", 1, NOW)
+        await storage.seats.claim(1, "a", NOW, event)
+        await storage.bookings.reserve({"seat_id": 2, "date": "2026-03-03", "start": 720, "w3_id": "a"})
+        await storage.collection("ledger").insert_one({"_id": "e1", "amount": 5})
+        assert await storage.save()
+        assert not await storage.save()
+
+        restored = MemoryStorage(path=path)
+        await restored.open()
+        assert (await restored.seats.list("north", 1))[0]["booked_by"] == "a"
+        with pytest.raises(AlreadySeated):
+            await restored.seats.claim(2, "a", NOW, outbox_event("book", "a", 2, NOW))
+        assert [e["id"] for e in await restored.seats.stale_events(NOW + timedelta(1))] == [event["id"]]
+        with pytest.raises(AlreadyReserved):
+            await restored.bookings.reserve(
+                {"seat_id": 1, "date": "2026-03-03", "start": 720, "w3_id": "a"}
+            )
+        assert await restored.employees.state("a") is not None
+        assert await restored.collection("ledger").find_one({"_id": "e1"}) == {"_id": "e1", "amount": 5}
+
+    asyncio.run(run())
@@ -0,0 +1,103 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from fake_mongo import FakeClient
+from indexes import ensure_indexes
+from mongo_storage import MongoStorage
+from outbox import outbox_event
+from schemas import employee_document
+from sweeper import SWEEPER_LOCK, SeatSweeper
+
+HOLD = timedelta(minutes=45)
+
+
+async def make_storage():
+    database = FakeClient()["office_booking_db"]
+    await ensure_indexes(database)
+    storage = MongoStorage(database)
+    await storage.seats.seed("north", 1, {1: "coffee", 2: "coffee", 3: "pizza"}, 5)
+    for w3_id in ("a", "b", "c"):
+        await storage.employees.register(employee_document({"uid": w3_id}))
+    return storage
+
+
+def sweeper(storage, on_release=None):
+    return SeatSweeper(
+        storage.seats,
+        storage.employees,
+        storage.collection("locks"),
+        hold=HOLD,
+        refund=5,
+        on_release=on_release,
+        interval=1,
+    )
+
+
+# LEASE — two replicas share one lease; the other takes over once it is gone
+def test_one_replica_holds_the_lease():
+    async def run():
+        storage = await make_storage()
+        locks = storage.collection("locks")
+        first, second = sweeper(storage), sweeper(storage)
+
+        assert await first.acquire_lease()
+        assert not await second.acquire_lease()
+        # the holder renews its own lease
+        assert await first.acquire_lease()
+        assert not await second.acquire_lease()
+
+        # a leader that died stops renewing: the lease runs out
+        await locks.update_one(
+            {"_id": SWEEPER_LOCK}, {"$set": {"expires_at": datetime.utcnow() - timedelta(seconds=1)}}
+        )
+        assert await second.acquire_lease()
+        assert not await first.acquire_lease()
+
+        # a leader that stops cleanly hands it over at once
+        await second.release_lease()
+        assert await first.acquire_lease()
+        assert (await locks.find_one({"_id": SWEEPER_LOCK}))["owner"] == first.owner
+
+    asyncio.run(run())
+
+
+# SWEEP — only seats this sweep freed are refunded and reported
+def test_sweep_reports_only_freed_seats():
+    released = []
+
+    async def on_release(seats):
+        released.append([seat["_id"] for seat in seats])
+
+    async def run():
+        storage = await make_storage()
+        now = datetime.utcnow()
+        old = now - HOLD - timedelta(minutes=1)
+        for w3_id, seat_id, at in (("a", 1, old), ("b", 2, old), ("c", 3, now)):
+            event = outbox_event("book", w3_id, seat_id, at)
+            await storage.seats.claim(seat_id, w3_id, at, event)
+            await storage.employees.apply_events([event], 5)
+        # b checks out and books seat 2 again while the sweep is running,
+        # between its read of the expired seats and its update
+        collection = storage.collection("seats")
+        update_many = collection.update_many
+
+        async def rebooked_first(query, update, **kwargs):
+            await storage.seats.free(2, "b", outbox_event("release", "b", 2))
+            await storage.seats.claim(2, "b", now, outbox_event("book", "b", 2, now))
+            collection.update_many = update_many
+            return await update_many(query, update, **kwargs)
+
+        collection.update_many = rebooked_first
+        task = sweeper(storage, on_release)
+        assert await task.sweep() == 1
+        assert await task.sweep() == 0
+
+        seats = {seat["_id"]: seat for seat in await storage.seats.list("north", 1)}
+        assert seats[1]["status"] == "available"
+        assert seats[2]["booked_by"] == "b"
+        assert seats[3]["booked_by"] == "c"
+        assert (await storage.employees.state("a"))["blue_tokens_spent"] == 0
+        assert (await storage.employees.state("c"))["blue_tokens_spent"] == 5
+
+    asyncio.run(run())
+    assert released == [[1]]
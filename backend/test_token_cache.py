@@ -0,0 +1,48 @@
+import time
+
+from prometheus_client import REGISTRY
+
+from token_cache import VerifiedTokenCache
+
+
+def lookups(result):
+    return REGISTRY.get_sample_value("cache_lookups_total", {"cache": "token", "result": result}) or 0
+
+
+# HIT/MISS — a verified token is served from memory until it expires
+def test_hits_until_exp(monkeypatch):
+    cache = VerifiedTokenCache(maxsize=10)
+    payload = {"sub": "a@ibm.com", "exp": time.time() + 60}
+    hits, misses = lookups("hit"), lookups("miss")
+
+    assert cache.get("tok") is None
+    cache.put("tok", payload)
+    assert cache.get("tok") == payload
+    assert cache.get("tok") == payload
+    assert (lookups("hit") - hits, lookups("miss") - misses) == (2, 1)
+
+    later = time.time() + 120
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert cache.get("tok") is None
+    assert len(cache) == 0
+
+
+def test_tokens_without_valid_exp_are_not_cached():
+    cache = VerifiedTokenCache(maxsize=10)
+    cache.put("no-exp", {"sub": "a"})
+    cache.put("expired", {"sub": "a", "exp": time.time() - 5})
+    assert len(cache) == 0
+
+
+# LRU — the least recently used token is evicted first
+def test_lru_eviction():
+    cache = VerifiedTokenCache(maxsize=2)
+    exp = time.time() + 60
+    cache.put("a", {"sub": "a", "exp": exp})
+    cache.put("b", {"sub": "b", "exp": exp})
+    cache.get("a")
+    cache.put("c", {"sub": "c", "exp": exp})
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
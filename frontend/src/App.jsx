@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import axios from "axios";
 
 // --- UI COMPONENTS (VISUALS FROM CODE 2) ---
@@ -17,22 +17,24 @@ const FoodStall = ({ name, emoji, color, position, desc }) => (
   </div>
 );
 
-const ChairIcon = ({ id, x, y, rotation, status, isSelected, isSearched, onSelect }) => {
-  // Visual zone logic for the SVG Map (From Code 2)
-  const getZoneStyle = (id) => {
-    if (id <= 25) return { bg: "#bfdbfe", border: "#3b82f6", text: "#1e3a8a" }; // Blue
-    if (id <= 50) return { bg: "#fed7aa", border: "#f97316", text: "#7c2d12" }; // Orange
-    if (id <= 75) return { bg: "#fecaca", border: "#ef4444", text: "#7f1d1d" }; // Red
-    return { bg: "#bbf7d0", border: "#22c55e", text: "#14532d" }; // Green
-  };
+// Zone colours; the zone of each seat comes from the site layout on the server
+const ZONE_STYLES = {
+  coffee: { bg: "#bfdbfe", border: "#3b82f6", text: "#1e3a8a" }, // Blue
+  asian: { bg: "#fed7aa", border: "#f97316", text: "#7c2d12" }, // Orange
+  pizza: { bg: "#fecaca", border: "#ef4444", text: "#7f1d1d" }, // Red
+  salad: { bg: "#bbf7d0", border: "#22c55e", text: "#14532d" }, // Green
+};
+
+const ChairIcon = ({ id, x, y, rotation, status, zone, isSelected, isSearched, onSelect }) => {
+  const getZoneStyle = () => ZONE_STYLES[zone] || ZONE_STYLES.coffee;
 
   const getStatusColor = () => {
     if (isSearched) return { fill: "#facc15", stroke: "#eab308", strokeWidth: 2 };
     if (status === "occupied") return { fill: "#d1d5db", stroke: "#6b7280" };
     if (isSelected) return { fill: "#4A403A", stroke: "#000", strokeWidth: 1.5, text: "#fff" };
     
-    const zone = getZoneStyle(id);
-    return { fill: zone.bg, stroke: zone.border, text: zone.text };
+    const style = getZoneStyle();
+    return { fill: style.bg, stroke: style.border, text: style.text };
   };
 
   const colors = getStatusColor();
@@ -99,6 +101,30 @@ const TableIcon = ({ type, x, y, width, height, label }) => (
   </g>
 );
 
+// --- TIME SLOTS ---
+
+// Half-hour slots, decided the way the server does: the slot under way is
+// booked live, later ones (today's included) are reservations
+const SLOT_MINUTES = 30;
+
+const slotMinutes = (label) => {
+  const [time, period] = label.split(" ");
+  const [hours, minutes] = time.split(":").map(Number);
+  return ((hours % 12) + (period === "PM" ? 12 : 0)) * 60 + minutes;
+};
+
+const slotLabel = (start) => {
+  const hours = Math.floor(start / 60);
+  const minutes = String(start % 60).padStart(2, "0");
+  return `${hours % 12 || 12}:${minutes} ${hours < 12 ? "AM" : "PM"}`;
+};
+
+const currentSlot = () => {
+  const now = new Date();
+  const minutes = now.getHours() * 60 + now.getMinutes();
+  return minutes - (minutes % SLOT_MINUTES);
+};
+
 // --- MAIN APP COMPONENT ---
 
 const App = () => {
@@ -106,10 +132,14 @@ const App = () => {
   const [seats, setSeats] = useState([]);
   const [selectedSeat, setSelectedSeat] = useState(null);
   const [searchQuery, setSearchQuery] = useState("");
+  // Seats of colleagues matching the search, from the directory
+  const [colleagueSeats, setColleagueSeats] = useState([]);
   const [notification, setNotification] = useState(null);
   const [selectedDate, setSelectedDate] = useState("Today");
   const [selectedTime, setSelectedTime] = useState("12:00 PM");
   const [me, setMe] = useState(null);
+  // Last seat-map version seen, so polls only fetch what changed
+  const seatMapVersion = useRef(null);
 
   // --- API & LOGIC (FROM CODE 1) ---
   
@@ -127,27 +157,119 @@ const App = () => {
       .catch(() => setMe(null));
   }, []);
 
-  // Fetch seats periodically
+  // The slot under way shows the live map; later slots show reservations
+  const isLive =
+    selectedDate === "Today" && slotMinutes(selectedTime) <= currentSlot();
+  // What the server books or releases: live bookings use the current slot
+  const slotParams = () => ({
+    date: selectedDate,
+    time_slot: isLive ? slotLabel(currentSlot()) : selectedTime,
+  });
+
+  // Advance-booking view of one date and time slot
   useEffect(() => {
-    fetchSeats();
-    const interval = setInterval(fetchSeats, 2000);
+    if (isLive) return;
+    const refresh = () => fetchSlotSeats(selectedDate, selectedTime);
+    refresh();
+    const interval = setInterval(refresh, 2000);
     return () => clearInterval(interval);
-  }, []);
+  }, [isLive, selectedDate, selectedTime]);
+
+  // Live seat updates: server push, with polling as the fallback
+  useEffect(() => {
+    if (!isLive) return;
+    seatMapVersion.current = null;
+    let interval = null;
+    const startPolling = () => {
+      if (interval) return;
+      fetchSeats();
+      interval = setInterval(fetchSeats, 2000);
+    };
+    const stopPolling = () => {
+      clearInterval(interval);
+      interval = null;
+    };
+
+    if (typeof EventSource === "undefined") {
+      startPolling();
+      return stopPolling;
+    }
+
+    const stream = new EventSource(`${api.defaults.baseURL}/seats/stream`, {
+      withCredentials: true,
+    });
+    stream.addEventListener("seats", (event) => {
+      stopPolling();
+      applySeatDelta(JSON.parse(event.data));
+    });
+    // EventSource reconnects by itself; keep the map fresh meanwhile
+    stream.onerror = startPolling;
+
+    return () => {
+      stream.close();
+      stopPolling();
+    };
+  }, [isLive]);
+
+  const normalize = (list) =>
+    list.map((seat) => ({ ...seat, id: seat.id || seat._id }));
+
+  // Merge a {version, epoch, full, seats, removed} update into the map
+  const applySeatDelta = ({ version, epoch, full, seats: changed, removed }) => {
+    seatMapVersion.current = { version, epoch };
+    if (!full && !changed.length && !removed.length) return;
+    const changedSeats = normalize(changed);
+    setSeats((prev) => {
+      if (full) return changedSeats;
+      const byId = new Map(prev.map((seat) => [seat.id, seat]));
+      removed.forEach((id) => byId.delete(id));
+      changedSeats.forEach((seat) => byId.set(seat.id, seat));
+      return [...byId.values()].sort((a, b) => a.id - b.id);
+    });
+    setSelectedSeat((prev) =>
+      prev ? changedSeats.find((s) => s.id === prev.id) || prev : prev
+    );
+  };
+
+  const fetchSlotSeats = async (date, time_slot) => {
+    try {
+      const res = await api.get("/seats", { params: { date, time_slot } });
+      const slotSeats = normalize(res.data);
+      setSeats(slotSeats);
+      setSelectedSeat((prev) =>
+        prev ? slotSeats.find((s) => s.id === prev.id) || prev : prev
+      );
+    } catch (err) {
+      console.error(err);
+      setNotification({ type: "error", message: "Failed to fetch seats" });
+      setTimeout(() => setNotification(null), 3000);
+    }
+  };
+
+  const refreshSeats = () =>
+    isLive ? fetchSeats() : fetchSlotSeats(selectedDate, selectedTime);
 
   const fetchSeats = async () => {
     try {
-      const res = await api.get("/seats");
-      const normalizedSeats = res.data.map((seat) => ({
-        ...seat,
-        id: seat.id || seat._id,
-      }));
-      setSeats(normalizedSeats);
-      if (selectedSeat) {
-        const updatedSeat = normalizedSeats.find(
-          (s) => s.id === selectedSeat.id
-        );
-        if (updatedSeat) setSelectedSeat(updatedSeat);
+      const { current } = seatMapVersion;
+      const res = await api.get(
+        "/seats",
+        current ? { params: { since: current.version, epoch: current.epoch } } : {}
+      );
+
+      if (!Array.isArray(res.data)) {
+        applySeatDelta(res.data);
+        return;
       }
+
+      const normalizedSeats = normalize(res.data);
+      const version = res.headers?.["x-seat-map-version"];
+      const epoch = res.headers?.["x-seat-map-epoch"];
+      seatMapVersion.current = version ? { version: Number(version), epoch } : null;
+      setSeats(normalizedSeats);
+      setSelectedSeat((prev) =>
+        prev ? normalizedSeats.find((s) => s.id === prev.id) || prev : prev
+      );
     } catch (err) {
       console.error(err);
       setNotification({ type: "error", message: "Failed to fetch seats" });
@@ -162,14 +284,13 @@ const App = () => {
       await api.post("/book", {
         seat_id: selectedSeat.id,
         name: "Employee",
-        date: selectedDate,
-        time_slot: selectedTime,
+        ...slotParams(),
       });
       setNotification({
         type: "success",
         message: `Seat ${selectedSeat.id} Reserved`,
       });
-      fetchSeats();
+      refreshSeats();
     } catch {
       setNotification({ type: "error", message: "Booking Failed" });
     }
@@ -180,40 +301,80 @@ const App = () => {
   const handleCheckout = async () => {
     if (!selectedSeat) return;
     try {
-      await api.post(`/release/${selectedSeat.id}`);
+      // the server cancels a reservation of that slot, or else frees the seat
+      await api.post(`/release/${selectedSeat.id}`, null, { params: slotParams() });
       setNotification({
         type: "success",
         message: `Checked out of Seat ${selectedSeat.id}`,
       });
-      fetchSeats();
+      refreshSeats();
     } catch {
       setNotification({ type: "error", message: "Checkout Failed" });
     }
     setTimeout(() => setNotification(null), 3000);
   };
 
-  // Auto-select logic
-  const autoSelectSeat = () => {
-    const availableSeats = seats.filter((s) => s.status === "available");
-    if (!availableSeats.length) {
-      setNotification({ type: "error", message: "No seats available!" });
+  // Auto-select logic: the server picks and books the best free seat
+  const autoSelectSeat = async () => {
+    if (!isLive) {
+      const availableSeats = seats.filter((s) => s.status === "available");
+      if (!availableSeats.length) {
+        setNotification({ type: "error", message: "No seats available!" });
+        return;
+      }
+      const pick =
+        availableSeats[Math.floor(Math.random() * availableSeats.length)];
+      setSelectedSeat(pick);
+      setNotification({
+        type: "success",
+        message: `AI selected Seat #${pick.id}`,
+      });
       return;
     }
-    const pick =
-      availableSeats[Math.floor(Math.random() * availableSeats.length)];
-    setSelectedSeat(pick);
-    setNotification({
-      type: "success",
-      message: `AI selected Seat #${pick.id}`,
-    });
+    try {
+      const res = await api.post("/assign", {});
+      const pick = seats.find((s) => s.id === res.data.seat_id);
+      if (pick) setSelectedSeat(pick);
+      setNotification({
+        type: "success",
+        message: `AI assigned Seat #${res.data.seat_id}`,
+      });
+      refreshSeats();
+    } catch (err) {
+      setNotification({
+        type: "error",
+        message: err.response?.data?.detail || "No seats available!",
+      });
+    }
+    setTimeout(() => setNotification(null), 3000);
   };
 
+  // Friend Finder: look colleagues up by name or email as the user types
+  useEffect(() => {
+    const q = searchQuery.trim();
+    if (!q) {
+      setColleagueSeats([]);
+      return;
+    }
+    const timer = setTimeout(() => {
+      api
+        .get("/colleagues/search", { params: { q } })
+        .then((res) =>
+          setColleagueSeats(
+            res.data.map((c) => c.seat_id).filter((id) => id != null)
+          )
+        )
+        .catch(() => setColleagueSeats([]));
+    }, 200);
+    return () => clearTimeout(timer);
+  }, [searchQuery]);
+
   // Search Helper
   const isSearched = (seat) => {
     if (!searchQuery) return false;
     const q = searchQuery.toLowerCase();
     return (
-      seat.user_details?.full_name?.toLowerCase().includes(q) ||
+      colleagueSeats.includes(seat.id) ||
       seat.booked_by?.toLowerCase().includes(q)
     );
   };
@@ -268,6 +429,7 @@ const App = () => {
             y={sy}
             rotation={rot}
             status={currentSeat.status}
+            zone={currentSeat.zone}
             isSelected={selectedSeat?.id === id}
             isSearched={isSearched(currentSeat)}
             onSelect={() => setSelectedSeat(currentSeat)}